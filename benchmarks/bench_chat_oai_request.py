@@ -0,0 +1,73 @@
+"""
+Cost of building a chat_oai request as the history grows.
+
+Each history message carries a base64 image of about 100KB, like the
+histories of multimodal agents. The baseline is the deepcopy of the whole
+conversation that request building used to do on every call.
+
+    python benchmarks/bench_chat_oai_request.py
+"""
+
+import copy
+import time
+import base64
+import argparse
+
+from byzerllm.utils.client import ByzerLLM
+
+MODEL = "bench_model"
+
+
+def build_conversations(num: int, image_bytes: int):
+    image = "data:image/png;base64," + base64.b64encode(b"\0" * image_bytes).decode()
+    conversations = [{"role": "system", "content": "You are a helpful assistant."}]
+    for i in range(num):
+        conversations.append(
+            {
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": [
+                    {"type": "text", "text": f"message {i}"},
+                    {"type": "image_url", "image_url": {"url": image}},
+                ],
+                "metadata": {"step": i},
+            }
+        )
+    conversations.append({"role": "user", "content": "What changed?"})
+    return conversations
+
+
+def timeit(f, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", default="10,100,1000")
+    parser.add_argument("--image_bytes", type=int, default=75 * 1024)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    llm = ByzerLLM()
+    # a saas model keeps the messages as they are, no meta query is needed
+    llm.meta_cache[MODEL] = {"model_deploy_type": "saas", "message_format": True}
+
+    print(f"{'history':>8} {'deepcopy ms':>12} {'build ms':>10}")
+    for num in [int(n) for n in args.lengths.split(",")]:
+        conversations = build_conversations(num, args.image_bytes)
+        deepcopy_ms = timeit(lambda: copy.deepcopy(conversations), args.repeat)
+        build_ms = timeit(
+            lambda: llm._build_chat_oai_request(
+                model=MODEL,
+                conversations=conversations,
+                role_mapping=llm.default_role_mapping,
+            ),
+            args.repeat,
+        )
+        print(f"{num:>8} {deepcopy_ms:>12.3f} {build_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
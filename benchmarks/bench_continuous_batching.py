@@ -0,0 +1,116 @@
+"""
+Throughput of the transformers backend serving independent concurrent
+requests: one generate call per request, as a worker with
+workerMaxConcurrency=1 does, versus the BatchScheduler used with
+backend.continuous_batching=true, where the worker takes up to
+backend.max_batch_size requests at once.
+
+Every client runs in a thread of its own with its own event loop, like the
+separate predict calls a worker actor receives, and sends its requests one
+after another.
+
+Runs on CPU with a small randomly initialized GPT-2 unless --model_path
+points to a local causal LM.
+
+    python benchmarks/bench_continuous_batching.py
+    python benchmarks/bench_continuous_batching.py --model_path /data/qwen-0.5b --device cuda
+"""
+
+import time
+import random
+import asyncio
+import argparse
+import threading
+
+import torch
+import transformers
+
+from byzerllm.auto.continuous_batching import BatchScheduler
+
+
+class RandomTokenizer:
+    eos_token_id = None
+    pad_token_id = 0
+
+
+def small_gpt2():
+    config = transformers.GPT2Config(
+        vocab_size=5000, n_positions=512, n_embd=256, n_layer=4, n_head=4,
+        # no eos, every request generates max_new_tokens
+        eos_token_id=None, bos_token_id=None,
+    )
+    model = transformers.GPT2LMHeadModel(config)
+    model.generation_config.eos_token_id = None
+    return model, RandomTokenizer()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", default="")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--num_requests", type=int, default=32)
+    parser.add_argument("--max_new_tokens", type=int, default=32)
+    parser.add_argument("--max_batch_sizes", default="4,8,16")
+    args = parser.parse_args()
+
+    if args.model_path:
+        tokenizer = transformers.AutoTokenizer.from_pretrained(args.model_path)
+        model = transformers.AutoModelForCausalLM.from_pretrained(args.model_path)
+    else:
+        model, tokenizer = small_gpt2()
+    model = model.to(args.device).eval()
+
+    random.seed(0)
+    vocab_size = model.config.vocab_size
+    prompts = [
+        [random.randrange(1, vocab_size) for _ in range(random.randint(16, 128))]
+        for _ in range(args.num_requests)
+    ]
+    total_tokens = args.num_requests * args.max_new_tokens
+
+    start = time.perf_counter()
+    with torch.no_grad():
+        for prompt in prompts:
+            model.generate(
+                torch.tensor([prompt], device=args.device),
+                max_new_tokens=args.max_new_tokens,
+                min_new_tokens=args.max_new_tokens,
+                do_sample=False,
+                pad_token_id=0,
+            )
+    elapsed = time.perf_counter() - start
+    print(f"{'one generate per request':>26}: {total_tokens / elapsed:10.1f} tokens/s")
+
+    for max_batch_size in [int(n) for n in args.max_batch_sizes.split(",")]:
+        scheduler = BatchScheduler(
+            model, tokenizer, max_batch_size=max_batch_size, max_wait_ms=5,
+            eos_token_ids=[],
+        )
+        latencies = []
+
+        def client(client_prompts):
+            for prompt in client_prompts:
+                result = asyncio.run(
+                    scheduler.submit(prompt, args.max_new_tokens, temperature=0.0)
+                )
+                latencies.append(result.time_cost)
+
+        # as many concurrent requests as the worker takes
+        clients = [
+            threading.Thread(target=client, args=(prompts[i::max_batch_size],))
+            for i in range(max_batch_size)
+        ]
+        start = time.perf_counter()
+        for t in clients:
+            t.start()
+        for t in clients:
+            t.join()
+        elapsed = time.perf_counter() - start
+        print(
+            f"{'max_batch_size=' + str(max_batch_size):>26}: {total_tokens / elapsed:10.1f} tokens/s"
+            f", mean latency {sum(latencies) / len(latencies):.2f}s"
+            f", avg batch size {scheduler.stat()['avg_batch_size']:.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Embedding throughput of one forward pass per text versus the length sorted
+padded mini-batches of ByzerLLMEmbeddings.embed_batch.
+
+Runs on CPU with a small randomly initialized BERT unless --model_path points
+to a local embedding model.
+
+    python benchmarks/bench_embedding_batch.py
+    python benchmarks/bench_embedding_batch.py --model_path /data/bge-small-zh --device cuda
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+
+import torch
+import transformers
+
+from byzerllm.utils.emb import ByzerLLMEmbeddings
+
+WORDS = ["hello", "world", "panda", "bear", "china", "giant", "species", "the", "is", "a"]
+
+
+def tiny_bert():
+    vocab_file = os.path.join(tempfile.mkdtemp(), "vocab.txt")
+    with open(vocab_file, "w") as f:
+        f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS))
+    tokenizer = transformers.BertTokenizer(vocab_file)
+    model = transformers.BertModel(
+        transformers.BertConfig(
+            vocab_size=tokenizer.vocab_size,
+            hidden_size=128,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=256,
+        )
+    )
+    return model, tokenizer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", default="")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--num_texts", type=int, default=512)
+    parser.add_argument("--max_words", type=int, default=200)
+    parser.add_argument("--max_batch_tokens", default="2048,8192,16384")
+    args = parser.parse_args()
+
+    if args.model_path:
+        tokenizer = transformers.AutoTokenizer.from_pretrained(args.model_path)
+        model = transformers.AutoModel.from_pretrained(args.model_path)
+    else:
+        model, tokenizer = tiny_bert()
+    model = model.to(args.device).eval()
+    embeddings = ByzerLLMEmbeddings(model, tokenizer, device=args.device)
+
+    random.seed(0)
+    # chunk lengths of a RAG corpus are skewed: mostly short, some long
+    texts = [
+        " ".join(
+            random.choices(WORDS, k=min(args.max_words, int(random.paretovariate(1.2) * 10)))
+        )
+        for _ in range(args.num_texts)
+    ]
+
+    start = time.perf_counter()
+    with torch.no_grad():
+        for text in texts:
+            embeddings.get_embedding_with_token_count([text])
+    elapsed = time.perf_counter() - start
+    print(f"{'one text per pass':>24}: {len(texts) / elapsed:10.1f} texts/s")
+
+    for max_batch_tokens in [int(n) for n in args.max_batch_tokens.split(",")]:
+        start = time.perf_counter()
+        embeddings.embed_batch(texts, max_batch_tokens=max_batch_tokens)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{'max_batch_tokens=' + str(max_batch_tokens):>24}: {len(texts) / elapsed:10.1f} texts/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Tokens per second one server core can serialize into SSE chunks of a chat
+completion stream: the pydantic models of the original generator versus the
+precomputed DeltaChunkTemplate.
+
+    python benchmarks/bench_sse_chunk.py
+"""
+
+import time
+import argparse
+
+from byzerllm.utils.client.entrypoints.openai.protocol import (
+    ChatCompletionResponseStreamChoice,
+    ChatCompletionStreamResponse,
+    DeltaMessage,
+    UsageInfo,
+)
+from byzerllm.utils.client.entrypoints.openai.serving_chat import DeltaChunkTemplate
+
+REQUEST_ID = "cmpl-0123456789abcdef"
+MODEL = "qwen-72b-chat"
+CREATED = int(time.time())
+TOKENS = ["Hello", ",", " 世界", "\n", ' "quoted"', " token"]
+
+
+def with_pydantic(num: int):
+    for n in range(num):
+        chunk = ChatCompletionStreamResponse(
+            id=REQUEST_ID,
+            object="chat.completion.chunk",
+            created=CREATED,
+            choices=[
+                ChatCompletionResponseStreamChoice(
+                    index=0,
+                    delta=DeltaMessage(content=TOKENS[n % len(TOKENS)]),
+                    finish_reason=None,
+                )
+            ],
+            model=MODEL,
+        )
+        chunk.usage = UsageInfo(
+            prompt_tokens=100, completion_tokens=n, total_tokens=100 + n
+        )
+        data = chunk.model_dump_json(exclude_unset=True, exclude_none=True)
+        f"data: {data}\n\n"
+
+
+def with_template(num: int):
+    template = DeltaChunkTemplate(REQUEST_ID, "chat.completion.chunk", CREATED, MODEL)
+    for n in range(num):
+        data = template.render(TOKENS[n % len(TOKENS)], 100, n)
+        f"data: {data}\n\n"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=200000)
+    args = parser.parse_args()
+
+    for name, f in [("pydantic", with_pydantic), ("template", with_template)]:
+        start = time.perf_counter()
+        f(args.tokens)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10}: {args.tokens / elapsed:12.0f} tokens/s per core")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ import time
 import types
 import copy
 import asyncio
+import functools
+import threading
 from typing import Any,Any,Dict, List,Tuple,Generator,Optional,Union
 from pyjava.api.mlsql import DataServer
 from byzerllm.utils.metrics import Metric
@@ -160,6 +162,52 @@ def stream_chat(self,tokenizer,ins:str, his:List[Dict[str,str]]=[],
         }})] 
 
 
+async def async_batched_chat(self,tokenizer,ins:str, his:List[Dict[str,str]]=[],  
+        max_length:int=4090, 
+        top_p:float=0.95,
+        temperature:float=0.1,**kwargs):
+    '''
+    stream_chat for models deployed with backend.continuous_batching=true:
+    the concurrent requests of the worker, separate requests as well as the
+    items of one predict call, are generated together by the BatchScheduler
+    of the model.
+
+    It takes the generation parameters of stream_chat. early_stopping only
+    matters for beam search, which neither of them does, so it is accepted
+    and has no effect there either.
+    '''
+    tokens = tokenizer(ins, return_token_type_ids=False,return_tensors="pt")
+    max_new_tokens = compute_max_new_tokens(tokens, min(max_length, getattr(self.config, "model_max_length", max_length)))
+    if "max_new_tokens" in kwargs:
+        max_new_tokens = min(max_new_tokens,int(kwargs["max_new_tokens"]))
+
+    stop_sequences = []
+    if "stopping_sequences" in kwargs:
+        stop_sequences = tokenize_stopping_sequences(tokenizer,kwargs["stopping_sequences"].split(","))
+
+    result = await self.batch_scheduler.submit(
+        tokens["input_ids"][0].tolist(),
+        max_new_tokens=max_new_tokens,
+        temperature=temperature,
+        top_p=top_p,
+        stop_sequences=stop_sequences,
+        repetition_penalty=float(kwargs.get("repetition_penalty",1.0)),
+        skip_check_min_length=int(kwargs.get("stopping_sequences_skip_check_min_length",0)),
+        timeout_s=float(kwargs.get("timeout_s",60*5)),
+    )
+    answer = tokenizer.decode(result.output_ids, skip_special_tokens=True)
+    generated_tokens_count = len(result.output_ids)
+    return [(answer,{"metadata":{
+            "request_id":"",
+            "input_tokens_count": result.input_tokens_count,
+            "generated_tokens_count":generated_tokens_count,
+            "time_cost":result.time_cost * 1000,
+            "first_token_time": result.first_token_time * 1000,
+            "speed":float(generated_tokens_count)/result.time_cost if result.time_cost > 0 else 0.0,
+            "prob": -1.0
+        }})]
+
+
 def init_model(model_dir,infer_params:Dict[str,str]={},sys_conf:Dict[str,str]={}): 
     infer_mode = sys_conf.get("infer_backend","transformers")
     quatization = infer_params.get("quatization","false") == "true"  
@@ -263,9 +311,37 @@ def init_model(model_dir,infer_params:Dict[str,str]={},sys_conf:Dict[str,str]={}
 
     model.stream_chat = types.MethodType(stream_chat, model)
     model.get_meta = types.MethodType(get_meta, model)     
+
+    if get_bool(infer_params,"backend.continuous_batching",False):
+        if not has_chat:
+            from byzerllm.auto.continuous_batching import BatchScheduler
+            model.batch_scheduler = BatchScheduler(
+                model,
+                tokenizer,
+                max_batch_size=get_int(infer_params,"backend.max_batch_size",8),
+                max_wait_ms=get_float(infer_params,"backend.batch_wait_ms",5.0),
+            )
+            # the predict function prefers async_stream_chat. ByzerLLM.deploy lets
+            # up to backend.max_batch_size requests run on the worker at once, so
+            # separate requests as well as the items of one call share batches.
+            model.async_stream_chat = types.MethodType(async_batched_chat, model)
+        else:
+            # models with their own chat method are not batched, they still
+            # generate one request at a time although the worker takes more
+            model.stream_chat = _serialized(model.stream_chat)
     return (model,tokenizer)
 
 
+def _serialized(f):
+    lock = threading.Lock()
+
+    @functools.wraps(f)
+    def wrapper(*args,**kwargs):
+        with lock:
+            return f(*args,**kwargs)
+    return wrapper
+
+
 def sft_train(data_refs:List[DataServer],
               train_params:Dict[str,str],
               conf: Dict[str, str])->Generator[BlockRow,Any,Any]:
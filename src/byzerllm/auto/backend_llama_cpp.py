@@ -16,6 +16,8 @@ from byzerllm.utils.types import (
     StreamOutputs,
     SingleOutput,
     SingleOutputMeta,    
+    get_stream_server,
+    get_stream_server_name,
 )
 
 
@@ -157,12 +159,11 @@ class LlamaCppBackend:
 
         stream = kwargs.get("stream",False)
         
-        server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-        request_id = [None]
+        request_id = [str(uuid.uuid4())]
+        server = get_stream_server("BLOCK_VLLM_STREAM_SERVER", request_id[0])
         
         def writer():
             try:
-                r = ""       
                 response = self.model.create_chat_completion_openai_v1(
                                     messages=messages,                                    
                                     stream=True, 
@@ -170,23 +171,24 @@ class LlamaCppBackend:
                                     temperature=temperature,
                                     top_p=top_p                                                                        
                                 )                                    
-                request_id[0] = str(uuid.uuid4())                
 
-                for chunk in response:                                                              
+                for seq,chunk in enumerate(response):                                                              
                     content = chunk.choices[0].delta.content or ""
-                    r += content        
                     if hasattr(chunk,"usage"):
                         input_tokens_count = chunk.usage.prompt_tokens
                         generated_tokens_count = chunk.usage.completion_tokens
                     else:
                         input_tokens_count = 0
                         generated_tokens_count = 0
-                    ray.get(server.add_item.remote(request_id[0], 
-                                                    StreamOutputs(outputs=[SingleOutput(text=r,metadata=SingleOutputMeta(
+                    if not ray.get(server.add_item.remote(request_id[0], 
+                                                    StreamOutputs(outputs=[SingleOutput(text=content,metadata=SingleOutputMeta(
                                                         input_tokens_count=input_tokens_count,
                                                         generated_tokens_count=generated_tokens_count,
-                                                    ))])
-                                                    ))                                                   
+                                                    ),is_delta=True,seq=seq)])
+                                                    )):
+                        # the consumer went away, stop reading the upstream stream
+                        response.close()
+                        break
             except:
                 traceback.print_exc()            
             ray.get(server.mark_done.remote(request_id[0]))
@@ -194,19 +196,12 @@ class LlamaCppBackend:
         if stream:
             threading.Thread(target=writer,daemon=True).start()            
                             
-            time_count= 10*100
-            while request_id[0] is None and time_count > 0:
-                await asyncio.sleep(0.01)
-                time_count -= 1
-            
-            if request_id[0] is None:
-                raise Exception("Failed to get request id")
             
             def write_running():
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
                         
             await asyncio.to_thread(write_running)
-            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BLOCK_VLLM_STREAM_SERVER"}})]
+            return [("",{"metadata":{"request_id":request_id[0],"stream_server": get_stream_server_name("BLOCK_VLLM_STREAM_SERVER", request_id[0])}})]
         else:
             try:
                 start_time = time.monotonic()
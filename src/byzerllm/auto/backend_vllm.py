@@ -5,12 +5,17 @@ import types
 import copy
 import asyncio
 from typing import Any, Any, Dict, List, Tuple, Generator, Optional, Union
+from loguru import logger
 from byzerllm.utils.metrics import Metric
+from byzerllm.utils.metrics.serving import SERVING_METRICS
 from byzerllm.utils import (
     VLLMStreamServer,
     StreamOutputs,
     SingleOutput,
     SingleOutputMeta,
+    get_stream_server,
+    get_stream_server_name,
+    StreamFlushPolicy,
     compute_max_new_tokens,
     tokenize_stopping_sequences,
 )
@@ -20,6 +25,7 @@ from byzerllm.utils.tokenizer import (
     validate_args_engine_use_ray,
 )
 from byzerllm.utils.ray_utils import get_actor_info
+from byzerllm.auto.lora_registry import LoRAAdapterRegistry, parse_adapters
 
 
 try:
@@ -53,6 +59,78 @@ INFERENCE_NAME = "auto"
 INFER_TOKEN_METRICS = Metric()
 
 
+def _usage_of(request_output) -> Tuple[int, int]:
+    if request_output is None or not request_output.outputs:
+        return (0, 0)
+    return (
+        len(request_output.prompt_token_ids),
+        len(request_output.outputs[0].token_ids),
+    )
+
+
+def _observe_queue_wait(request_output):
+    # RequestOutput.metrics is only there in newer vLLM releases
+    metrics = getattr(request_output, "metrics", None)
+    first_scheduled_time = getattr(metrics, "first_scheduled_time", None)
+    if first_scheduled_time is not None:
+        SERVING_METRICS.observe_queue_wait(
+            INFERENCE_NAME, max(0.0, first_scheduled_time - metrics.arrival_time)
+        )
+
+
+def _call_engine(model, method: str, *args):
+    # the engine runs in process or as a ray actor, depending on engine_use_ray
+    engine = model.engine
+    if isinstance(engine, _AsyncLLMEngine):
+        return getattr(engine, method)(*args)
+    return getattr(engine, method).remote(*args)
+
+
+async def _acquire_lora(model, name: str, path: Optional[str]):
+    registry: LoRAAdapterRegistry = model.lora_registry
+    if path is not None:
+        registry.register(name, path)
+    adapter, evicted = registry.acquire(name)
+    for old in evicted:
+        try:
+            r = _call_engine(model, "remove_lora", old.lora_int_id)
+            if isinstance(r, ray.ObjectRef):
+                await r
+        except Exception as e:
+            print(f"unload LoRA adapter {old.name} error:{e}", flush=True)
+    return LoRARequest(
+        lora_name=adapter.name,
+        lora_int_id=adapter.lora_int_id,
+        lora_local_path=adapter.path,
+    )
+
+
+def warm_lora_adapters(model, names: List[str]):
+    registry: LoRAAdapterRegistry = model.lora_registry
+    for name in names:
+        adapter, evicted = registry.acquire(name)
+        try:
+            for old in evicted:
+                r = _call_engine(model, "remove_lora", old.lora_int_id)
+                if isinstance(r, ray.ObjectRef):
+                    ray.get(r)
+            r = _call_engine(
+                model,
+                "add_lora",
+                LoRARequest(
+                    lora_name=adapter.name,
+                    lora_int_id=adapter.lora_int_id,
+                    lora_local_path=adapter.path,
+                ),
+            )
+            if isinstance(r, ray.ObjectRef):
+                ray.get(r)
+        except Exception as e:
+            print(f"warm LoRA adapter {name} error:{e}", flush=True)
+        finally:
+            registry.release(name)
+
+
 def get_bool(params: Dict[str, str], key: str, default: bool = False) -> bool:
     if key in params:
         if isinstance(params[key], bool):
@@ -100,6 +178,10 @@ async def async_get_meta(model):
         "max_model_len": config.max_model_len,
         "architectures": getattr(config.hf_config, "architectures", []),
     }
+    if getattr(model, "lora_registry", None) is not None:
+        meta["lora_adapters"] = model.lora_registry.stat()
+    if getattr(model, "metrics_port", None) is not None:
+        meta["metrics_port"] = model.metrics_port
 
     if not isinstance(model.engine, _AsyncLLMEngine):
         try:
@@ -153,15 +235,15 @@ async def async_vllm_chat(
     max_tokens: int = max_length
     logprobs: Optional[int] = get_int(kwargs, "logprobs", None)
 
+    # adapters are looked up by lora_name in the registry of the deployment,
+    # an adapter_name_or_path not registered yet is registered on first use.
+    # lora_int_id is assigned by the registry.
     adapter_name_or_path: Optional[str] = kwargs.get("adapter_name_or_path", None)
-    lora_name: Optional[str] = get_str(kwargs, "lora_name", "default")
-    lora_int_id: Optional[str] = get_int(kwargs, "lora_int_id", 1)
+    lora_name: Optional[str] = get_str(kwargs, "lora_name", adapter_name_or_path)
 
-    lora_request = None
-    if adapter_name_or_path is not None:
-        lora_request = LoRARequest(
-            lora_name=lora_name, lora_int_id=lora_int_id, lora_local_path=adapter_name_or_path
-        )
+    use_lora = adapter_name_or_path is not None or (
+        lora_name and model.lora_registry.get(lora_name) is not None
+    )
 
     # repetition_penalty: float = float(kwargs.get("repetition_penalty",1.1))
 
@@ -196,31 +278,85 @@ async def async_vllm_chat(
         **other_params,
     )
 
+    lora_request = None
+    if use_lora:
+        lora_request = await _acquire_lora(model, lora_name, adapter_name_or_path)
+
+    def release_lora():
+        if lora_request is not None:
+            model.lora_registry.release(lora_request.lora_name)
+
     current_time_milliseconds = int(time.time() * 1000)
 
     if stream:
-        server = ray.get_actor("VLLM_STREAM_SERVER")
+        server = get_stream_server("VLLM_STREAM_SERVER", request_id)
 
         async def writer():
             results_generator = model.generate(
                 ins, sampling_params, request_id, lora_request=lora_request
             )
-            async for request_output in results_generator:
-                v = StreamOutputs(
-                    outputs=[
+            timer = SERVING_METRICS.request(INFERENCE_NAME)
+            flush_policy = StreamFlushPolicy(
+                getattr(model, "stream_flush_interval_ms", 30),
+                getattr(model, "stream_flush_tokens", 16),
+            )
+            # only the text generated since the last push is sent to the stream server
+            sent_text_lens = {}
+            seq = 0
+            request_output = None
+            unsent = False
+
+            async def push(request_output) -> bool:
+                nonlocal seq
+                outputs = []
+                for index, item in enumerate(request_output.outputs):
+                    sent_len = sent_text_lens.get(index, 0)
+                    outputs.append(
                         SingleOutput(
-                            text=item.text,
+                            text=item.text[sent_len:],
                             metadata=SingleOutputMeta(
                                 input_tokens_count=len(request_output.prompt_token_ids),
                                 generated_tokens_count=len(item.token_ids),
                             ),
+                            is_delta=True,
+                            seq=seq,
                         )
-                        for item in request_output.outputs
-                    ]
-                )
-                await server.add_item.remote(request_output.request_id, v)
-            # mark the request is done
-            await server.mark_done.remote(request_output.request_id)
+                    )
+                    sent_text_lens[index] = len(item.text)
+                seq += 1
+                v = StreamOutputs(outputs=outputs)
+                if not await server.add_item.remote(request_id, v):
+                    # the consumer went away, free the sequence slots for other requests
+                    await model.abort(request_id)
+                    return False
+                return True
+
+            try:
+                async for request_output in results_generator:
+                    if seq == 0 and not unsent:
+                        _observe_queue_wait(request_output)
+                    if request_output.outputs and request_output.outputs[0].token_ids:
+                        timer.first_token()
+                    generated_tokens = max(
+                        (len(item.token_ids) for item in request_output.outputs),
+                        default=0,
+                    )
+                    if not flush_policy.should_flush(
+                        generated_tokens, request_output.finished
+                    ):
+                        unsent = True
+                        continue
+                    if not await push(request_output):
+                        return
+                    flush_policy.flushed(generated_tokens)
+                    unsent = False
+                if unsent and not await push(request_output):
+                    return
+            finally:
+                timer.finish(*_usage_of(request_output))
+                release_lora()
+            # mark the request is done, request_output is None if vLLM yielded nothing
+            await server.mark_done.remote(request_id)
 
         asyncio.create_task(writer())
         await server.add_item.remote(request_id, "RUNNING")
@@ -230,7 +366,9 @@ async def async_vllm_chat(
                 {
                     "metadata": {
                         "request_id": request_id,
-                        "stream_server": "VLLM_STREAM_SERVER",
+                        "stream_server": get_stream_server_name(
+                            "VLLM_STREAM_SERVER", request_id
+                        ),
                     }
                 },
             )
@@ -239,14 +377,22 @@ async def async_vllm_chat(
     results_generator = model.generate(ins, sampling_params, request_id,lora_request=lora_request)
     final_output = None
     first_token_time = current_time_milliseconds
-    async for request_output in results_generator:
-        if (
-            first_token_time == current_time_milliseconds
-            and request_output.outputs
-            and len(request_output.outputs[0].token_ids) > 0
-        ):
-            first_token_time = int(time.time() * 1000)
-        final_output = request_output
+    timer = SERVING_METRICS.request(INFERENCE_NAME)
+    try:
+        async for request_output in results_generator:
+            if final_output is None:
+                _observe_queue_wait(request_output)
+            if (
+                first_token_time == current_time_milliseconds
+                and request_output.outputs
+                and len(request_output.outputs[0].token_ids) > 0
+            ):
+                first_token_time = int(time.time() * 1000)
+                timer.first_token()
+            final_output = request_output
+    finally:
+        timer.finish(*_usage_of(final_output))
+        release_lora()
     assert final_output is not None
 
     text_outputs = [output for output in final_output.outputs]
@@ -258,22 +404,23 @@ async def async_vllm_chat(
     input_tokens_count = len(final_output.prompt_token_ids)
     generated_tokens_count = len(text_outputs[0].token_ids)
     time_cost = current_time_milliseconds2 - current_time_milliseconds
-    print(
-        f"cost: {time_cost}ms first_token:{first_token_time-current_time_milliseconds}ms speed: {float(generated_tokens_count)/time_cost*1000} tokens/s total_tokens_count:{input_tokens_count + generated_tokens_count} request_id:{final_output.request_id}  input_tokens_count:{input_tokens_count} generated_tokens_count:{generated_tokens_count}",
-        flush=True,
+    # the latencies are observed by the SERVING_METRICS timer, this is only for debugging
+    logger.debug(
+        "cost: {}ms first_token:{}ms request_id:{} input_tokens_count:{} generated_tokens_count:{}",
+        time_cost,
+        first_token_time - current_time_milliseconds,
+        final_output.request_id,
+        input_tokens_count,
+        generated_tokens_count,
     )
 
+    # aggregated in process and pushed by a background thread
     INFER_TOKEN_METRICS.inc(
-        f"infer_{INFERENCE_NAME}_input_tokens_num",
-        input_tokens_count,
-        tags={"request_id": final_output.request_id},
+        f"infer_{INFERENCE_NAME}_input_tokens_num", input_tokens_count
     )
     INFER_TOKEN_METRICS.inc(
-        f"infer_{INFERENCE_NAME}_output_tokens_num",
-        generated_tokens_count,
-        tags={"request_id": final_output.request_id},
+        f"infer_{INFERENCE_NAME}_output_tokens_num", generated_tokens_count
     )
-    INFER_TOKEN_METRICS.push()
 
     return [
         (
@@ -300,7 +447,8 @@ def from_vllm_backend(
     num_gpus = int(sys_conf.get("num_gpus", 1))
     print(f"infer_mode:{infer_mode} tensor_parallel_size: {num_gpus}")
     global INFERENCE_NAME
-    INFERENCE_NAME = infer_params.get("udfName", "auto")
+    # the metrics are labeled with the name the model is deployed as
+    INFERENCE_NAME = infer_params.get("udfName", sys_conf.get("UDF_CLIENT", "auto"))
 
     try:
         ray.get_actor("VLLM_STREAM_SERVER")
@@ -314,6 +462,15 @@ def from_vllm_backend(
 
     worker_use_ray: bool = get_bool(infer_params, "backend.worker_use_ray", True)
 
+    metrics_port = None
+    if "metrics.port" in infer_params:
+        # a per worker prometheus exporter, next to the /metrics endpoint of
+        # the OpenAI compatible server. Workers sharing a node get a free port,
+        # reported in the meta.
+        metrics_port = SERVING_METRICS.start_exporter(
+            int(infer_params["metrics.port"])
+        )
+
     engine_use_ray: bool = validate_args_engine_use_ray()
     if "backend.engine_use_ray" in infer_params:
         engine_use_ray = get_bool(infer_params, "backend.engine_use_ray", False)
@@ -362,6 +519,28 @@ def from_vllm_backend(
     llm = AsyncLLMEngine.from_engine_args(engine_args)
     tokenizer = get_local_tokenizer(llm, engine_args)
     llm.local_tokenizer = tokenizer
+    # how often the streaming writer pushes new tokens to the stream server
+    llm.stream_flush_interval_ms = float(
+        infer_params.get("stream.flush_interval_ms", 30)
+    )
+    llm.stream_flush_tokens = int(infer_params.get("stream.flush_tokens", 16))
+    llm.metrics_port = metrics_port
+    llm.lora_registry = LoRAAdapterRegistry(
+        max_loaded=int(infer_params.get("lora.max_loaded", 0)),
+        max_memory_bytes=int(
+            float(infer_params.get("lora.max_memory_mb", 0)) * 1024 * 1024
+        ),
+    )
+    for name, path in parse_adapters(infer_params.get("lora.adapters", "")).items():
+        llm.lora_registry.register(name, path)
+    warm = infer_params.get("lora.warm", "")
+    if warm:
+        warm_lora_adapters(
+            llm,
+            list(llm.lora_registry.adapters)
+            if warm == "*"
+            else [name.strip() for name in warm.split(",") if name.strip()],
+        )
     llm.async_stream_chat = types.MethodType(async_vllm_chat, llm)
     llm.async_get_meta = types.MethodType(async_get_meta, llm)
     return (llm, tokenizer)
@@ -0,0 +1,312 @@
+import time
+import queue
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import torch
+
+from byzerllm.utils.types import StopSequenceMatcher
+
+
+@dataclass
+class GenerationRequest:
+    input_ids: List[int]
+    max_new_tokens: int
+    temperature: float = 0.1
+    top_p: float = 0.95
+    repetition_penalty: float = 1.0
+    # token id sequences, generation stops once the output ends with one of them
+    stop_sequences: List[List[int]] = field(default_factory=list)
+    stop_matcher: Optional[StopSequenceMatcher] = None
+    stop_state: int = 0
+    # stop sequences only count once this many tokens were generated
+    skip_check_min_length: int = 0
+    # like max_time of generate, counted from the start of the batch
+    timeout_s: Optional[float] = None
+    deadline: float = float("inf")
+    future: Any = None
+    loop: Any = None
+    submit_time: float = 0.0
+    first_token_time: float = 0.0
+
+
+@dataclass
+class GenerationResult:
+    output_ids: List[int]
+    input_tokens_count: int
+    # seconds
+    queue_time: float
+    first_token_time: float
+    time_cost: float
+
+
+def _select_rows(past_key_values, rows: torch.Tensor):
+    if hasattr(past_key_values, "batch_select_indices"):
+        past_key_values.batch_select_indices(rows)
+        return past_key_values
+    return tuple(
+        tuple(t.index_select(0, rows) for t in layer) for layer in past_key_values
+    )
+
+
+def _apply_repetition_penalty(
+    logits: torch.Tensor, requests: List[GenerationRequest], outputs: List[List[int]]
+) -> torch.Tensor:
+    """
+    The RepetitionPenaltyLogitsProcessor of transformers, with a penalty per
+    row: the logits of the tokens in the prompt or the output so far are
+    divided by the penalty, or multiplied when negative.
+    """
+    for i, (request, output_ids) in enumerate(zip(requests, outputs)):
+        penalty = request.repetition_penalty
+        if penalty == 1.0:
+            continue
+        ids = torch.tensor(request.input_ids + output_ids, device=logits.device)
+        scores = logits[i].gather(0, ids)
+        logits[i].scatter_(0, ids, torch.where(scores < 0, scores * penalty, scores / penalty))
+    return logits
+
+
+def _sample(logits: torch.Tensor, temperature: torch.Tensor, top_p: torch.Tensor) -> torch.Tensor:
+    """
+    One token per row; rows with a temperature of (almost) 0 are greedy.
+    temperature and top_p hold one value per row.
+    """
+    greedy = logits.argmax(dim=-1)
+    if bool((temperature <= 1e-5).all()):
+        return greedy
+    probs = torch.softmax(logits / temperature.clamp(min=1e-5).unsqueeze(-1), dim=-1)
+    sorted_probs, sorted_ids = probs.sort(dim=-1, descending=True)
+    # drop the tokens outside the top_p nucleus, the most likely one always stays
+    outside = sorted_probs.cumsum(dim=-1) - sorted_probs > top_p.unsqueeze(-1)
+    sorted_probs = sorted_probs.masked_fill(outside, 0.0)
+    sampled = sorted_ids.gather(-1, torch.multinomial(sorted_probs, 1)).squeeze(-1)
+    return torch.where(temperature <= 1e-5, greedy, sampled)
+
+
+class BatchScheduler:
+    """
+    Batched generation for the transformers backend.
+
+    Concurrent requests are collected for up to max_wait_ms into a left padded
+    batch of at most max_batch_size sequences, which is decoded step by step
+    with a shared KV cache. Every sequence stops on its own eos, stop
+    sequences or max_new_tokens; its result is returned as soon as it
+    finishes and its row is dropped from the batch, so the remaining
+    sequences run on a smaller batch.
+
+    Requests arriving while a batch runs wait for the next batch, sequences
+    do not join a running batch (dynamic rather than iteration level
+    batching).
+
+    Only requests submitted to the same worker can share a batch. Models
+    deployed by ByzerLLM.deploy with backend.continuous_batching=true get a
+    workerMaxConcurrency of at least max_batch_size, so up to that many
+    separate requests run on a worker at once and are batched together.
+
+    The model runs on a thread of its own, submit can be awaited from any
+    event loop.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        eos_token_ids: Optional[List[int]] = None,
+        pad_token_id: Optional[int] = None,
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        if eos_token_ids is None:
+            eos = getattr(getattr(model, "generation_config", None), "eos_token_id", None)
+            if eos is None:
+                eos = tokenizer.eos_token_id
+            eos_token_ids = eos if isinstance(eos, list) else ([] if eos is None else [eos])
+        self.eos_token_ids = set(eos_token_ids)
+        if pad_token_id is None:
+            pad_token_id = tokenizer.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = next(iter(self.eos_token_ids), 0)
+        self.pad_token_id = pad_token_id
+
+        self.requests: "queue.Queue[GenerationRequest]" = queue.Queue()
+        self.batches = 0
+        self.batched_sequences = 0
+        self.thread = threading.Thread(
+            target=self._run, name="byzerllm-batch-scheduler", daemon=True
+        )
+        self.thread.start()
+
+    async def submit(
+        self,
+        input_ids: List[int],
+        max_new_tokens: int,
+        temperature: float = 0.1,
+        top_p: float = 0.95,
+        stop_sequences: List[List[int]] = [],
+        repetition_penalty: float = 1.0,
+        skip_check_min_length: int = 0,
+        timeout_s: Optional[float] = None,
+    ) -> GenerationResult:
+        loop = asyncio.get_running_loop()
+        stop_sequences = [list(s) for s in stop_sequences if len(s) > 0]
+        request = GenerationRequest(
+            input_ids=list(input_ids),
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            repetition_penalty=repetition_penalty,
+            stop_sequences=stop_sequences,
+            stop_matcher=StopSequenceMatcher(stop_sequences) if stop_sequences else None,
+            skip_check_min_length=skip_check_min_length,
+            timeout_s=timeout_s,
+            future=loop.create_future(),
+            loop=loop,
+            submit_time=time.monotonic(),
+        )
+        self.requests.put(request)
+        return await request.future
+
+    def stat(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "batched_sequences": self.batched_sequences,
+            "avg_batch_size": self.batched_sequences / self.batches if self.batches else 0.0,
+            "waiting": self.requests.qsize(),
+        }
+
+    def _collect(self) -> List[GenerationRequest]:
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(
+                    self.requests.get(timeout=timeout) if timeout > 0 else self.requests.get_nowait()
+                )
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                with torch.no_grad():
+                    self._generate(batch)
+            except Exception as e:
+                for request in batch:
+                    self._finish(request, e)
+
+    def _finish(self, request: GenerationRequest, result):
+        def set_result():
+            if request.future.done():
+                return
+            if isinstance(result, Exception):
+                request.future.set_exception(result)
+            else:
+                request.future.set_result(result)
+
+        request.loop.call_soon_threadsafe(set_result)
+
+    def _is_stopped(self, request: GenerationRequest, output_ids: List[int], now: float) -> bool:
+        if request.stop_matcher is not None:
+            request.stop_state, matched = request.stop_matcher.step(
+                request.stop_state, output_ids[-1]
+            )
+            if matched and len(output_ids) >= request.skip_check_min_length:
+                return True
+        return (
+            output_ids[-1] in self.eos_token_ids
+            or len(output_ids) >= request.max_new_tokens
+            or now >= request.deadline
+        )
+
+    def _generate(self, batch: List[GenerationRequest]):
+        self.batches += 1
+        self.batched_sequences += len(batch)
+        device = self.model.device
+        start = time.monotonic()
+        for r in batch:
+            if r.timeout_s is not None:
+                r.deadline = start + r.timeout_s
+
+        # left padding, so the next token of every row is at the last position
+        max_len = max(len(r.input_ids) for r in batch)
+        input_ids = torch.full((len(batch), max_len), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), max_len), dtype=torch.long)
+        for i, r in enumerate(batch):
+            input_ids[i, max_len - len(r.input_ids):] = torch.tensor(r.input_ids, dtype=torch.long)
+            attention_mask[i, max_len - len(r.input_ids):] = 1
+        input_ids = input_ids.to(device)
+        attention_mask = attention_mask.to(device)
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+
+        temperature = torch.tensor([r.temperature for r in batch], device=device, dtype=torch.float)
+        top_p = torch.tensor([r.top_p for r in batch], device=device, dtype=torch.float)
+
+        active = list(batch)
+        outputs: List[List[int]] = [[] for _ in batch]
+        out = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            use_cache=True,
+        )
+        while True:
+            logits = _apply_repetition_penalty(out.logits[:, -1, :].float(), active, outputs)
+            next_tokens = _sample(logits, temperature, top_p)
+            now = time.monotonic()
+            keep = []
+            for i, (request, token) in enumerate(zip(active, next_tokens.tolist())):
+                outputs[i].append(token)
+                if len(outputs[i]) == 1:
+                    request.first_token_time = now
+                if self._is_stopped(request, outputs[i], now):
+                    output_ids = outputs[i]
+                    if output_ids[-1] in self.eos_token_ids:
+                        output_ids = output_ids[:-1]
+                    self._finish(
+                        request,
+                        GenerationResult(
+                            output_ids=output_ids,
+                            input_tokens_count=len(request.input_ids),
+                            queue_time=start - request.submit_time,
+                            first_token_time=request.first_token_time - request.submit_time,
+                            time_cost=now - request.submit_time,
+                        ),
+                    )
+                else:
+                    keep.append(i)
+            if not keep:
+                return
+
+            past_key_values = out.past_key_values
+            if len(keep) < len(active):
+                rows = torch.tensor(keep, device=device)
+                past_key_values = _select_rows(past_key_values, rows)
+                next_tokens = next_tokens.index_select(0, rows)
+                attention_mask = attention_mask.index_select(0, rows)
+                position_ids = position_ids.index_select(0, rows)
+                temperature = temperature.index_select(0, rows)
+                top_p = top_p.index_select(0, rows)
+                active = [active[i] for i in keep]
+                outputs = [outputs[i] for i in keep]
+
+            attention_mask = torch.cat(
+                [attention_mask, attention_mask.new_ones((len(active), 1))], dim=-1
+            )
+            position_ids = position_ids[:, -1:] + 1
+            out = self.model(
+                input_ids=next_tokens.unsqueeze(-1),
+                attention_mask=attention_mask,
+                position_ids=position_ids,
+                past_key_values=past_key_values,
+                use_cache=True,
+            )
@@ -0,0 +1,149 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class LoRAAdapter:
+    name: str
+    path: str
+    lora_int_id: int
+    size_bytes: int
+
+
+def adapter_size_bytes(path: str) -> int:
+    """Size of the adapter weights on disk, 0 if path is not a local path."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            for f in files:
+                if f.endswith((".safetensors", ".bin", ".pt")):
+                    total += os.path.getsize(os.path.join(root, f))
+    return total
+
+
+def parse_adapters(s: str) -> Dict[str, str]:
+    """"tenant_a=/models/lora_a,tenant_b=/models/lora_b" -> {name: path}"""
+    adapters = {}
+    for item in s.split(","):
+        if not item.strip():
+            continue
+        if "=" not in item:
+            raise Exception(f"LoRA adapters should be given as name=path, got {item}")
+        name, path = item.split("=", 1)
+        adapters[name.strip()] = path.strip()
+    return adapters
+
+
+class LoRAAdapterRegistry:
+    """
+    The LoRA adapters a vLLM deployment serves, by name.
+
+    Adapters get their vLLM lora_int_id on registration, so callers only
+    refer to them by name. The registry keeps track of the adapters resident
+    on the engine in LRU order: loading one more than max_loaded adapters, or
+    more than max_memory_bytes of adapter weights, evicts the least recently
+    used adapters that no running request uses. A budget of 0 means no limit.
+    """
+
+    def __init__(self, max_loaded: int = 0, max_memory_bytes: int = 0):
+        self.max_loaded = max_loaded
+        self.max_memory_bytes = max_memory_bytes
+        self.adapters: Dict[str, LoRAAdapter] = {}
+        # name -> None, least recently used first
+        self.resident: "OrderedDict[str, None]" = OrderedDict()
+        self.resident_bytes = 0
+        self.in_use: Dict[str, int] = {}
+        self.next_id = 1
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def register(self, name: str, path: str, size_bytes: Optional[int] = None) -> LoRAAdapter:
+        with self.lock:
+            adapter = self.adapters.get(name, None)
+            if adapter is not None:
+                if adapter.path != path:
+                    raise Exception(
+                        f"LoRA adapter {name} is already registered with {adapter.path}"
+                    )
+                return adapter
+            adapter = LoRAAdapter(
+                name=name,
+                path=path,
+                lora_int_id=self.next_id,
+                size_bytes=adapter_size_bytes(path) if size_bytes is None else size_bytes,
+            )
+            self.next_id += 1
+            self.adapters[name] = adapter
+            return adapter
+
+    def get(self, name: str) -> Optional[LoRAAdapter]:
+        return self.adapters.get(name, None)
+
+    def acquire(self, name: str) -> Tuple[LoRAAdapter, List[LoRAAdapter]]:
+        """
+        Marks the adapter as used by a request and resident. Returns it with
+        the adapters to unload from the engine to stay within the budget.
+        Every acquire must be followed by a release.
+        """
+        with self.lock:
+            adapter = self.adapters.get(name, None)
+            if adapter is None:
+                raise Exception(f"LoRA adapter {name} is not registered")
+            self.in_use[name] = self.in_use.get(name, 0) + 1
+            if name in self.resident:
+                self.resident.move_to_end(name)
+                self.hits += 1
+                return adapter, []
+
+            self.loads += 1
+            self.resident[name] = None
+            self.resident_bytes += adapter.size_bytes
+            return adapter, self._evict()
+
+    def release(self, name: str):
+        with self.lock:
+            count = self.in_use.get(name, 0) - 1
+            if count > 0:
+                self.in_use[name] = count
+            else:
+                self.in_use.pop(name, None)
+
+    def _over_budget(self) -> bool:
+        return (self.max_loaded > 0 and len(self.resident) > self.max_loaded) or (
+            self.max_memory_bytes > 0 and self.resident_bytes > self.max_memory_bytes
+        )
+
+    def _evict(self) -> List[LoRAAdapter]:
+        evicted = []
+        for name in list(self.resident):
+            if not self._over_budget():
+                break
+            if name in self.in_use:
+                continue
+            del self.resident[name]
+            adapter = self.adapters[name]
+            self.resident_bytes -= adapter.size_bytes
+            self.evictions += 1
+            evicted.append(adapter)
+        return evicted
+
+    def stat(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "registered": len(self.adapters),
+                "resident": list(self.resident),
+                "resident_bytes": self.resident_bytes,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / (self.hits + self.loads)
+                if self.hits + self.loads
+                else 0.0,
+            }
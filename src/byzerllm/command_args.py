@@ -265,6 +265,22 @@ def get_command_args(input_args: Optional[List[str]] = None):
     serve_cmd.add_argument("--ssl_keyfile", default="", help="")
     serve_cmd.add_argument("--ssl_certfile", default="", help="")
     serve_cmd.add_argument("--response_role", default="assistant", help="")
+    serve_cmd.add_argument("--semantic_cache", action="store_true", help="")
+    serve_cmd.add_argument(
+        "--semantic_cache_threshold", type=float, default=0.95, help=""
+    )
+    serve_cmd.add_argument("--semantic_cache_ttl", type=float, default=3600, help="")
+    serve_cmd.add_argument("--semantic_cache_emb_model", default="", help="")
+    serve_cmd.add_argument(
+        "--embedding_batch_wait_ms", type=float, default=5, help=""
+    )
+    serve_cmd.add_argument("--embedding_max_batch_size", type=int, default=64, help="")
+    serve_cmd.add_argument("--admission_max_in_flight", type=int, default=0, help="")
+    serve_cmd.add_argument("--admission_max_queue", type=int, default=128, help="")
+    serve_cmd.add_argument(
+        "--admission_queue_timeout", type=float, default=30, help=""
+    )
+    serve_cmd.add_argument("--admission_priority_api_keys", default="", help="")
     serve_cmd.add_argument(
         "--template", default="auto", help=locales["help_template"][lang]
     )
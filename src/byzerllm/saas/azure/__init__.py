@@ -1,7 +1,7 @@
 import time
 from typing import List, Tuple, Dict, Any, Union
 import ray
-from byzerllm.utils.types import BlockVLLMStreamServer, StreamOutputs, SingleOutput, SingleOutputMeta, BlockBinaryStreamServer
+from byzerllm.utils.types import BlockVLLMStreamServer, StreamOutputs, SingleOutput, SingleOutputMeta, BlockBinaryStreamServer, get_stream_server, get_stream_server_name
 import threading
 import asyncio
 import traceback
@@ -132,10 +132,10 @@ class CustomSaasAPI:
                 "speed": 0,
             }})]
         else:
-            server = ray.get_actor("BlockBinaryStreamServer")
+            request_id[0] = str(uuid.uuid4())
+            server = get_stream_server("BlockBinaryStreamServer", request_id[0])
             
             def writer():
-                request_id[0] = str(uuid.uuid4())
                 pull_stream = speechsdk.audio.PullAudioOutputStream()            
                 stream_config = speechsdk.audio.AudioOutputConfig(stream=pull_stream) 
                 speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=stream_config)                                
@@ -148,13 +148,15 @@ class CustomSaasAPI:
                         audio_buffer = bytes(32000)                          
                         filled_size = pull_stream.read(audio_buffer)
                         while filled_size > 0:                                                                                                                                    
-                            ray.get(server.add_item.remote(request_id[0], 
+                            if not ray.get(server.add_item.remote(request_id[0], 
                                                            StreamOutputs(outputs=[SingleOutput(text=audio_buffer[0:filled_size], 
                                                                                                               metadata=SingleOutputMeta(
                                         input_tokens_count=0,
                                         generated_tokens_count=0,
                                     ))])
-                                ))
+                                )):
+                                # the consumer went away, stop reading the upstream stream
+                                break
                             filled_size = pull_stream.read(audio_buffer)                                                                                                    
                     else:
                         raise Exception(f"Failed to synthesize audio: {result.reason}")                                       
@@ -165,19 +167,12 @@ class CustomSaasAPI:
                                         
             threading.Thread(target=writer, daemon=True).start()
                    
-            time_count = 10 * 100
-            while request_id[0] is None and time_count > 0:
-                await asyncio.sleep(0.01)
-                time_count -= 1
-
-            if request_id[0] is None:
-                raise Exception("Failed to get request id")
 
             def write_running():
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
 
             await asyncio.to_thread(write_running)
-            return [("", {"metadata": {"request_id": request_id[0], "stream_server": "BlockBinaryStreamServer"}})]
+            return [("", {"metadata": {"request_id": request_id[0], "stream_server": get_stream_server_name("BlockBinaryStreamServer", request_id[0])}})]
             
 
     def speech_to_text(self, ins: str, **kwargs):
@@ -2,6 +2,7 @@ import asyncio
 import json
 import threading
 import time
+import uuid
 import traceback
 from typing import List, Dict, Any, Union
 import ray
@@ -12,6 +13,8 @@ from byzerllm.utils.types import (
     StreamOutputs,
     SingleOutput,
     SingleOutputMeta,
+    get_stream_server,
+    get_stream_server_name,
 )
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 
@@ -183,8 +186,8 @@ class CustomSaasAPI:
             raise e
 
         if stream:
-            server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-            request_id = [None]
+            request_id = [str(uuid.uuid4())]
+            server = get_stream_server("BLOCK_VLLM_STREAM_SERVER", request_id[0])
 
             def writer():
                 input_tokens = 0
@@ -192,13 +195,12 @@ class CustomSaasAPI:
                 for response in res_data:
 
                     if response.type == "message_start":
-                        request_id[0] = response.message.id
                         input_tokens = response.message.usage.input_tokens
 
                     if response.type == "content_block_delta":
                         v = response.delta.text
                         r += v
-                        server.add_item.remote(
+                        if not ray.get(server.add_item.remote(
                             request_id[0],
                             StreamOutputs(
                                 outputs=[
@@ -211,9 +213,12 @@ class CustomSaasAPI:
                                     )
                                 ]
                             ),
-                        )
+                        )):
+                            # the consumer went away, stop reading the upstream stream
+                            res_data.close()
+                            break
                     if response.type == "message_delta":
-                        server.add_item.remote(
+                        if not ray.get(server.add_item.remote(
                             request_id[0],
                             StreamOutputs(
                                 outputs=[
@@ -226,19 +231,15 @@ class CustomSaasAPI:
                                     )
                                 ]
                             ),
-                        )
+                        )):
+                            # the consumer went away, stop reading the upstream stream
+                            res_data.close()
+                            break
 
                 server.mark_done.remote(request_id[0])
 
             threading.Thread(target=writer, daemon=True).start()
 
-            time_count = 10 * 100
-            while request_id[0] is None and time_count > 0:
-                await asyncio.sleep(0.01)
-                time_count -= 1
-
-            if request_id[0] is None:
-                raise Exception("Failed to get request id")
 
             def write_running():
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
@@ -250,7 +251,7 @@ class CustomSaasAPI:
                     {
                         "metadata": {
                             "request_id": request_id[0],
-                            "stream_server": "BLOCK_VLLM_STREAM_SERVER",
+                            "stream_server": get_stream_server_name("BLOCK_VLLM_STREAM_SERVER", request_id[0]),
                         }
                     },
                 )
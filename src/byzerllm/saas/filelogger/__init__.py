@@ -12,6 +12,8 @@ from byzerllm.utils.types import (
     SingleOutput,
     SingleOutputMeta,
     BlockBinaryStreamServer,
+    get_stream_server,
+    get_stream_server_name,
 )
 
 
@@ -160,15 +162,15 @@ class CustomSaasAPI:
         if not stream:
             return await self.chat_oai(messages, **kwargs)
 
-        server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
         request_id = str(uuid.uuid4())
+        server = get_stream_server("BLOCK_VLLM_STREAM_SERVER", request_id)
 
         async def writer():
             try:
                 message = "Messages logged successfully"
                 for i in range(len(message)):
-                    chunk = message[: i + 1]
-                    await server.add_item.remote(
+                    chunk = message[i : i + 1]
+                    if not await server.add_item.remote(
                         request_id,
                         StreamOutputs(
                             outputs=[
@@ -178,10 +180,14 @@ class CustomSaasAPI:
                                         input_tokens_count=0,
                                         generated_tokens_count=i + 1,
                                     ),
+                                    is_delta=True,
+                                    seq=i,
                                 )
                             ]
                         ),
-                    )
+                    ):
+                        # the consumer went away, stop reading the upstream stream
+                        break
                 await server.mark_done.remote(request_id)
             except Exception as e:
                 logger.error(f"Error in stream writing: {e}")
@@ -196,7 +202,9 @@ class CustomSaasAPI:
                 {
                     "metadata": {
                         "request_id": request_id,
-                        "stream_server": "BLOCK_VLLM_STREAM_SERVER",
+                        "stream_server": get_stream_server_name(
+                            "BLOCK_VLLM_STREAM_SERVER", request_id
+                        ),
                     }
                 },
             )
@@ -5,7 +5,7 @@ import google.generativeai as genai
 from google.generativeai.types import content_types
 import time
 import ray
-from byzerllm.utils import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta
+from byzerllm.utils import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta,get_stream_server,get_stream_server_name
 import threading
 import asyncio
 from byzerllm.utils.langutil import asyncfy_with_semaphore
@@ -67,39 +67,33 @@ class CustomSaasAPI:
         res_data = await asyncfy_with_semaphore(lambda:self.client.generate_content(contents=new_messages,stream=stream))()
         
         if stream:            
-            server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-            request_id = [None]
+            request_id = [str(uuid.uuid4())]
+            server = get_stream_server("BLOCK_VLLM_STREAM_SERVER", request_id[0])
            
             def writer(): 
                 r = ""
                 for response in res_data:                                        
                     v = response.text
                     r += v
-                    request_id[0] = str(uuid.uuid4())                        
-                    ray.get(server.add_item.remote(request_id[0], 
+                    if not ray.get(server.add_item.remote(request_id[0], 
                                                     StreamOutputs(outputs=[SingleOutput(text=r,metadata=SingleOutputMeta(
                                                         input_tokens_count=0,
                                                         generated_tokens_count=0,
                                                     ))])
-                                                    ))
+                                                    )):
+                        # the consumer went away, stop reading the upstream stream
+                        break
                     
                 ray.get(server.mark_done.remote(request_id[0]))
 
             threading.Thread(target=writer,daemon=True).start()            
                                
-            time_count= 10*100
-            while request_id[0] is None and time_count > 0:
-                await asyncio.sleep(0.01)
-                time_count -= 1
-            
-            if request_id[0] is None:
-                raise Exception("Failed to get request id")
             
             def write_running():
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
                         
             await asyncio.to_thread(write_running)
-            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BLOCK_VLLM_STREAM_SERVER"}})]  
+            return [("",{"metadata":{"request_id":request_id[0],"stream_server": get_stream_server_name("BLOCK_VLLM_STREAM_SERVER", request_id[0])}})]  
               
         time_cost = time.monotonic() - start_time
         
@@ -12,6 +12,8 @@ from byzerllm.utils.types import (
     SingleOutput,
     SingleOutputMeta,
     BlockBinaryStreamServer,
+    get_stream_server,
+    get_stream_server_name,
 )
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 import threading
@@ -207,19 +209,18 @@ class CustomSaasAPI:
         self, stream: bool, ins: str, voice: str, chunk_size: int = None, **kwargs
     ):
         if stream:
-            server = ray.get_actor("BlockBinaryStreamServer")
-            request_id = [None]
+            request_id = [str(uuid.uuid4())]
+            server = get_stream_server("BlockBinaryStreamServer", request_id[0])
 
             def writer():
                 try:
-                    request_id[0] = str(uuid.uuid4())
                     with self.client.with_streaming_response.audio.speech.create(
                         model=self.model, voice=voice, input=ins, **kwargs
                     ) as response:
                         for chunk in response.iter_bytes(chunk_size):
                             input_tokens_count = 0
                             generated_tokens_count = 0
-                            ray.get(
+                            if not ray.get(
                                 server.add_item.remote(
                                     request_id[0],
                                     StreamOutputs(
@@ -234,20 +235,16 @@ class CustomSaasAPI:
                                         ]
                                     ),
                                 )
-                            )
+                            ):
+                                # the consumer went away, stop reading the upstream stream
+                                response.close()
+                                break
                 except:
                     traceback.print_exc()
                 ray.get(server.mark_done.remote(request_id[0]))
 
             threading.Thread(target=writer, daemon=True).start()
 
-            time_count = 10 * 100
-            while request_id[0] is None and time_count > 0:
-                await asyncio.sleep(0.01)
-                time_count -= 1
-
-            if request_id[0] is None:
-                raise Exception("Failed to get request id")
 
             def write_running():
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
@@ -259,7 +256,7 @@ class CustomSaasAPI:
                     {
                         "metadata": {
                             "request_id": request_id[0],
-                            "stream_server": "BlockBinaryStreamServer",
+                            "stream_server": get_stream_server_name("BlockBinaryStreamServer", request_id[0]),
                         }
                     },
                 )
@@ -495,12 +492,11 @@ class CustomSaasAPI:
                 audio_data = f"data:audio/${tpe};base64," + audio_data
             return await self.async_speech_to_text(audio=audio_data)
 
-        server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-        request_id = [None]
+        request_id = [str(uuid.uuid4())]
+        server = get_stream_server("BLOCK_VLLM_STREAM_SERVER", request_id[0])
 
         def writer():
             try:
-                r = ""
                 response = self.client.chat.completions.create(
                     messages=messages,
                     model=model,
@@ -512,33 +508,36 @@ class CustomSaasAPI:
                 # input_tokens_count = 0
                 # generated_tokens_count = 0
 
-                request_id[0] = str(uuid.uuid4())
 
-                for chunk in response:
+                for seq, chunk in enumerate(response):
                     content = chunk.choices[0].delta.content or ""
-                    r += content
                     if hasattr(chunk, "usage") and chunk.usage:
                         input_tokens_count = chunk.usage.prompt_tokens
                         generated_tokens_count = chunk.usage.completion_tokens
                     else:
                         input_tokens_count = 0
                         generated_tokens_count = 0
-                    ray.get(
+                    if not ray.get(
                         server.add_item.remote(
                             request_id[0],
                             StreamOutputs(
                                 outputs=[
                                     SingleOutput(
-                                        text=r,
+                                        text=content,
                                         metadata=SingleOutputMeta(
                                             input_tokens_count=input_tokens_count,
                                             generated_tokens_count=generated_tokens_count,
                                         ),
+                                        is_delta=True,
+                                        seq=seq,
                                     )
                                 ]
                             ),
                         )
-                    )
+                    ):
+                        # the consumer went away, stop reading the upstream stream
+                        response.close()
+                        break
             except:
                 traceback.print_exc()
             ray.get(server.mark_done.remote(request_id[0]))
@@ -546,13 +545,6 @@ class CustomSaasAPI:
         if stream:
             threading.Thread(target=writer, daemon=True).start()
 
-            time_count = 60 * 100
-            while request_id[0] is None and time_count > 0:
-                await asyncio.sleep(0.01)
-                time_count -= 1
-
-            if request_id[0] is None:
-                raise Exception("Failed to get request id")
 
             def write_running():
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
@@ -564,7 +556,7 @@ class CustomSaasAPI:
                     {
                         "metadata": {
                             "request_id": request_id[0],
-                            "stream_server": "BLOCK_VLLM_STREAM_SERVER",
+                            "stream_server": get_stream_server_name("BLOCK_VLLM_STREAM_SERVER", request_id[0]),
                         }
                     },
                 )
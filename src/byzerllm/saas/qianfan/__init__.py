@@ -5,7 +5,7 @@ import threading
 import asyncio
 import ray
 
-from byzerllm.utils import random_uuid
+from byzerllm.utils import random_uuid,get_stream_server,get_stream_server_name
 from byzerllm.log import init_logger
 from byzerllm.utils.types import BlockVLLMStreamServer, StreamOutputs, SingleOutput, SingleOutputMeta
 from byzerllm.utils.langutil import asyncfy_with_semaphore
@@ -99,37 +99,31 @@ class CustomSaasAPI:
         ))()
         
         if stream:
-            server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-            request_id = [None]
+            request_id = [request_id]
+            server = get_stream_server("BLOCK_VLLM_STREAM_SERVER", request_id[0])
 
             def writer(): 
                 for response in res_data:                                        
                     if response["code"] == 200:
                         v = response["result"]
-                        request_id[0] = f'qianfan_{response["id"]}'
-                        ray.get(server.add_item.remote(request_id[0], 
+                        if not ray.get(server.add_item.remote(request_id[0], 
                                                        StreamOutputs(outputs=[SingleOutput(text=v,metadata=SingleOutputMeta(
                                                            input_tokens_count=response["usage"]["prompt_tokens"],
                                                            generated_tokens_count=response["usage"]["completion_tokens"],
                                                        ))])
-                                                       ))                                            
+                                                       )):
+                            # the consumer went away, stop reading the upstream stream
+                            break
                 ray.get(server.mark_done.remote(request_id[0]))
 
             threading.Thread(target=writer,daemon=True).start()            
                                
-            time_count= 10*100
-            while request_id[0] is None and time_count > 0:
-                await asyncio.sleep(0.01)
-                time_count -= 1
-            
-            if request_id[0] is None:
-                raise Exception("Failed to get request id")
             
             def write_running():
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
                         
             await asyncio.to_thread(write_running)
-            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BLOCK_VLLM_STREAM_SERVER"}})] 
+            return [("",{"metadata":{"request_id":request_id[0],"stream_server": get_stream_server_name("BLOCK_VLLM_STREAM_SERVER", request_id[0])}})] 
 
         time_cost = time.monotonic() - start_time
 
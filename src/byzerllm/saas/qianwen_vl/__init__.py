@@ -4,7 +4,7 @@ import dashscope
 from dashscope.api_entities.dashscope_response import MultiModalConversationResponse
 import time
 import ray
-from byzerllm.utils.types import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta
+from byzerllm.utils.types import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta,get_stream_server,get_stream_server_name
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 import threading
 import asyncio
@@ -72,20 +72,22 @@ class CustomSaasAPI:
                                             **other_params))()
         
         if stream:            
-            server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-            request_id = [None]
+            request_id = [str(uuid.uuid4())]
+            server = get_stream_server("BLOCK_VLLM_STREAM_SERVER", request_id[0])
 
             def writer(): 
                 for response in res_data:                                        
                     if response.status_code == HTTPStatus.OK:
                         v = response.output.choices[0].message.content[0]["text"]                        
-                        request_id[0] = response.request_id                        
-                        ray.get(server.add_item.remote(request_id[0], 
+                        if not ray.get(server.add_item.remote(request_id[0], 
                                                        StreamOutputs(outputs=[SingleOutput(text=v,metadata=SingleOutputMeta(
                                                            input_tokens_count=response.usage.input_tokens,
                                                            generated_tokens_count=response.usage.output_tokens,
                                                        ))]) 
-                                                       ))
+                                                       )):
+                            # the consumer went away, stop reading the upstream stream
+                            res_data.close()
+                            break
                         
                     else:
                         print('Request id: %s, Status code: %s, error code: %s, error message: %s' % (
@@ -96,19 +98,12 @@ class CustomSaasAPI:
 
             threading.Thread(target=writer,daemon=True).start()            
                                
-            time_count= 10*100
-            while request_id[0] is None and time_count > 0:
-                await asyncio.sleep(0.01)
-                time_count -= 1
-            
-            if request_id[0] is None:
-                raise Exception("Failed to get request id")
             
             def write_running():
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
                         
             await asyncio.to_thread(write_running)
-            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BLOCK_VLLM_STREAM_SERVER"}})]
+            return [("",{"metadata":{"request_id":request_id[0],"stream_server": get_stream_server_name("BLOCK_VLLM_STREAM_SERVER", request_id[0])}})]
               
         time_cost = time.monotonic() - start_time
         
@@ -5,7 +5,7 @@ import base64
 import io    
 import json
 import ray
-from byzerllm.utils.types import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta,BlockBinaryStreamServer
+from byzerllm.utils.types import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta,BlockBinaryStreamServer,get_stream_server,get_stream_server_name
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 import threading
 import asyncio
@@ -120,10 +120,10 @@ class CustomSaasAPI:
                     }
         request_id = [None]
         if stream:
-            server = ray.get_actor("BlockBinaryStreamServer")            
+            request_id[0] = str(uuid.uuid4())
+            server = get_stream_server("BlockBinaryStreamServer", request_id[0])
                         
             def writer():
-                request_id[0] = str(uuid.uuid4())
                 request_json["user"]["uid"] = request_id[0]
                 request_json["request"]["reqid"] = request_id[0]
                 try:                                                                         
@@ -131,12 +131,15 @@ class CustomSaasAPI:
                     if "data" in response.json():
                         data = response.json()["data"]
                         chunk = base64.b64decode(data)
-                        ray.get(server.add_item.remote(request_id[0], 
+                        if not ray.get(server.add_item.remote(request_id[0], 
                                                         StreamOutputs(outputs=[SingleOutput(text=chunk,metadata=SingleOutputMeta(
                                                             input_tokens_count=0,
                                                             generated_tokens_count=0,
                                                         ))])
-                                                        ))                                                                                                                                                          
+                                                        )):
+                            # the consumer went away while the audio was synthesized,
+                            # the stream server has dropped the request already
+                            print(f"Request id: {request_id[0]}, the consumer went away, the audio is dropped",flush=True)
                 except:
                     traceback.print_exc()            
                 ray.get(server.mark_done.remote(request_id[0]))
@@ -144,19 +147,12 @@ class CustomSaasAPI:
             
             threading.Thread(target=writer,daemon=True).start()            
                             
-            time_count= 10*100
-            while request_id[0] is None and time_count > 0:
-                await asyncio.sleep(0.01)
-                time_count -= 1
-            
-            if request_id[0] is None:
-                raise Exception("Failed to get request id")
             
             def write_running():
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
                         
             await asyncio.to_thread(write_running)
-            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BlockBinaryStreamServer"}})]                   
+            return [("",{"metadata":{"request_id":request_id[0],"stream_server": get_stream_server_name("BlockBinaryStreamServer", request_id[0])}})]                   
     
         start_time = time.monotonic()     
         request_id[0] = str(uuid.uuid4())
@@ -1,8 +1,9 @@
 from zhipuai import ZhipuAI
 import time
+import uuid
 from typing import List, Tuple, Dict,Any
 import ray
-from byzerllm.utils.types import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta
+from byzerllm.utils.types import BlockVLLMStreamServer,StreamOutputs,SingleOutput,SingleOutputMeta,get_stream_server,get_stream_server_name
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 import threading
 import asyncio
@@ -75,38 +76,30 @@ class CustomSaasAPI:
                             messages=messages,**other_params))()
         
         if stream:            
-            server = ray.get_actor("BLOCK_VLLM_STREAM_SERVER")
-            request_id = [None]
+            request_id = [str(uuid.uuid4())]
+            server = get_stream_server("BLOCK_VLLM_STREAM_SERVER", request_id[0])
 
             def writer(): 
-                r = ""
-                for response in res_data:                                        
-                    v = response.choices[0].delta.content
-                    r += v
-                    request_id[0] = f"zhipu_{response.id}"
-                    ray.get(server.add_item.remote(request_id[0], 
-                                                    StreamOutputs(outputs=[SingleOutput(text=r,metadata=SingleOutputMeta(
+                for seq,response in enumerate(res_data):                                        
+                    v = response.choices[0].delta.content or ""
+                    if not ray.get(server.add_item.remote(request_id[0], 
+                                                    StreamOutputs(outputs=[SingleOutput(text=v,metadata=SingleOutputMeta(
                                                         input_tokens_count= -1,
                                                         generated_tokens_count= -1,
-                                                    ))])
-                                                    ))
+                                                    ),is_delta=True,seq=seq)])
+                                                    )):
+                        # the consumer went away, stop reading the upstream stream
+                        break
                 ray.get(server.mark_done.remote(request_id[0]))
 
             threading.Thread(target=writer,daemon=True).start()            
                                
-            time_count= 10*100
-            while request_id[0] is None and time_count > 0:
-                await asyncio.sleep(0.01)
-                time_count -= 1
-            
-            if request_id[0] is None:
-                raise Exception("Failed to get request id")
             
             def write_running():
                 return ray.get(server.add_item.remote(request_id[0], "RUNNING"))
                         
             await asyncio.to_thread(write_running)
-            return [("",{"metadata":{"request_id":request_id[0],"stream_server":"BLOCK_VLLM_STREAM_SERVER"}})] 
+            return [("",{"metadata":{"request_id":request_id[0],"stream_server": get_stream_server_name("BLOCK_VLLM_STREAM_SERVER", request_id[0])}})] 
       
         time_cost = time.monotonic() - start_time
         generated_text = res_data.choices[0].message.content        
@@ -20,6 +20,14 @@ from byzerllm.utils import (
     format_prompt_jinja2,
 )
 from byzerllm.utils.ray_utils import cancel_placement_group, get_actor_info
+from byzerllm.utils.client.worker_lease import WorkerLeasePool
+from byzerllm.utils.client.response_cache import ResponseCache
+from byzerllm.utils.client.semantic_cache import SemanticCache
+from byzerllm.utils.client.load_balance import (
+    LOAD_BALANCERS,
+    LoadBalancer,
+    estimate_tokens,
+)
 from byzerllm.utils.json_repaire import repair_json_str
 import byzerllm
 import json
@@ -28,7 +36,6 @@ import time
 import functools
 import inspect
 import pydantic
-import copy
 import traceback
 from enum import Enum
 from loguru import logger
@@ -85,6 +92,8 @@ class ByzerLLM:
         self.mapping_role_mapping = {}
         self.mapping_extra_generation_params = {}
         self.mapping_clean_func = {}
+        self.mapping_skip_nontext_check = {}
+        self.mapping_wire_format = {}
 
         self.mapping_function_calling_format_func = {}
         self.mapping_response_class_format_func = {}
@@ -108,6 +117,12 @@ class ByzerLLM:
         if "default_max_output_length" in kwargs:
             self.default_max_output_length = kwargs["default_max_output_length"]
 
+        # how long (seconds) a stream consumer blocks on the stream server
+        # waiting for new output before checking again
+        self.stream_wait_timeout = 1.0
+        if "stream_wait_timeout" in kwargs:
+            self.stream_wait_timeout = kwargs["stream_wait_timeout"]
+
         self.default_model_name = None
         self.default_emb_model_name = None
         self.default_rerank_model_name = None
@@ -119,6 +134,16 @@ class ByzerLLM:
 
         self.pin_model_worker_mapping = None
 
+        self.worker_lease_size = 0
+        self.worker_lease_idle_timeout_s = 30.0
+        self.worker_lease_pools: Dict[str, WorkerLeasePool] = {}
+        self.load_balancers: Dict[str, LoadBalancer] = {}
+        # cleanup tasks that must outlive a cancelled request
+        self.background_tasks = set()
+        self.response_cache: Optional[ResponseCache] = None
+        self.semantic_cache: Optional[SemanticCache] = None
+        self.semantic_cache_emb_model = None
+
         if url is not None and self.sql_model:
             v = globals()
             self.context = v["context"]
@@ -178,6 +203,15 @@ class ByzerLLM:
                     return value
         return None
 
+    def close(self):
+        """
+        Give the leased worker slots back to the model masters. Call it when
+        the client is no longer used, e.g. when the server shuts down.
+        """
+        for pool in self.worker_lease_pools.values():
+            pool.close()
+        self.worker_lease_pools = {}
+
     def setup_reset(self):
         self.sys_conf = self.default_sys_conf.copy()
         self.context.conf = self.sys_conf
@@ -188,10 +222,287 @@ class ByzerLLM:
         self.pin_model_worker_mapping = pin_model_worker_mapping
         return self
 
+    def setup_worker_lease(
+        self, lease_size: int = 8, idle_timeout_s: float = 30.0
+    ) -> "ByzerLLM":
+        """
+        Keep up to lease_size worker slots per model leased from the model's
+        UDF master and reuse them across requests, so a request no longer
+        needs the master's get/give_back round trips. Slots idle for longer
+        than idle_timeout_s are given back. lease_size <= 0 turns it off.
+        """
+        self.worker_lease_size = lease_size
+        self.worker_lease_idle_timeout_s = idle_timeout_s
+        for pool in self.worker_lease_pools.values():
+            pool.close()
+        self.worker_lease_pools = {}
+        return self
+
+    def _get_worker_lease_pool(self, model: str, udf_master) -> Optional[WorkerLeasePool]:
+        if self.worker_lease_size <= 0:
+            return None
+        pool = self.worker_lease_pools.get(model, None)
+        if pool is None or not pool.is_for(udf_master):
+            if pool is not None:
+                pool.close()
+            pool = WorkerLeasePool(
+                udf_master,
+                lease_size=self.worker_lease_size,
+                idle_timeout_s=self.worker_lease_idle_timeout_s,
+            )
+            self.worker_lease_pools[model] = pool
+        return pool
+
+    def setup_response_cache(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 256 * 1024 * 1024,
+        disk_path: Optional[str] = None,
+        only_deterministic: bool = True,
+    ) -> "ByzerLLM":
+        """
+        Cache chat_oai/achat_oai responses keyed on the model and the rendered
+        request, so a repeated request skips the model call. Only requests with
+        temperature 0 are cached unless only_deterministic is False. With
+        disk_path the cache is also kept in a sqlite database and survives
+        restarts. Hit/miss stats are available via `llm.response_cache.stat()`.
+        """
+        self.response_cache = ResponseCache(
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            disk_path=disk_path,
+            only_deterministic=only_deterministic,
+        )
+        return self
+
+    def _response_cache_key(
+        self, model: str, input_value: List[Dict[str, Any]]
+    ) -> Optional[str]:
+        if self.response_cache is None or len(input_value) != 1:
+            return None
+        return self.response_cache.key(model, input_value[0])
+
+    def setup_semantic_cache(
+        self,
+        threshold: float = 0.95,
+        ttl_s: float = 3600.0,
+        max_entries: int = 10000,
+        emb_model: Optional[str] = None,
+        match_history: bool = True,
+    ) -> "ByzerLLM":
+        """
+        Cache plain chat_oai/achat_oai responses by the meaning of the last user
+        message: it is embedded with emb_model (the default emb model if not
+        set) and a cached response of a message with cosine similarity >=
+        threshold, the same earlier turns and the same generation params is
+        returned. Only requests with temperature 0 are cached. Checked after
+        the exact response cache, if both are set up.
+        Hit/miss stats are available via `llm.semantic_cache.stat()`.
+        """
+        self.semantic_cache = SemanticCache(
+            threshold=threshold,
+            ttl_s=ttl_s,
+            max_entries=max_entries,
+            match_history=match_history,
+        )
+        self.semantic_cache_emb_model = emb_model
+        return self
+
+    def _semantic_cache_args(
+        self,
+        temp_conversations: List[Dict[str, Any]],
+        request: Dict[str, Any],
+        tools: List[Union[Callable, str]] = [],
+        tool_choice: Optional[Union[Callable, str]] = None,
+        impl_func: Optional[Callable] = None,
+        response_class: Optional[Union[pydantic.BaseModel, str]] = None,
+    ) -> Optional[Tuple[str, str]]:
+        """
+        (last user message, context key) of a plain chat, or None if the
+        request should not go through the semantic cache.
+        """
+        if self.semantic_cache is None:
+            return None
+        if tools or tool_choice or impl_func or response_class:
+            return None
+        last_message = temp_conversations[-1]
+        if last_message.get("role", None) != "user" or not isinstance(
+            last_message.get("content", None), str
+        ):
+            return None
+        context_key = self.semantic_cache.context_key(temp_conversations[:-1], request)
+        if context_key is None:
+            return None
+        return last_message["content"], context_key
+
+    def _semantic_cache_vector(self, text: str) -> Optional[List[float]]:
+        try:
+            return self.emb(
+                model=self.semantic_cache_emb_model, request=LLMRequest(instruction=text)
+            )[0].output
+        except Exception as e:
+            logger.warning(f"semantic cache skipped, fail to embed the message: {e}")
+            return None
+
+    async def _asemantic_cache_vector(self, text: str) -> Optional[List[float]]:
+        try:
+            return (
+                await self.aemb(
+                    model=self.semantic_cache_emb_model,
+                    request=LLMRequest(instruction=text),
+                )
+            )[0].output
+        except Exception as e:
+            logger.warning(f"semantic cache skipped, fail to embed the message: {e}")
+            return None
+
+    def _cached_query(
+        self,
+        model: str,
+        input_value: List[Dict[str, Any]],
+        semantic: Optional[Tuple[str, str]] = None,
+    ):
+        key = self._response_cache_key(model, input_value)
+        if key is not None:
+            res = self.response_cache.get(key)
+            if res is not None:
+                return res
+        vector = None
+        if semantic is not None:
+            vector = self._semantic_cache_vector(semantic[0])
+            if vector is not None:
+                res = self.semantic_cache.get(model, semantic[1], vector)
+                if res is not None:
+                    return res
+        res = self._query(model, input_value)
+        if key is not None:
+            self.response_cache.put(key, res)
+        if vector is not None:
+            self.semantic_cache.put(model, semantic[1], vector, res)
+        return res
+
+    async def _acached_query(
+        self,
+        model: str,
+        input_value: List[Dict[str, Any]],
+        semantic: Optional[Tuple[str, str]] = None,
+    ):
+        key = self._response_cache_key(model, input_value)
+        if key is not None:
+            res = await self.response_cache.aget(key)
+            if res is not None:
+                return res
+        vector = None
+        if semantic is not None:
+            vector = await self._asemantic_cache_vector(semantic[0])
+            if vector is not None:
+                res = self.semantic_cache.get(model, semantic[1], vector)
+                if res is not None:
+                    return res
+        res = await self._aquery(model, input_value)
+        if key is not None:
+            await self.response_cache.aput(key, res)
+        if vector is not None:
+            self.semantic_cache.put(model, semantic[1], vector, res)
+        return res
+
     def setup_load_balance_way(self, load_balance_way: str) -> "ByzerLLM":
+        """
+        "lru" (default) and "round_robin" are applied by the UDF master and
+        take effect when the model is deployed. "least_outstanding",
+        "ewma_latency" and "power_of_two" are applied by this client, which
+        picks the worker itself and sends the request to it directly; the
+        master falls back to "lru" for them. The client then keeps every worker
+        at most at the model's workerMaxConcurrency requests, counting only
+        its own requests.
+        """
         self.sys_conf["load_balance"] = load_balance_way
         return self
 
+    def _cached_load_balancer(
+        self, model: str, udf_master, strategy: str
+    ) -> Optional[LoadBalancer]:
+        balancer = self.load_balancers.get(model, None)
+        if (
+            balancer is None
+            or balancer.name != strategy
+            or not balancer.is_for(udf_master)
+        ):
+            return None
+        return balancer
+
+    def _get_load_balancer(self, model: str, udf_master) -> Optional[LoadBalancer]:
+        strategy = self.sys_conf.get("load_balance", "lru")
+        if strategy not in LOAD_BALANCERS:
+            return None
+        balancer = self._cached_load_balancer(model, udf_master, strategy)
+        if balancer is None:
+            workers, max_concurrency = ray.get(
+                [
+                    udf_master.workers.remote(),
+                    udf_master.get_worker_max_concurrency.remote(),
+                ]
+            )
+            balancer = LOAD_BALANCERS[strategy](
+                udf_master, list(workers), max_concurrency=max_concurrency
+            )
+            self.load_balancers[model] = balancer
+        return balancer
+
+    async def _aget_load_balancer(
+        self, model: str, udf_master
+    ) -> Optional[LoadBalancer]:
+        strategy = self.sys_conf.get("load_balance", "lru")
+        if strategy not in LOAD_BALANCERS:
+            return None
+        balancer = self._cached_load_balancer(model, udf_master, strategy)
+        if balancer is None:
+            workers, max_concurrency = await asyncio.gather(
+                udf_master.workers.remote(),
+                udf_master.get_worker_max_concurrency.remote(),
+            )
+            balancer = LOAD_BALANCERS[strategy](
+                udf_master, list(workers), max_concurrency=max_concurrency
+            )
+            self.load_balancers[model] = balancer
+        return balancer
+
+    def _release_balanced_workers(
+        self,
+        model: str,
+        balancer: LoadBalancer,
+        leases: List[List[Any]],
+        tokens: List[int],
+        res_chunks: Optional[List[List[Dict[str, Any]]]],
+        elapsed_s: float,
+        broken: bool = False,
+    ):
+        if broken and self.load_balancers.get(model, None) is balancer:
+            # a worker died or was restarted, the next request fetches the
+            # current workers from the master instead of picking it again
+            self.load_balancers.pop(model, None)
+        for i, ([index, _], t) in enumerate(zip(leases, tokens)):
+            if res_chunks is None:
+                balancer.release(index, t)
+                continue
+            metadata = [item.get("metadata", {}) for item in res_chunks[i]]
+            # a stream request returns before the generation is done, its
+            # slot is released by the stream consumer (_release_balanced_stream)
+            request_ids = [
+                m["request_id"]
+                for m in metadata
+                if "stream_server" in m and "request_id" in m
+            ]
+            if request_ids:
+                balancer.hold(index, t, request_ids)
+            else:
+                balancer.release(index, t, elapsed_s, metadata=metadata)
+
+    def _release_balanced_stream(self, model: str, request_id: str):
+        balancer = self.load_balancers.get(model, None)
+        if balancer is not None:
+            balancer.release_stream(request_id)
+
     def setup_default_model_name(self, model_name: str) -> "ByzerLLM":
         self.default_model_name = model_name
         return self
@@ -293,6 +604,28 @@ class ByzerLLM:
         self.mapping_max_output_length[model] = max_output_length
         return self
 
+    def setup_skip_nontext_check(self, model: str, skip: bool = True) -> "ByzerLLM":
+        """
+        Send the instructions of a text-only model as they are, without looking
+        for <_image_>/<_audio_> tags in them.
+        """
+        self.mapping_skip_nontext_check[model] = skip
+        return self
+
+    def setup_wire_format(self, model: str, wire_format: str = "auto") -> "ByzerLLM":
+        """
+        How requests and results are shipped between this client and the workers:
+        "json" sends json strings, "binary" sends the dicts as they are (pickled
+        by Ray, embeddings come back as float32 arrays) and "auto" (default)
+        uses binary once the model meta says the workers support it.
+        """
+        if wire_format not in ["auto", "json", "binary"]:
+            raise Exception(
+                f"wire_format should be one of auto/json/binary, got {wire_format}"
+            )
+        self.mapping_wire_format[model] = wire_format
+        return self
+
     def setup_role_mapping(
         self, model: str, role_mapping: Dict[str, str]
     ) -> "ByzerLLM":
@@ -486,9 +819,13 @@ class ByzerLLM:
                             cancel_placement_group(meta["engine_placement_group_id"])
                 except Exception as inst:
                     pass
+            pool = self.worker_lease_pools.pop(udf_name, None)
+            if pool is not None:
+                pool.close()
             ray.kill(model)
             if udf_name in self.meta_cache:
                 del self.meta_cache[udf_name]
+            self.load_balancers.pop(udf_name, None)
         except ValueError:
             pass
         time.sleep(3)
@@ -543,6 +880,31 @@ class ByzerLLM:
         fin_ins = "\n".join(new_his)
         return fin_ins
 
+    async def agenerate_instruction_from_history(
+        self,
+        model: str,
+        conversations: List[Dict[str, str]],
+        role_mapping: Dict[str, str] = {
+            "user_role": "User:",
+            "assistant_role": "Assistant:",
+        },
+    ):
+        """
+        the asyncio version of `generate_instruction_from_history`.
+        """
+        meta = await self.aget_meta(model=model)
+        if self.mapping_auto_use_apply_chat_template.get(model, False) and meta.get(
+            "support_chat_template", False
+        ):
+            return await self.aapply_chat_template(
+                model, json.dumps(conversations, ensure_ascii=False)
+            )
+        # the meta is cached now and no chat template is applied, so this
+        # does not call the model
+        return self.generate_instruction_from_history(
+            model, conversations, role_mapping
+        )
+
     def is_model_exist(self, udf_name: str) -> bool:
         try:
             ray.get_actor(udf_name)
@@ -640,9 +1002,26 @@ class ByzerLLM:
             model = infer_module.init_model(model_path, infer_params, conf)
             return model
 
-        UDFBuilder.build(
-            self.ray_context, init_model, getattr(predict_module, predict_func)
-        )
+        worker_concurrency = self.sys_conf["workerMaxConcurrency"]
+        if (
+            model_type == "auto"
+            and infer_backend == InferBackend.Transformers
+            and str(infer_params.get("backend.continuous_batching", "false")).lower()
+            == "true"
+        ):
+            # the master hands out a worker to one request at a time by default,
+            # let up to a batch of requests run on a worker at once so separate
+            # requests can share the batches of its BatchScheduler
+            self.sys_conf["workerMaxConcurrency"] = max(
+                int(worker_concurrency),
+                int(infer_params.get("backend.max_batch_size", 8)),
+            )
+        try:
+            UDFBuilder.build(
+                self.ray_context, init_model, getattr(predict_module, predict_func)
+            )
+        finally:
+            self.sys_conf["workerMaxConcurrency"] = worker_concurrency
         return self.get_meta(model=udf_name)
 
     def get_meta(self, model: str, llm_config: Dict[str, Any] = {}):
@@ -655,11 +1034,29 @@ class ByzerLLM:
         if model in self.meta_cache:
             return self.meta_cache[model]
 
-        default_config = self.mapping_extra_generation_params.get(model, {})
+        res = self._query(model, self._build_meta_request(model, llm_config))
+        self.meta_cache[model] = self._to_meta(res)
+        return self.meta_cache[model]
 
-        v = [{"instruction": "", "meta": True, **{**default_config, **llm_config}}]
-        res = self._query(model, v)
+    async def aget_meta(self, model: str, llm_config: Dict[str, Any] = {}):
+        if not model and not self.default_model_name:
+            raise Exception("model name is required")
+
+        if not model:
+            model = self.default_model_name
+
+        if model in self.meta_cache:
+            return self.meta_cache[model]
+
+        res = await self._aquery(model, self._build_meta_request(model, llm_config))
+        self.meta_cache[model] = self._to_meta(res)
+        return self.meta_cache[model]
+
+    def _build_meta_request(self, model: str, llm_config: Dict[str, Any] = {}):
+        default_config = self.mapping_extra_generation_params.get(model, {})
+        return [{"instruction": "", "meta": True, **{**default_config, **llm_config}}]
 
+    def _to_meta(self, res: List[Dict[str, Any]]) -> Dict[str, Any]:
         t = [
             LLMResponse(
                 output=item["predict"],
@@ -669,12 +1066,10 @@ class ByzerLLM:
             for item in res
         ]
 
-        res = {}
+        meta = {}
         if len(t) != 0 and len(t[0].output) != 0:
-            res = t[0].output[0]
-
-        self.meta_cache[model] = res
-        return self.meta_cache[model]
+            meta = t[0].output[0]
+        return meta
 
     def tokenize(
         self, model: str, s: str, llm_config: Dict[str, Any] = {}
@@ -706,16 +1101,36 @@ class ByzerLLM:
         if not model:
             model = self.default_model_name
 
+        res = self._query(model, self._build_apply_chat_template_request(model, s, llm_config))
+        return self._to_chat_template(res)
+
+    async def aapply_chat_template(
+        self, model: str, s: str, llm_config: Dict[str, Any] = {}
+    ):
+        if not model and not self.default_model_name:
+            raise Exception("model name is required")
+
+        if not model:
+            model = self.default_model_name
+
+        res = await self._aquery(
+            model, self._build_apply_chat_template_request(model, s, llm_config)
+        )
+        return self._to_chat_template(res)
+
+    def _build_apply_chat_template_request(
+        self, model: str, s: str, llm_config: Dict[str, Any] = {}
+    ):
         default_config = self.mapping_extra_generation_params.get(model, {})
-        v = [
+        return [
             {
                 "instruction": s,
                 "apply_chat_template": True,
                 **{**default_config, **llm_config},
             }
         ]
-        res = self._query(model, v)
 
+    def _to_chat_template(self, res: List[Dict[str, Any]]) -> str:
         t = [
             LLMResponse(
                 output=item["predict"],
@@ -737,6 +1152,128 @@ class ByzerLLM:
         if not model:
             model = self.default_emb_model_name
 
+        res = self._query(model, self._build_emb_request(model, request, extract_params))
+        return self._to_llm_responses(res)
+
+    async def aemb(
+        self, model, request: LLMRequest, extract_params: Dict[str, Any] = {}
+    ):
+        if not model and not self.default_emb_model_name:
+            raise Exception("model name is required")
+
+        if not model:
+            model = self.default_emb_model_name
+
+        res = await self._aquery(
+            model, self._build_emb_request(model, request, extract_params)
+        )
+        return self._to_llm_responses(res)
+
+    def emb_array(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        dtype: str = "float32",
+        batch_size: int = 256,
+        num_workers: int = 1,
+        extract_params: Dict[str, Any] = {},
+    ):
+        """
+        The embeddings of texts as one (len(texts), dim) numpy matrix of dtype
+        ("float32" or "float16"). The workers embed batch_size texts per encode
+        call and, with the binary wire format, ship the matrices through the
+        object store without building a python float per element. Batches are
+        spread over up to num_workers workers.
+        """
+        if not model and not self.default_emb_model_name:
+            raise Exception("model name is required")
+
+        if not model:
+            model = self.default_emb_model_name
+
+        if not texts:
+            return self._to_embedding_matrix([], dtype)
+
+        if not self.get_meta(model=model).get("support_embedding_batch", False):
+            return self._to_embedding_matrix(
+                self.emb(model, LLMRequest(instruction=texts), extract_params), dtype
+            )
+
+        v = self._build_emb_batch_request(model, texts, dtype, batch_size, extract_params)
+        return self._to_embedding_matrix(self._query(model, v, num_workers), dtype)
+
+    async def aemb_array(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        dtype: str = "float32",
+        batch_size: int = 256,
+        num_workers: int = 1,
+        extract_params: Dict[str, Any] = {},
+    ):
+        if not model and not self.default_emb_model_name:
+            raise Exception("model name is required")
+
+        if not model:
+            model = self.default_emb_model_name
+
+        if not texts:
+            return self._to_embedding_matrix([], dtype)
+
+        if not (await self.aget_meta(model=model)).get(
+            "support_embedding_batch", False
+        ):
+            return self._to_embedding_matrix(
+                await self.aemb(model, LLMRequest(instruction=texts), extract_params),
+                dtype,
+            )
+
+        v = self._build_emb_batch_request(model, texts, dtype, batch_size, extract_params)
+        return self._to_embedding_matrix(
+            await self._aquery(model, v, num_workers), dtype
+        )
+
+    def _build_emb_batch_request(
+        self,
+        model: str,
+        texts: List[str],
+        dtype: str,
+        batch_size: int,
+        extract_params: Dict[str, Any] = {},
+    ) -> List[Dict[str, Any]]:
+        default_config = self.mapping_extra_generation_params.get(model, {})
+        return [
+            {
+                "instruction": texts[i : i + batch_size],
+                "embedding": True,
+                "embedding_batch": True,
+                "embedding_dtype": dtype,
+                **default_config,
+                **extract_params,
+            }
+            for i in range(0, len(texts), batch_size)
+        ]
+
+    def _to_embedding_matrix(self, res: List[Any], dtype: str):
+        import numpy as np
+
+        # LLMResponse from the fallback, or the raw results of embedding_batch requests
+        matrices = [
+            np.asarray(
+                item.output if isinstance(item, LLMResponse) else item["predict"],
+                dtype=dtype,
+            )
+            for item in res
+        ]
+        if not matrices:
+            return np.zeros((0, 0), dtype=dtype)
+        if isinstance(res[0], LLMResponse):
+            return np.stack(matrices)
+        return np.concatenate(matrices)
+
+    def _build_emb_request(
+        self, model: str, request: LLMRequest, extract_params: Dict[str, Any] = {}
+    ) -> List[Dict[str, Any]]:
         default_config = self.mapping_extra_generation_params.get(model, {})
 
         if isinstance(request, list):
@@ -767,8 +1304,9 @@ class ByzerLLM:
                 }
                 for x in request.instruction
             ]
-        res = self._query(model, v)
+        return v
 
+    def _to_llm_responses(self, res: List[Dict[str, Any]]) -> List[LLMResponse]:
         return [
             LLMResponse(
                 output=item["predict"],
@@ -794,9 +1332,41 @@ class ByzerLLM:
         if not model:
             model = self.default_rerank_model_name
 
+        res = self._query(
+            model, self._build_emb_rerank_request(model, sentence_pairs, extract_params)
+        )
+        return self._to_llm_responses(res)
+
+    async def aemb_rerank(
+        self,
+        model: str = None,
+        sentence_pairs: Union[List[Tuple[str, str]], Tuple[str, str]] = [],
+        extract_params: Dict[str, Any] = {},
+    ) -> Union[Tuple[Tuple[str, str], float], List[Tuple[Tuple[str, str], float]]]:
+
+        if not model and not self.default_rerank_model_name:
+            raise Exception("rerank model name is required")
+
+        if not sentence_pairs or len(sentence_pairs) == 0:
+            raise Exception("rerank rerank param sentence_pairs is required")
+
+        if not model:
+            model = self.default_rerank_model_name
+
+        res = await self._aquery(
+            model, self._build_emb_rerank_request(model, sentence_pairs, extract_params)
+        )
+        return self._to_llm_responses(res)
+
+    def _build_emb_rerank_request(
+        self,
+        model: str,
+        sentence_pairs: Union[List[Tuple[str, str]], Tuple[str, str]],
+        extract_params: Dict[str, Any] = {},
+    ) -> List[Dict[str, Any]]:
         default_config = self.mapping_extra_generation_params.get(model, {})
 
-        v = [
+        return [
             {
                 "instruction": sentence_pairs,
                 "embedding": True,
@@ -805,16 +1375,6 @@ class ByzerLLM:
                 **extract_params,
             }
         ]
-        res = self._query(model, v)
-
-        return [
-            LLMResponse(
-                output=item["predict"],
-                metadata=item.get("metadata", {}),
-                input=item["input"],
-            )
-            for item in res
-        ]
 
     def _generate_ins(
         self, model: str, request: LLMRequest, role_mapping: Dict[str, str]
@@ -1045,50 +1605,115 @@ class ByzerLLM:
             llm_config={"gen.request_id": request_id, "gen.abort": True},
         )
 
-    def chat_oai(
+    async def aabort(self, request_id: str, model: Optional[str] = None):
+        if not model and not self.default_model_name:
+            raise Exception("model name is required")
+        if not model:
+            model = self.default_model_name
+
+        meta = await self.aget_meta(model=model)
+        if meta.get("backend", None) != "ray/vllm":
+            raise Exception("abort only support ray/vllm backend")
+
+        await self.achat_oai(
+            conversations=[{"role": "user", "content": f"{request_id}"}],
+            model=model,
+            llm_config={"gen.request_id": request_id, "gen.abort": True},
+        )
+
+    def _build_chat_oai_request(
         self,
+        model: str,
         conversations,
+        role_mapping: Dict[str, str],
         tools: List[Union[Callable, str]] = [],
         tool_choice: Optional[Union[Callable, str]] = None,
-        execute_tool: bool = False,
         impl_func: Optional[Callable] = None,
-        execute_impl_func: bool = False,
-        impl_func_params: Optional[Dict[str, Any]] = None,
-        func_params: Optional[Dict[str, Any]] = None,
         response_class: Optional[Union[pydantic.BaseModel, str]] = None,
         response_after_chat: Optional[Union[pydantic.BaseModel, str]] = False,
         enable_default_sys_message: bool = True,
-        model: Optional[str] = None,
-        role_mapping=None,
         llm_config: Dict[str, Any] = {},
-        only_return_prompt: bool = False,
-    ) -> Union[
-        List[LLMResponse], List[LLMFunctionCallResponse], List[LLMClassResponse]
-    ]:
-
-        if not self.default_model_name and not model:
-            raise Exception(
-                "Use llm.setup_default_model_name to setup default model name or setup the model parameter"
-            )
-
-        if not model:
-            model = self.default_model_name
-
-        if role_mapping is None:
-            role_mapping = self.mapping_role_mapping.get(
-                model, self.default_role_mapping
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        temp_conversations = self._format_chat_oai_conversations(
+            model=model,
+            conversations=conversations,
+            tools=tools,
+            tool_choice=tool_choice,
+            impl_func=impl_func,
+            response_class=response_class,
+            response_after_chat=response_after_chat,
+            enable_default_sys_message=enable_default_sys_message,
+        )
+        message_format = self._chat_oai_message_format(model, temp_conversations)
+        if message_format is not None:
+            final_ins, history = message_format
+        else:
+            final_ins = self.generate_instruction_from_history(
+                model, temp_conversations, role_mapping
             )
+            history = []
+        return temp_conversations, self._chat_oai_request(
+            model, final_ins, history, llm_config
+        )
 
-        if response_class and (tools or tool_choice):
-            raise Exception(
-                "function calling is enabled,response_class should not be set."
+    async def _abuild_chat_oai_request(
+        self,
+        model: str,
+        conversations,
+        role_mapping: Dict[str, str],
+        tools: List[Union[Callable, str]] = [],
+        tool_choice: Optional[Union[Callable, str]] = None,
+        impl_func: Optional[Callable] = None,
+        response_class: Optional[Union[pydantic.BaseModel, str]] = None,
+        response_after_chat: Optional[Union[pydantic.BaseModel, str]] = False,
+        enable_default_sys_message: bool = True,
+        llm_config: Dict[str, Any] = {},
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        the asyncio version of `_build_chat_oai_request`, the meta and the
+        chat template are fetched without blocking the event loop.
+        """
+        await self.aget_meta(model=model)
+        temp_conversations = self._format_chat_oai_conversations(
+            model=model,
+            conversations=conversations,
+            tools=tools,
+            tool_choice=tool_choice,
+            impl_func=impl_func,
+            response_class=response_class,
+            response_after_chat=response_after_chat,
+            enable_default_sys_message=enable_default_sys_message,
+        )
+        message_format = self._chat_oai_message_format(model, temp_conversations)
+        if message_format is not None:
+            final_ins, history = message_format
+        else:
+            final_ins = await self.agenerate_instruction_from_history(
+                model, temp_conversations, role_mapping
             )
+            history = []
+        return temp_conversations, self._chat_oai_request(
+            model, final_ins, history, llm_config
+        )
 
-        if impl_func and not response_class:
-            raise Exception("impl_func is enabled,response_class should be set.")
-
+    def _format_chat_oai_conversations(
+        self,
+        model: str,
+        conversations,
+        tools: List[Union[Callable, str]] = [],
+        tool_choice: Optional[Union[Callable, str]] = None,
+        impl_func: Optional[Callable] = None,
+        response_class: Optional[Union[pydantic.BaseModel, str]] = None,
+        response_after_chat: Optional[Union[pydantic.BaseModel, str]] = False,
+        enable_default_sys_message: bool = True,
+    ) -> List[Dict[str, Any]]:
+        # the caller's list and messages are never modified: the list is copied
+        # (only the references) and a message that needs changes is replaced by
+        # a changed copy, so long histories are not deep copied on every call.
         if isinstance(conversations, str):
             conversations = [{"role": "user", "content": conversations}]
+        else:
+            conversations = list(conversations)
 
         if enable_default_sys_message:
             first_message = conversations[0]
@@ -1112,17 +1737,16 @@ class ByzerLLM:
                 )
 
             if first_message["role"] == "system":
-                first_message[
-                    "content"
-                ] = f"""{self.mapping_base_system_message.get(model,base_ability_format(base_abilities=base_abilities))}
-{first_message["content"]}"""
-
-        meta = self.get_meta(model=model)
-        is_saas_model = meta.get("model_deploy_type", None) == "saas"
-        is_message_format = meta.get("message_format", False)
+                conversations[0] = {
+                    **first_message,
+                    "content": f"""{self.mapping_base_system_message.get(model,base_ability_format(base_abilities=base_abilities))}
+{first_message["content"]}""",
+                }
 
-        temp_conversations = copy.deepcopy(conversations)
-        last_message = temp_conversations[-1]
+        temp_conversations = conversations
+        # the last message is the only one whose content gets reformatted
+        last_message = dict(temp_conversations[-1])
+        temp_conversations[-1] = last_message
 
         # function calling
         if tools or tool_choice:
@@ -1163,57 +1787,278 @@ class ByzerLLM:
             )
             last_message["content"] = f(last_message["content"], cls=response_class)
 
-        if is_saas_model or is_message_format:
-            final_ins = last_message["content"]
-            history = []
-            for item in temp_conversations[:-1]:
-                # clean metadata field in conversation
-                # which may used by agent.
-                if "metadata" in item:
-                    del item["metadata"]
-                history.append(item)
-
-        else:
-            final_ins = self.generate_instruction_from_history(
-                model, temp_conversations, role_mapping
-            )
-            history = []
+        return temp_conversations
 
+    def _chat_oai_message_format(
+        self, model: str, temp_conversations: List[Dict[str, Any]]
+    ) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        (instruction, history) for models taking the messages as they are, or
+        None if the conversation has to be rendered into one instruction.
+        """
+        meta = self.get_meta(model=model)
+        is_saas_model = meta.get("model_deploy_type", None) == "saas"
+        is_message_format = meta.get("message_format", False)
+        if not is_saas_model and not is_message_format:
+            return None
+
+        history = []
+        for i, item in enumerate(temp_conversations[:-1]):
+            # clean metadata field in conversation
+            # which may used by agent.
+            if "metadata" in item:
+                item = {k: v for k, v in item.items() if k != "metadata"}
+                temp_conversations[i] = item
+            history.append(item)
+        return temp_conversations[-1]["content"], history
+
+    def _chat_oai_request(
+        self,
+        model: str,
+        final_ins: str,
+        history: List[Dict[str, Any]],
+        llm_config: Dict[str, Any] = {},
+    ) -> Dict[str, Any]:
         default_config = self.mapping_extra_generation_params.get(model, {})
 
         if self.get_max_output_length(model) > 0:
             default_config["max_length"] = self.get_max_output_length(model)
 
-        v = [
-            {
-                "instruction": final_ins,
-                "history": history,
-                **default_config,
-                **llm_config,
-            }
-        ]
+        return {
+            "instruction": final_ins,
+            "history": history,
+            **default_config,
+            **llm_config,
+        }
+
+    def chat_oai(
+        self,
+        conversations,
+        tools: List[Union[Callable, str]] = [],
+        tool_choice: Optional[Union[Callable, str]] = None,
+        execute_tool: bool = False,
+        impl_func: Optional[Callable] = None,
+        execute_impl_func: bool = False,
+        impl_func_params: Optional[Dict[str, Any]] = None,
+        func_params: Optional[Dict[str, Any]] = None,
+        response_class: Optional[Union[pydantic.BaseModel, str]] = None,
+        response_after_chat: Optional[Union[pydantic.BaseModel, str]] = False,
+        enable_default_sys_message: bool = True,
+        model: Optional[str] = None,
+        role_mapping=None,
+        llm_config: Dict[str, Any] = {},
+        only_return_prompt: bool = False,
+    ) -> Union[
+        List[LLMResponse], List[LLMFunctionCallResponse], List[LLMClassResponse]
+    ]:
+
+        if not self.default_model_name and not model:
+            raise Exception(
+                "Use llm.setup_default_model_name to setup default model name or setup the model parameter"
+            )
+
+        if not model:
+            model = self.default_model_name
+
+        if role_mapping is None:
+            role_mapping = self.mapping_role_mapping.get(
+                model, self.default_role_mapping
+            )
+
+        if response_class and (tools or tool_choice):
+            raise Exception(
+                "function calling is enabled,response_class should not be set."
+            )
+
+        if impl_func and not response_class:
+            raise Exception("impl_func is enabled,response_class should be set.")
+
+        temp_conversations, request = self._build_chat_oai_request(
+            model=model,
+            conversations=conversations,
+            role_mapping=role_mapping,
+            tools=tools,
+            tool_choice=tool_choice,
+            impl_func=impl_func,
+            response_class=response_class,
+            response_after_chat=response_after_chat,
+            enable_default_sys_message=enable_default_sys_message,
+            llm_config=llm_config,
+        )
+        v = [request]
+        semantic = self._semantic_cache_args(
+            temp_conversations,
+            request,
+            tools=tools,
+            tool_choice=tool_choice,
+            impl_func=impl_func,
+            response_class=response_class,
+        )
 
         if only_return_prompt:
-            responses = [
-                LLMResponse(output="", metadata=item, input=item["instruction"])
-                for item in v
+            return self._only_return_prompt_responses(
+                v, response_class=response_class, response_after_chat=response_after_chat
+            )
+
+        res = self._cached_query(model, v, semantic)
+        responses = self._to_chat_oai_responses(model, res)
+
+        ## handle response_class response
+        temp_result = responses
+        if response_class and response_after_chat and not impl_func:
+            temp_result = [
+                self.chat_oai(
+                    new_conversations,
+                    role_mapping=role_mapping,
+                    llm_config=llm_config,
+                )[0]
+                for new_conversations in self._response_after_chat_conversations(
+                    model, temp_conversations, responses, response_class
+                )
             ]
-            if response_class or response_after_chat:
-                new_responses = []
-                for response in responses:
-                    temp = LLMClassResponse(
-                        response=response,
-                        value=response,
-                        metadata={"reason": "Only return prompt"},
+
+        return self._post_process_chat_oai(
+            responses=responses,
+            temp_result=temp_result,
+            tools=tools,
+            execute_tool=execute_tool,
+            impl_func=impl_func,
+            execute_impl_func=execute_impl_func,
+            impl_func_params=impl_func_params,
+            func_params=func_params,
+            response_class=response_class,
+        )
+
+    async def achat_oai(
+        self,
+        conversations,
+        tools: List[Union[Callable, str]] = [],
+        tool_choice: Optional[Union[Callable, str]] = None,
+        execute_tool: bool = False,
+        impl_func: Optional[Callable] = None,
+        execute_impl_func: bool = False,
+        impl_func_params: Optional[Dict[str, Any]] = None,
+        func_params: Optional[Dict[str, Any]] = None,
+        response_class: Optional[Union[pydantic.BaseModel, str]] = None,
+        response_after_chat: Optional[Union[pydantic.BaseModel, str]] = False,
+        enable_default_sys_message: bool = True,
+        model: Optional[str] = None,
+        role_mapping=None,
+        llm_config: Dict[str, Any] = {},
+        only_return_prompt: bool = False,
+    ) -> Union[
+        List[LLMResponse], List[LLMFunctionCallResponse], List[LLMClassResponse]
+    ]:
+        """
+        the asyncio version of `chat_oai`. The ray calls(worker lease, inference, give back)
+        are awaited directly instead of blocking a thread.
+        """
+        if not self.default_model_name and not model:
+            raise Exception(
+                "Use llm.setup_default_model_name to setup default model name or setup the model parameter"
+            )
+
+        if not model:
+            model = self.default_model_name
+
+        if role_mapping is None:
+            role_mapping = self.mapping_role_mapping.get(
+                model, self.default_role_mapping
+            )
+
+        if response_class and (tools or tool_choice):
+            raise Exception(
+                "function calling is enabled,response_class should not be set."
+            )
+
+        if impl_func and not response_class:
+            raise Exception("impl_func is enabled,response_class should be set.")
+
+        temp_conversations, request = await self._abuild_chat_oai_request(
+            model=model,
+            conversations=conversations,
+            role_mapping=role_mapping,
+            tools=tools,
+            tool_choice=tool_choice,
+            impl_func=impl_func,
+            response_class=response_class,
+            response_after_chat=response_after_chat,
+            enable_default_sys_message=enable_default_sys_message,
+            llm_config=llm_config,
+        )
+        v = [request]
+        semantic = self._semantic_cache_args(
+            temp_conversations,
+            request,
+            tools=tools,
+            tool_choice=tool_choice,
+            impl_func=impl_func,
+            response_class=response_class,
+        )
+
+        if only_return_prompt:
+            return self._only_return_prompt_responses(
+                v, response_class=response_class, response_after_chat=response_after_chat
+            )
+
+        res = await self._acached_query(model, v, semantic)
+        responses = self._to_chat_oai_responses(model, res)
+
+        temp_result = responses
+        if response_class and response_after_chat and not impl_func:
+            temp_result = [
+                (
+                    await self.achat_oai(
+                        new_conversations,
+                        model=model,
+                        role_mapping=role_mapping,
+                        llm_config=llm_config,
                     )
-                    new_responses.append(temp)
-                return new_responses
-            return responses
+                )[0]
+                for new_conversations in self._response_after_chat_conversations(
+                    model, temp_conversations, responses, response_class
+                )
+            ]
 
-        res = self._query(model, v)
-        clean_func = self.mapping_clean_func.get(model, lambda s: s)
+        return self._post_process_chat_oai(
+            responses=responses,
+            temp_result=temp_result,
+            tools=tools,
+            execute_tool=execute_tool,
+            impl_func=impl_func,
+            execute_impl_func=execute_impl_func,
+            impl_func_params=impl_func_params,
+            func_params=func_params,
+            response_class=response_class,
+        )
 
+    def _only_return_prompt_responses(
+        self,
+        v: List[Dict[str, Any]],
+        response_class: Optional[Union[pydantic.BaseModel, str]] = None,
+        response_after_chat: Optional[Union[pydantic.BaseModel, str]] = False,
+    ):
         responses = [
+            LLMResponse(output="", metadata=item, input=item["instruction"])
+            for item in v
+        ]
+        if response_class or response_after_chat:
+            new_responses = []
+            for response in responses:
+                temp = LLMClassResponse(
+                    response=response,
+                    value=response,
+                    metadata={"reason": "Only return prompt"},
+                )
+                new_responses.append(temp)
+            return new_responses
+        return responses
+
+    def _to_chat_oai_responses(
+        self, model: str, res: List[Dict[str, Any]]
+    ) -> List[LLMResponse]:
+        clean_func = self.mapping_clean_func.get(model, lambda s: s)
+        return [
             LLMResponse(
                 output=clean_func(item["predict"]),
                 metadata=item.get("metadata", {}),
@@ -1222,6 +2067,39 @@ class ByzerLLM:
             for item in res
         ]
 
+    def _response_after_chat_conversations(
+        self,
+        model: str,
+        temp_conversations: List[Dict[str, Any]],
+        responses: List[LLMResponse],
+        response_class: Union[pydantic.BaseModel, str],
+    ) -> List[List[Dict[str, Any]]]:
+        f = self.mapping_response_class_format_after_chat_func.get(
+            model, response_class_format_after_chat
+        )
+        return [
+            temp_conversations
+            + [
+                {"content": response.output, "role": "assistant"},
+                {"content": f(response_class), "role": "user"},
+            ]
+            for response in responses
+        ]
+
+    def _post_process_chat_oai(
+        self,
+        responses: List[LLMResponse],
+        temp_result: List[LLMResponse],
+        tools: List[Union[Callable, str]] = [],
+        execute_tool: bool = False,
+        impl_func: Optional[Callable] = None,
+        execute_impl_func: bool = False,
+        impl_func_params: Optional[Dict[str, Any]] = None,
+        func_params: Optional[Dict[str, Any]] = None,
+        response_class: Optional[Union[pydantic.BaseModel, str]] = None,
+    ) -> Union[
+        List[LLMResponse], List[LLMFunctionCallResponse], List[LLMClassResponse]
+    ]:
         ## handle impl_func response
         if impl_func and response_class and execute_impl_func:
             final_result = []
@@ -1240,25 +2118,6 @@ class ByzerLLM:
             return responses
 
         ## handle response_class response
-        temp_result = responses
-        if response_class and response_after_chat:
-            temp_result = []
-            f = self.mapping_response_class_format_after_chat_func.get(
-                model, response_class_format_after_chat
-            )
-            for response in responses:
-                new_conversations = temp_conversations + [
-                    {"content": response.output, "role": "assistant"},
-                    {"content": f(response_class), "role": "user"},
-                ]
-                temp_result.append(
-                    self.chat_oai(
-                        new_conversations,
-                        role_mapping=role_mapping,
-                        llm_config=llm_config,
-                    )[0]
-                )
-
         if response_class:
             final_result = []
             for response in temp_result:
@@ -1283,6 +2142,61 @@ class ByzerLLM:
 
         return responses
 
+    def chat_oai_batch(
+        self,
+        conversations_list: List[Union[str, List[Dict[str, Any]]]],
+        model: Optional[str] = None,
+        role_mapping=None,
+        enable_default_sys_message: bool = True,
+        llm_config: Dict[str, Any] = {},
+        num_workers: int = 1,
+    ) -> List[LLMResponse]:
+        """
+        chat with many conversations in one worker call instead of one round trip per conversation.
+
+        Args:
+            conversations_list (List): the conversations, each one has the same format as `chat_oai`
+            num_workers (int, optional): split the batch across this many leased workers. Defaults to 1.
+            llm_config (Dict[str,Any], optional): the generation params shared by all conversations.
+
+        Returns:
+            List[LLMResponse]: the responses in the same order as `conversations_list`
+        """
+        if not self.default_model_name and not model:
+            raise Exception(
+                "Use llm.setup_default_model_name to setup default model name or setup the model parameter"
+            )
+
+        if not model:
+            model = self.default_model_name
+
+        if llm_config.get("generation.stream", False) or llm_config.get(
+            "gen.stream", False
+        ):
+            raise Exception("chat_oai_batch does not support stream chat")
+
+        if role_mapping is None:
+            role_mapping = self.mapping_role_mapping.get(
+                model, self.default_role_mapping
+            )
+
+        v = []
+        for conversations in conversations_list:
+            _, request = self._build_chat_oai_request(
+                model=model,
+                conversations=conversations,
+                role_mapping=role_mapping,
+                enable_default_sys_message=enable_default_sys_message,
+                llm_config=llm_config,
+            )
+            v.append(request)
+
+        if len(v) == 0:
+            return []
+
+        res = self._query(model, v, num_workers=num_workers)
+        return self._to_chat_oai_responses(model, res)
+
     def stream_chat_oai(
         self,
         conversations,
@@ -1308,36 +2222,61 @@ class ByzerLLM:
         request_id = v[0].metadata["request_id"]
         stream_server_type = v[0].metadata.get("stream_server", "VLLM_STREAM_SERVER")
         server = ray.get_actor(stream_server_type)
+        # stream servers started by an older version only support polling
+        use_wait = hasattr(server, "wait_item")
 
         pre_generated_text = None
-        while True:
-            final_output = ray.get(server.get_item.remote(request_id))
-            if isinstance(final_output, str):
-                time.sleep(0.01)
-                continue
-
-            if final_output is None:
-                break
-
-            if stream_server_type == "BlockBinaryStreamServer":
-                binary_data = final_output.outputs[0].text
-                yield (binary_data, final_output.outputs[0].metadata)
-            else:
-                text_outputs = final_output.outputs
-                clean_func = self.mapping_clean_func.get(model, lambda s: s)
-                generated_text = text_outputs[0].text
-                if (
-                    pre_generated_text is not None
-                    and generated_text == pre_generated_text
-                ):
+        last_seq = -1
+        # the consumer may stop reading early, e.g. the http client went away,
+        # tell the stream server so the producer stops generating
+        finished = False
+        try:
+            while True:
+                if use_wait:
+                    final_output = ray.get(
+                        server.wait_item.remote(request_id, self.stream_wait_timeout)
+                    )
+                else:
+                    final_output = ray.get(server.get_item.remote(request_id))
+                if isinstance(final_output, str):
+                    if not use_wait:
+                        time.sleep(0.01)
                     continue
 
-                if delta_mode and pre_generated_text is not None:
-                    s = generated_text[len(pre_generated_text) :]
+                if final_output is None:
+                    finished = True
+                    break
+
+                if stream_server_type.startswith("BlockBinaryStreamServer"):
+                    binary_data = final_output.outputs[0].text
+                    yield (binary_data, final_output.outputs[0].metadata)
                 else:
-                    s = generated_text
-                pre_generated_text = generated_text
-                yield (clean_func(s), text_outputs[0].metadata)
+                    text_outputs = final_output.outputs
+                    clean_func = self.mapping_clean_func.get(model, lambda s: s)
+                    if getattr(text_outputs[0], "is_delta", False):
+                        # the producer only sends new text, rebuild the full text locally
+                        if text_outputs[0].seq <= last_seq:
+                            continue
+                        last_seq = text_outputs[0].seq
+                        generated_text = (pre_generated_text or "") + text_outputs[0].text
+                    else:
+                        generated_text = text_outputs[0].text
+                    if (
+                        pre_generated_text is not None
+                        and generated_text == pre_generated_text
+                    ):
+                        continue
+
+                    if delta_mode and pre_generated_text is not None:
+                        s = generated_text[len(pre_generated_text) :]
+                    else:
+                        s = generated_text
+                    pre_generated_text = generated_text
+                    yield (clean_func(s), text_outputs[0].metadata)
+        finally:
+            self._release_balanced_stream(model, request_id)
+            if not finished and hasattr(server, "cancel"):
+                server.cancel.remote(request_id)
 
     async def async_stream_chat_oai(
         self,
@@ -1351,11 +2290,11 @@ class ByzerLLM:
         if not model:
             model = self.default_model_name
 
-        meta = self.get_meta(model=model)
+        meta = await self.aget_meta(model=model)
         if not meta.get("support_stream", False):
             raise Exception(f"The model({model}) is not support stream chat for now.")
 
-        v = self.chat_oai(
+        v = await self.achat_oai(
             conversations,
             model=model,
             role_mapping=role_mapping,
@@ -1364,36 +2303,62 @@ class ByzerLLM:
         request_id = v[0].metadata["request_id"]
         stream_server_type = v[0].metadata.get("stream_server", "VLLM_STREAM_SERVER")
         server = ray.get_actor(stream_server_type)
+        # stream servers started by an older version only support polling
+        use_wait = hasattr(server, "wait_item")
 
         pre_generated_text = None
-        while True:
-            final_output = await server.get_item.remote(request_id)
-            if isinstance(final_output, str):
-                await asyncio.sleep(0.01)
-                continue
-
-            if final_output is None:
-                break
-
-            if stream_server_type == "BlockBinaryStreamServer":
-                binary_data = final_output.outputs[0].text
-                yield (binary_data, final_output.outputs[0].metadata)
-            else:
-                text_outputs = final_output.outputs
-                clean_func = self.mapping_clean_func.get(model, lambda s: s)
-                generated_text = text_outputs[0].text
-                if (
-                    pre_generated_text is not None
-                    and generated_text == pre_generated_text
-                ):
+        last_seq = -1
+        # the consumer may stop reading early, e.g. the http client went away,
+        # tell the stream server so the producer stops generating
+        finished = False
+        try:
+            while True:
+                if use_wait:
+                    final_output = await server.wait_item.remote(
+                        request_id, self.stream_wait_timeout
+                    )
+                else:
+                    final_output = await server.get_item.remote(request_id)
+                if isinstance(final_output, str):
+                    if not use_wait:
+                        await asyncio.sleep(0.01)
                     continue
 
-                if delta_mode and pre_generated_text is not None:
-                    s = generated_text[len(pre_generated_text) :]
+                if final_output is None:
+                    finished = True
+                    break
+
+                if stream_server_type.startswith("BlockBinaryStreamServer"):
+                    binary_data = final_output.outputs[0].text
+                    yield (binary_data, final_output.outputs[0].metadata)
                 else:
-                    s = generated_text
-                pre_generated_text = generated_text
-                yield (clean_func(s), text_outputs[0].metadata)
+                    text_outputs = final_output.outputs
+                    clean_func = self.mapping_clean_func.get(model, lambda s: s)
+                    if getattr(text_outputs[0], "is_delta", False):
+                        # the producer only sends new text, rebuild the full text locally
+                        if text_outputs[0].seq <= last_seq:
+                            continue
+                        last_seq = text_outputs[0].seq
+                        generated_text = (pre_generated_text or "") + text_outputs[0].text
+                    else:
+                        generated_text = text_outputs[0].text
+                    if (
+                        pre_generated_text is not None
+                        and generated_text == pre_generated_text
+                    ):
+                        continue
+
+                    if delta_mode and pre_generated_text is not None:
+                        s = generated_text[len(pre_generated_text) :]
+                    else:
+                        s = generated_text
+                    pre_generated_text = generated_text
+                    yield (clean_func(s), text_outputs[0].metadata)
+        finally:
+            self._release_balanced_stream(model, request_id)
+            if not finished and hasattr(server, "cancel"):
+                # not awaited, the caller may be cancelled itself
+                server.cancel.remote(request_id)
 
     def clear_impl_cache(
         self,
@@ -1830,26 +2795,10 @@ cost {time.monotonic() - start_time} seconds
     def get_max_input_length(self, model: str):
         return self.mapping_max_input_length.get(model, None)
 
-    def _query(self, model: str, input_value: List[Dict[str, Any]]):
-        
-        if not self.skip_nontext_check:
-            try:
-                from byzerllm.utils.nontext import Image, Audio
-
-                for v in input_value:
-                    s = v["instruction"]
-                    image = Image(s)
-                    if image.has_image():
-                        c = image.to_content()
-                        v["instruction"] = json.dumps(c, ensure_ascii=False)
-
-                    audio = Audio(s)
-                    if audio.has_audio():
-                        c = audio.to_content()
-                        v["instruction"] = json.dumps(c, ensure_ascii=False)
-
-            except Exception as inst:
-                pass
+    def _query(
+        self, model: str, input_value: List[Dict[str, Any]], num_workers: int = 1
+    ):
+        self._process_nontext_input(model, input_value)
 
         event_result = self._trigger_event(
             EventName.BEFORE_CALL_MODEL, self, model, input_value
@@ -1858,44 +2807,275 @@ cost {time.monotonic() - start_time} seconds
             return event_result
 
         udf_master = ray.get_actor(model)
+        chunks = self._encode_query_chunks(model, input_value, num_workers)
+        worker_id = self._get_pinned_worker_id(input_value)
+        balancer = (
+            self._get_load_balancer(model, udf_master) if worker_id == -1 else None
+        )
+        lease_pool = (
+            self._get_worker_lease_pool(model, udf_master)
+            if worker_id == -1 and balancer is None
+            else None
+        )
 
+        leases = []
+        lease_refs = []
+        # estimated tokens per chunk when the client side load balancer picks workers
+        balanced_tokens = []
+        res_chunks = None
+        broken = False
+        start_time = time.monotonic()
         try:
-            new_input_value = [json.dumps(x, ensure_ascii=False) for x in input_value]
-        except Exception as inst:
-            raise Exception(
-                f"input_value should be json serializable, got {input_value}"
+            if balancer is not None:
+                balanced_tokens = [estimate_tokens(chunk) for chunk in chunks]
+                for tokens in balanced_tokens:
+                    index = balancer.acquire(tokens)
+                    leases.append([index, balancer.workers[index]])
+            elif lease_pool is not None:
+                leases = lease_pool.acquire(len(chunks))
+            else:
+                lease_refs = [udf_master.get.remote(worker_id) for _ in chunks]
+                leases = ray.get(lease_refs)
+            res = ray.get(
+                [
+                    worker.async_apply.remote(chunk)
+                    for [_, worker], chunk in zip(leases, chunks)
+                ]
             )
+            res_chunks = [self._decode_query_result(r) for r in res]
+            res = [item for r in res_chunks for item in r]
 
-        if self.verbose:
-            print(f"Send to model[{model}]:{new_input_value}")
+            event_result = self._trigger_event(
+                EventName.AFTER_CALL_MODEL, self, model, res
+            )
+            if event_result is not None:
+                return event_result
 
-        index = -1
-        try:
-            worker_id = -1
-            if self.pin_model_worker_mapping:
-                if input_value[0].get("embedding", False):
-                    worker_id = self.pin_model_worker_mapping.get("embedding", -1)
-                elif input_value[0].get("tokenizer", False):
-                    worker_id = self.pin_model_worker_mapping.get("tokenizer", -1)
-                elif input_value[0].get("apply_chat_template", False):
-                    worker_id = self.pin_model_worker_mapping.get(
-                        "apply_chat_template", -1
-                    )
-                elif input_value[0].get("meta", False):
-                    worker_id = self.pin_model_worker_mapping.get("meta", -1)            
+            return res
+        except ray.exceptions.RayActorError:
+            broken = True
+            raise
+        finally:
+            if balancer is not None:
+                self._release_balanced_workers(
+                    model,
+                    balancer,
+                    leases,
+                    balanced_tokens,
+                    res_chunks,
+                    time.monotonic() - start_time,
+                    broken=broken,
+                )
+            elif leases and lease_pool is not None:
+                lease_pool.release(leases, broken=broken)
+            elif lease_refs:
+                # also when one of the gets failed, leases is empty then
+                self._give_back_workers(udf_master, lease_refs)
+
+    async def _aquery(
+        self, model: str, input_value: List[Dict[str, Any]], num_workers: int = 1
+    ):
+        self._process_nontext_input(model, input_value)
 
-            [index, worker] = ray.get(udf_master.get.remote(worker_id))
-            res = ray.get(worker.async_apply.remote(new_input_value))
+        event_result = self._trigger_event(
+            EventName.BEFORE_CALL_MODEL, self, model, input_value
+        )
+        if event_result is not None:
+            return event_result
+
+        # the actor lookup is a blocking round trip to the GCS
+        udf_master = await asyncio.to_thread(ray.get_actor, model)
+        chunks = self._encode_query_chunks(model, input_value, num_workers)
+        worker_id = self._get_pinned_worker_id(input_value)
+        balancer = (
+            await self._aget_load_balancer(model, udf_master)
+            if worker_id == -1
+            else None
+        )
+        lease_pool = (
+            self._get_worker_lease_pool(model, udf_master)
+            if worker_id == -1 and balancer is None
+            else None
+        )
+
+        leases = []
+        lease_refs = []
+        # estimated tokens per chunk when the client side load balancer picks workers
+        balanced_tokens = []
+        res_chunks = None
+        broken = False
+        start_time = time.monotonic()
+        try:
+            if balancer is not None:
+                balanced_tokens = [estimate_tokens(chunk) for chunk in chunks]
+                for tokens in balanced_tokens:
+                    index = await balancer.aacquire(tokens)
+                    leases.append([index, balancer.workers[index]])
+            elif lease_pool is not None:
+                leases = await lease_pool.aacquire(len(chunks))
+            else:
+                lease_refs = [udf_master.get.remote(worker_id) for _ in chunks]
+                leases = await asyncio.gather(*lease_refs)
+            res = await asyncio.gather(
+                *[
+                    worker.async_apply.remote(chunk)
+                    for [_, worker], chunk in zip(leases, chunks)
+                ]
+            )
+            res_chunks = [self._decode_query_result(r) for r in res]
+            res = [item for r in res_chunks for item in r]
 
             event_result = self._trigger_event(
-                EventName.AFTER_CALL_MODEL, self, model, json.loads(res["value"][0])
+                EventName.AFTER_CALL_MODEL, self, model, res
             )
             if event_result is not None:
                 return event_result
 
-            return json.loads(res["value"][0])
-        except Exception as inst:
-            raise inst
+            return res
+        except ray.exceptions.RayActorError:
+            broken = True
+            raise
         finally:
-            if index != -1:
-                ray.get(udf_master.give_back.remote(index))
+            if balancer is not None:
+                self._release_balanced_workers(
+                    model,
+                    balancer,
+                    leases,
+                    balanced_tokens,
+                    res_chunks,
+                    time.monotonic() - start_time,
+                    broken=broken,
+                )
+            elif leases and lease_pool is not None:
+                lease_pool.release(leases, broken=broken)
+            elif lease_refs:
+                # also when the request was cancelled while the master was
+                # still handing out the workers, leases is empty then
+                await asyncio.shield(self._agive_back_workers(udf_master, lease_refs))
+
+    def _give_back_workers(self, udf_master, lease_refs: List[Any]):
+        """
+        Gives back the workers the udf_master.get refs resolve to, skipping
+        the gets that failed.
+        """
+        leases = []
+        for ref in lease_refs:
+            try:
+                leases.append(ray.get(ref))
+            except Exception:
+                continue
+        ray.get([udf_master.give_back.remote(index) for [index, _] in leases])
+
+    def _agive_back_workers(self, udf_master, lease_refs: List[Any]) -> asyncio.Task:
+        """
+        Gives back the workers the udf_master.get refs resolve to, in a task
+        of its own so the workers are returned even if the request is cancelled.
+        """
+
+        async def give_back():
+            leases = await asyncio.gather(*lease_refs, return_exceptions=True)
+            await asyncio.gather(
+                *[
+                    udf_master.give_back.remote(lease[0])
+                    for lease in leases
+                    if not isinstance(lease, BaseException)
+                ],
+                return_exceptions=True,
+            )
+
+        task = asyncio.ensure_future(give_back())
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    def _process_nontext_input(self, model: str, input_value: List[Dict[str, Any]]):
+        if self.skip_nontext_check or self.mapping_skip_nontext_check.get(model, False):
+            return
+
+        from byzerllm.utils.nontext import Image, Audio, find_nontext_kinds
+
+        for v in input_value:
+            s = v["instruction"]
+            kinds = find_nontext_kinds(s)
+            if not kinds:
+                continue
+            try:
+                if "image" in kinds:
+                    image = Image(s)
+                    if image.has_image():
+                        c = image.to_content()
+                        v["instruction"] = json.dumps(c, ensure_ascii=False)
+
+                if "audio" in kinds:
+                    audio = Audio(s)
+                    if audio.has_audio():
+                        c = audio.to_content()
+                        v["instruction"] = json.dumps(c, ensure_ascii=False)
+            except Exception as inst:
+                logger.warning(
+                    f"fail to process the image/audio in the instruction for {model}, send it as text: {inst}"
+                )
+
+    def _use_binary_wire(self, model: str, input_value: List[Dict[str, Any]]) -> bool:
+        wire_format = self.mapping_wire_format.get(model, "auto")
+        # meta requests always go as json, the meta is how the support is negotiated
+        if wire_format == "json" or input_value[0].get("meta", False):
+            return False
+        if wire_format == "binary":
+            return True
+        return self.meta_cache.get(model, {}).get("support_binary_wire", False)
+
+    def _encode_query_chunks(
+        self, model: str, input_value: List[Dict[str, Any]], num_workers: int = 1
+    ) -> List[List[Union[str, Dict[str, Any]]]]:
+        if self._use_binary_wire(model, input_value):
+            new_input_value = input_value
+        else:
+            try:
+                new_input_value = [
+                    json.dumps(x, ensure_ascii=False) for x in input_value
+                ]
+            except Exception as inst:
+                raise Exception(
+                    f"input_value should be json serializable, got {input_value}"
+                )
+
+        if self.verbose:
+            print(f"Send to model[{model}]:{new_input_value}")
+
+        # split the batch into contiguous chunks, one chunk per leased worker,
+        # so the results can be concatenated back in order
+        num_workers = max(1, min(num_workers, len(new_input_value)))
+        chunk_size = (len(new_input_value) + num_workers - 1) // num_workers
+        return [
+            new_input_value[i : i + chunk_size]
+            for i in range(0, len(new_input_value), chunk_size)
+        ]
+
+    def _decode_query_result(self, r: Dict[str, Any]) -> List[Dict[str, Any]]:
+        value = r["value"][0]
+        if isinstance(value, str):
+            return json.loads(value)
+        # binary wire format: embeddings are numpy arrays, the matrices of
+        # embedding_batch requests are kept as they are for emb_array
+        for item in value:
+            if hasattr(item["predict"], "tolist") and not item["input"].get(
+                "embedding_batch", False
+            ):
+                item["predict"] = item["predict"].tolist()
+        return value
+
+    def _get_pinned_worker_id(self, input_value: List[Dict[str, Any]]) -> int:
+        worker_id = -1
+        if self.pin_model_worker_mapping:
+            if input_value[0].get("embedding", False):
+                worker_id = self.pin_model_worker_mapping.get("embedding", -1)
+            elif input_value[0].get("tokenizer", False):
+                worker_id = self.pin_model_worker_mapping.get("tokenizer", -1)
+            elif input_value[0].get("apply_chat_template", False):
+                worker_id = self.pin_model_worker_mapping.get(
+                    "apply_chat_template", -1
+                )
+            elif input_value[0].get("meta", False):
+                worker_id = self.pin_model_worker_mapping.get("meta", -1)
+        return worker_id
@@ -0,0 +1,302 @@
+import json
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.background import BackgroundTask
+
+from byzerllm.utils.client.entrypoints.openai.protocol import ErrorResponse
+from byzerllm.utils.metrics.serving import ServingMetrics
+
+PRIORITY_CLASSES = {"high": 0, "normal": 1, "low": 2}
+PRIORITY_NAMES = {v: k for k, v in PRIORITY_CLASSES.items()}
+PRIORITY_HEADER = "x-priority"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class _ModelQueue:
+    def __init__(self):
+        self.in_flight = 0
+        # priority -> admitted requests of the priority class still in flight
+        self.in_flight_by_priority = {p: 0 for p in PRIORITY_CLASSES.values()}
+        # [priority, seq, future], a lower priority value is served first
+        self.waiters: List[List[Any]] = []
+        self.admitted = 0
+        self.queued = 0
+        # requests admitted after waiting in the queue
+        self.waited = 0
+        self.wait_s_total = 0.0
+        self.wait_s_max = 0.0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self.waiters if not future.done())
+
+    def queue_depth_by_priority(self) -> Dict[int, int]:
+        depth = {p: 0 for p in PRIORITY_CLASSES.values()}
+        for priority, _, future in self.waiters:
+            if not future.done():
+                depth[priority] += 1
+        return depth
+
+
+class AdmissionController:
+    """
+    Per-model admission control for the OpenAI compatible server.
+
+    At most max_in_flight requests of a model are forwarded to Ray at a time,
+    the others wait in a queue of at most max_queue requests, ordered by their
+    priority class (high, normal, low) and then by arrival. A request that
+    finds the queue full is rejected with 429, one that waits longer than
+    queue_timeout_s with 503.
+
+    The priority class comes from the `X-Priority` header or, for the API keys
+    in api_key_priorities, from the key; requests default to "normal".
+
+    The queue wait of admitted requests is also observed in metrics, if given,
+    which also has gauges of the queue depth and the requests in flight per
+    model and priority class.
+
+    A server serving one model (server_model_name) has a single queue whatever
+    model the requests name. Otherwise requests are queued by their model, if
+    model_exists says it is deployed; requests for other models are not
+    admission controlled, they are rejected with 404 by the server anyway, so
+    made up model names cannot create queues.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 64,
+        max_queue: int = 128,
+        queue_timeout_s: float = 30.0,
+        api_key_priorities: Dict[str, str] = {},
+        metrics: Optional[ServingMetrics] = None,
+        server_model_name: Optional[str] = None,
+        model_exists: Optional[Callable[[str], bool]] = None,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.api_key_priorities = api_key_priorities
+        self.metrics = metrics
+        self.server_model_name = server_model_name
+        self.model_exists = model_exists
+        self.queues: Dict[str, _ModelQueue] = {}
+        self.seq = itertools.count()
+
+    @staticmethod
+    def parse_api_key_priorities(s: str) -> Dict[str, str]:
+        """"key1:high,key2:low" -> {"key1": "high", "key2": "low"}"""
+        priorities = {}
+        for item in s.split(","):
+            if not item.strip():
+                continue
+            key, priority = item.rsplit(":", 1)
+            if priority not in PRIORITY_CLASSES:
+                raise Exception(
+                    f"priority should be one of {list(PRIORITY_CLASSES)}, got {priority}"
+                )
+            priorities[key.strip()] = priority
+        return priorities
+
+    def priority_of(self, request: Request) -> int:
+        auth = request.headers.get("Authorization", "")
+        if auth.startswith("Bearer "):
+            key_priority = self.api_key_priorities.get(auth[len("Bearer ") :], None)
+            if key_priority is not None:
+                return PRIORITY_CLASSES[key_priority]
+        return PRIORITY_CLASSES.get(
+            request.headers.get(PRIORITY_HEADER, "normal").lower(),
+            PRIORITY_CLASSES["normal"],
+        )
+
+    async def model_key(self, model: Optional[str]) -> Optional[str]:
+        """
+        The queue of a request for model, None if it is not admission controlled.
+        """
+        if self.server_model_name:
+            return self.server_model_name
+        if not model or not isinstance(model, str):
+            return None
+        if model in self.queues or self.model_exists is None:
+            return model
+        # e.g. ByzerLLM.is_model_exist, a lookup of the Ray actor
+        if await asyncio.to_thread(self.model_exists, model):
+            return model
+        return None
+
+    def _queue(self, model: str) -> _ModelQueue:
+        q = self.queues.get(model, None)
+        if q is None:
+            q = _ModelQueue()
+            self.queues[model] = q
+        return q
+
+    async def acquire(self, model: str, priority: int = PRIORITY_CLASSES["normal"]):
+        q = self._queue(model)
+        if q.in_flight < self.max_in_flight and q.queue_depth() == 0:
+            q.in_flight += 1
+            q.in_flight_by_priority[priority] += 1
+            q.admitted += 1
+            if self.metrics is not None:
+                self.metrics.observe_queue_wait(model, 0.0)
+            self._report(model, q)
+            return
+
+        if q.queue_depth() >= self.max_queue:
+            q.rejected_queue_full += 1
+            raise AdmissionRejected(
+                429, f"too many requests for model {model}, the queue is full"
+            )
+
+        if len(q.waiters) > 2 * self.max_queue:
+            # drop the entries of requests that timed out or went away
+            q.waiters = [w for w in q.waiters if not w[2].done()]
+            heapq.heapify(q.waiters)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(q.waiters, [priority, next(self.seq), future])
+        q.queued += 1
+        self._report(model, q)
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            q.rejected_timeout += 1
+            self._report(model, q)
+            raise AdmissionRejected(
+                503,
+                f"model {model} is busy, the request waited more than {self.queue_timeout_s}s",
+            )
+        except asyncio.CancelledError:
+            # the client went away right after release handed over the slot
+            if future.done() and not future.cancelled():
+                self.release(model, priority)
+            else:
+                self._report(model, q)
+            raise
+        waited = time.monotonic() - start
+        q.admitted += 1
+        q.waited += 1
+        q.wait_s_total += waited
+        q.wait_s_max = max(q.wait_s_max, waited)
+        if self.metrics is not None:
+            self.metrics.observe_queue_wait(model, waited)
+
+    def release(self, model: str, priority: int = PRIORITY_CLASSES["normal"]):
+        """priority is the one the request was admitted with."""
+        q = self._queue(model)
+        q.in_flight -= 1
+        q.in_flight_by_priority[priority] -= 1
+        # hand the slot to the first waiter still waiting
+        while q.waiters:
+            waiter_priority, _, future = heapq.heappop(q.waiters)
+            if not future.done():
+                q.in_flight += 1
+                q.in_flight_by_priority[waiter_priority] += 1
+                future.set_result(None)
+                break
+        self._report(model, q)
+
+    def _report(self, model: str, q: _ModelQueue):
+        if self.metrics is None:
+            return
+        depth = q.queue_depth_by_priority()
+        for priority, name in PRIORITY_NAMES.items():
+            self.metrics.set_admission_state(
+                model, name, depth[priority], q.in_flight_by_priority[priority]
+            )
+
+    def stat(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            model: {
+                "in_flight": q.in_flight,
+                "queue_depth": q.queue_depth(),
+                "admitted": q.admitted,
+                "queued": q.queued,
+                "wait_s_avg": q.wait_s_total / q.waited if q.waited else 0.0,
+                "wait_s_max": q.wait_s_max,
+                "rejected_queue_full": q.rejected_queue_full,
+                "rejected_timeout": q.rejected_timeout,
+            }
+            for model, q in self.queues.items()
+        }
+
+
+def install_admission_control(app: FastAPI, controller: AdmissionController):
+    """
+    Put the POST /v1 endpoints of app behind the controller. A slot is held
+    until the response, including a streamed one, has been sent. Stats are
+    served at /metrics/admission.
+    """
+
+    @app.get("/metrics/admission")
+    async def admission_stats():
+        return JSONResponse(content=controller.stat())
+
+    @app.middleware("http")
+    async def admission(request: Request, call_next):
+        if request.method != "POST" or not request.url.path.startswith("/v1"):
+            return await call_next(request)
+
+        try:
+            model = json.loads(await request.body()).get("model", None)
+        except Exception:
+            model = None
+        model = await controller.model_key(model)
+        if model is None:
+            return await call_next(request)
+
+        priority = controller.priority_of(request)
+        try:
+            await controller.acquire(model, priority)
+        except AdmissionRejected as e:
+            return JSONResponse(
+                content=ErrorResponse(
+                    message=e.message,
+                    type="rate_limit_exceeded" if e.code == 429 else "server_busy",
+                    code=e.code,
+                ).model_dump(),
+                status_code=e.code,
+                headers={"Retry-After": str(max(1, int(controller.queue_timeout_s)))},
+            )
+
+        try:
+            response = await call_next(request)
+        except BaseException:
+            controller.release(model, priority)
+            raise
+
+        released = False
+
+        async def release_once():
+            nonlocal released
+            if not released:
+                released = True
+                controller.release(model, priority)
+
+        body_iterator = response.body_iterator
+
+        async def release_after_body():
+            try:
+                async for chunk in body_iterator:
+                    yield chunk
+            finally:
+                await release_once()
+
+        response.body_iterator = release_after_body()
+        # also runs when the client disconnects before the body is started
+        if response.background is None:
+            response.background = BackgroundTask(release_once)
+        return response
@@ -16,6 +16,12 @@ from byzerllm.version import __version__ as version
 from byzerllm.utils.client import ByzerLLM, LLMRequest
 from byzerllm.utils.client.entrypoints.openai.serving_chat import OpenAIServingChat
 from byzerllm.utils.client.entrypoints.openai.serving_completion import OpenAIServingCompletion
+from byzerllm.utils.client.entrypoints.openai.embedding_batcher import EmbeddingBatcher
+from byzerllm.utils.client.entrypoints.openai.admission import (
+    AdmissionController,
+    install_admission_control,
+)
+from byzerllm.utils.metrics.serving import SERVING_METRICS, CONTENT_TYPE_LATEST
 from byzerllm.utils.client.entrypoints.openai.protocol import (
     ModelList,
     ModelCard,
@@ -34,6 +40,7 @@ logger = init_logger(__name__)
 llm_client: ByzerLLM = None
 openai_serving_chat: OpenAIServingChat = None
 openai_serving_completion: OpenAIServingCompletion = None
+embedding_batcher: EmbeddingBatcher = None
 
 TIMEOUT_KEEP_ALIVE = 5  # seconds
 # timeout in 10 minutes. Streaming can take longer than 3 min
@@ -54,6 +61,14 @@ async def show_available_models():
     return JSONResponse(content=models.model_dump())
 
 
+@router_app.get("/metrics")
+async def metrics() -> Response:
+    """Prometheus metrics of the requests served by this server."""
+    return Response(
+        content=SERVING_METRICS.exposition(), media_type=CONTENT_TYPE_LATEST
+    )
+
+
 @router_app.get("/version")
 async def show_version():
     return JSONResponse(content={"version": version})
@@ -132,8 +147,11 @@ async def embed(body: Embeddings):
     """
     embedding_id = f"embed-{random_uuid()}"
 
-    results_list = llm_client.emb(body.model, request=LLMRequest(instruction=body.input))
-    tokens = 0
+    texts = [body.input] if isinstance(body.input, str) else body.input
+    results_list = await embedding_batcher.embed(body.model, texts)
+    tokens = sum(
+        results.metadata.get("input_tokens_count", 0) for results in results_list
+    )
 
     return EmbeddingsOutput(
         data=[
@@ -211,6 +229,53 @@ def parse_args():
                         type=str,
                         default=None,
                         help="The file path to the SSL cert file")
+    parser.add_argument("--semantic-cache",
+                        action="store_true",
+                        help="Reuse the answers of semantically similar "
+                             "chat requests")
+    parser.add_argument("--semantic-cache-threshold",
+                        type=float,
+                        default=0.95,
+                        help="Min cosine similarity of a semantic cache hit")
+    parser.add_argument("--semantic-cache-ttl",
+                        type=float,
+                        default=3600,
+                        help="Seconds a semantic cache entry is kept")
+    parser.add_argument("--semantic-cache-emb-model",
+                        type=str,
+                        default=None,
+                        help="The deployed embedding model used by the "
+                             "semantic cache")
+    parser.add_argument("--embedding-batch-wait-ms",
+                        type=float,
+                        default=5,
+                        help="How long concurrent embedding requests of a "
+                             "model are gathered into one batch")
+    parser.add_argument("--embedding-max-batch-size",
+                        type=int,
+                        default=64,
+                        help="Max texts of a gathered embedding batch")
+    parser.add_argument("--admission-max-in-flight",
+                        type=int,
+                        default=0,
+                        help="Max requests per model forwarded to the model at "
+                             "a time, the others are queued. 0 disables the "
+                             "admission control")
+    parser.add_argument("--admission-max-queue",
+                        type=int,
+                        default=128,
+                        help="Max queued requests per model, more get 429")
+    parser.add_argument("--admission-queue-timeout",
+                        type=float,
+                        default=30,
+                        help="Seconds a request may wait in the queue before "
+                             "it gets 503")
+    parser.add_argument("--admission-priority-api-keys",
+                        type=str,
+                        default="",
+                        help="Priority class of API keys, e.g. "
+                             "key1:high,key2:low. Otherwise the X-Priority "
+                             "header (high/normal/low) is used")
 
     return parser.parse_args()
 
@@ -232,6 +297,24 @@ if __name__ == "__main__":
     ray.init(
         "auto", namespace="default", ignore_reinit_error=True
     )
+    llm_client = ByzerLLM()
+
+    # installed before the authentication middleware, so it runs after it
+    if args.admission_max_in_flight > 0:
+        install_admission_control(
+            router_app,
+            AdmissionController(
+                max_in_flight=args.admission_max_in_flight,
+                max_queue=args.admission_max_queue,
+                queue_timeout_s=args.admission_queue_timeout,
+                api_key_priorities=AdmissionController.parse_api_key_priorities(
+                    args.admission_priority_api_keys or ""
+                ),
+                metrics=SERVING_METRICS,
+                server_model_name=args.served_model_name,
+                model_exists=llm_client.is_model_exist,
+            ),
+        )
 
     if token := os.environ.get("BYZERLLM_API_KEY") or args.api_key:
 
@@ -248,7 +331,12 @@ if __name__ == "__main__":
 
     # Register labels for metrics
     # add_global_metrics_labels(model_name=engine_args.model)
-    llm_client = ByzerLLM()
+    if args.semantic_cache:
+        llm_client.setup_semantic_cache(
+            threshold=args.semantic_cache_threshold,
+            ttl_s=args.semantic_cache_ttl,
+            emb_model=args.semantic_cache_emb_model,
+        )
 
     openai_serving_chat = OpenAIServingChat(
         llm_client=llm_client,
@@ -257,18 +345,28 @@ if __name__ == "__main__":
         prompt_template=args.prompt_template
     )
 
+    embedding_batcher = EmbeddingBatcher(
+        llm_client,
+        max_wait_ms=args.embedding_batch_wait_ms,
+        max_batch_size=args.embedding_max_batch_size,
+    )
+
     openai_serving_completion = OpenAIServingCompletion(
         llm_client=llm_client,
         server_model_name=args.served_model_name,
         prompt_template=args.prompt_template
     )
 
-    uvicorn.run(
-        router_app,
-        host=args.host,
-        port=args.port,
-        log_level=args.uvicorn_log_level,
-        timeout_keep_alive=TIMEOUT_KEEP_ALIVE,
-        ssl_keyfile=args.ssl_keyfile,
-        ssl_certfile=args.ssl_certfile
-    )
+    try:
+        uvicorn.run(
+            router_app,
+            host=args.host,
+            port=args.port,
+            log_level=args.uvicorn_log_level,
+            timeout_keep_alive=TIMEOUT_KEEP_ALIVE,
+            ssl_keyfile=args.ssl_keyfile,
+            ssl_certfile=args.ssl_certfile
+        )
+    finally:
+        # give the leased workers back to the model masters
+        llm_client.close()
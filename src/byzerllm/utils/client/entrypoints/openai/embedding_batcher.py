@@ -0,0 +1,72 @@
+import asyncio
+from typing import Dict, List, Set, Tuple
+
+from byzerllm.utils.client import ByzerLLM, LLMRequest, LLMResponse
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent embedding requests of the same model into one `aemb`
+    call, so many small requests (e.g. RAG queries) share one round trip to a
+    worker and one batched forward pass there.
+
+    The first request of a model opens a batch that is sent after max_wait_ms,
+    or as soon as it holds max_batch_size texts. Each request gets back the
+    results of its own texts, in order.
+    """
+
+    def __init__(
+        self, llm_client: ByzerLLM, max_wait_ms: float = 5.0, max_batch_size: int = 64
+    ):
+        self.llm_client = llm_client
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        # model -> [(texts, future)] waiting to be sent
+        self.pending: Dict[str, List[Tuple[List[str], asyncio.Future]]] = {}
+        self.pending_texts: Dict[str, int] = {}
+        self.timers: Dict[str, asyncio.TimerHandle] = {}
+        # the loop only keeps weak references to tasks
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def embed(self, model: str, texts: List[str]) -> List[LLMResponse]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.setdefault(model, []).append((texts, future))
+        self.pending_texts[model] = self.pending_texts.get(model, 0) + len(texts)
+
+        if self.pending_texts[model] >= self.max_batch_size:
+            self._flush(model)
+        elif model not in self.timers:
+            self.timers[model] = loop.call_later(
+                self.max_wait_ms / 1000, self._flush, model
+            )
+        return await future
+
+    def _flush(self, model: str):
+        timer = self.timers.pop(model, None)
+        if timer is not None:
+            timer.cancel()
+        self.pending_texts.pop(model, None)
+        batch = self.pending.pop(model, [])
+        if batch:
+            task = asyncio.ensure_future(self._run(model, batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, model: str, batch: List[Tuple[List[str], asyncio.Future]]):
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        try:
+            results = await self.llm_client.aemb(
+                model, request=LLMRequest(instruction=texts)
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        start = 0
+        for request_texts, future in batch:
+            if not future.done():
+                future.set_result(results[start : start + len(request_texts)])
+            start += len(request_texts)
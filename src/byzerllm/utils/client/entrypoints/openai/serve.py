@@ -12,6 +12,12 @@ from byzerllm.version import __version__ as version
 from byzerllm.utils.client import ByzerLLM, LLMRequest
 from byzerllm.utils.client.entrypoints.openai.serving_chat import OpenAIServingChat
 from byzerllm.utils.client.entrypoints.openai.serving_completion import OpenAIServingCompletion
+from byzerllm.utils.client.entrypoints.openai.embedding_batcher import EmbeddingBatcher
+from byzerllm.utils.client.entrypoints.openai.admission import (
+    AdmissionController,
+    install_admission_control,
+)
+from byzerllm.utils.metrics.serving import SERVING_METRICS, CONTENT_TYPE_LATEST
 from byzerllm.utils.client.entrypoints.openai.protocol import (
     ModelList,
     ModelCard,
@@ -32,6 +38,7 @@ logger = init_logger(__name__)
 llm_client: ByzerLLM = None
 openai_serving_chat: OpenAIServingChat = None
 openai_serving_completion: OpenAIServingCompletion = None
+embedding_batcher: EmbeddingBatcher = None
 
 TIMEOUT_KEEP_ALIVE = 5  # seconds
 # timeout in 10 minutes. Streaming can take longer than 3 min
@@ -52,6 +59,14 @@ async def show_available_models():
     return JSONResponse(content=models.model_dump())
 
 
+@router_app.get("/metrics")
+async def metrics() -> Response:
+    """Prometheus metrics of the requests served by this server."""
+    return Response(
+        content=SERVING_METRICS.exposition(), media_type=CONTENT_TYPE_LATEST
+    )
+
+
 @router_app.get("/version")
 async def show_version():
     return JSONResponse(content={"version": version})
@@ -130,8 +145,11 @@ async def embed(body: Embeddings):
     """
     embedding_id = f"embed-{random_uuid()}"
 
-    results_list = llm_client.emb(body.model, request=LLMRequest(instruction=body.input))
-    tokens = 0
+    texts = [body.input] if isinstance(body.input, str) else body.input
+    results_list = await embedding_batcher.embed(body.model, texts)
+    tokens = sum(
+        results.metadata.get("input_tokens_count", 0) for results in results_list
+    )
 
     return EmbeddingsOutput(
         data=[
@@ -166,6 +184,16 @@ class ServerArgs(BaseModel):
     response_role: str = "assistant"
     ssl_keyfile: str = None
     ssl_certfile: str = None
+    semantic_cache: bool = False
+    semantic_cache_threshold: float = 0.95
+    semantic_cache_ttl: float = 3600
+    semantic_cache_emb_model: str = None
+    embedding_batch_wait_ms: float = 5
+    embedding_max_batch_size: int = 64
+    admission_max_in_flight: int = 0
+    admission_max_queue: int = 128
+    admission_queue_timeout: float = 30
+    admission_priority_api_keys: str = None
 
 def serve(llm:ByzerLLM, args: ServerArgs):
     
@@ -180,6 +208,23 @@ def serve(llm:ByzerLLM, args: ServerArgs):
         allow_headers=args.allowed_headers,
     )
     
+    # installed before the authentication middleware, so it runs after it
+    if args.admission_max_in_flight > 0:
+        install_admission_control(
+            router_app,
+            AdmissionController(
+                max_in_flight=args.admission_max_in_flight,
+                max_queue=args.admission_max_queue,
+                queue_timeout_s=args.admission_queue_timeout,
+                api_key_priorities=AdmissionController.parse_api_key_priorities(
+                    args.admission_priority_api_keys or ""
+                ),
+                metrics=SERVING_METRICS,
+                server_model_name=args.served_model_name,
+                model_exists=llm.is_model_exist,
+            ),
+        )
+
     if token := os.environ.get("BYZERLLM_API_KEY") or args.api_key:
 
         @router_app.middleware("http")
@@ -197,6 +242,12 @@ def serve(llm:ByzerLLM, args: ServerArgs):
     # add_global_metrics_labels(model_name=engine_args.model)
     global llm_client
     llm_client = llm
+    if args.semantic_cache:
+        llm_client.setup_semantic_cache(
+            threshold=args.semantic_cache_threshold,
+            ttl_s=args.semantic_cache_ttl,
+            emb_model=args.semantic_cache_emb_model or None,
+        )
     
     global openai_serving_chat
     openai_serving_chat = OpenAIServingChat(
@@ -205,6 +256,12 @@ def serve(llm:ByzerLLM, args: ServerArgs):
         server_model_name=args.served_model_name,
         prompt_template=args.prompt_template
     )
+    global embedding_batcher
+    embedding_batcher = EmbeddingBatcher(
+        llm_client,
+        max_wait_ms=args.embedding_batch_wait_ms,
+        max_batch_size=args.embedding_max_batch_size,
+    )
     global openai_serving_completion
     openai_serving_completion = OpenAIServingCompletion(
         llm_client=llm_client,
@@ -212,12 +269,16 @@ def serve(llm:ByzerLLM, args: ServerArgs):
         prompt_template=args.prompt_template
     )
 
-    uvicorn.run(
-        router_app,
-        host=args.host,
-        port=args.port,
-        log_level=args.uvicorn_log_level,
-        timeout_keep_alive=TIMEOUT_KEEP_ALIVE,
-        ssl_keyfile=args.ssl_keyfile,
-        ssl_certfile=args.ssl_certfile
-    )
+    try:
+        uvicorn.run(
+            router_app,
+            host=args.host,
+            port=args.port,
+            log_level=args.uvicorn_log_level,
+            timeout_keep_alive=TIMEOUT_KEEP_ALIVE,
+            ssl_keyfile=args.ssl_keyfile,
+            ssl_certfile=args.ssl_certfile
+        )
+    finally:
+        # give the leased workers back to the model masters
+        llm_client.close()
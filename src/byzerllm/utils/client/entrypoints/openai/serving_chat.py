@@ -1,12 +1,14 @@
 # Adapted from
 # vLLM project
 import asyncio
+import json
 import time
 from fastapi import Request
 from typing import AsyncGenerator, Union, Optional
 
 from byzerllm.log import init_logger
 from byzerllm.utils.types import SingleOutputMeta
+from byzerllm.utils.metrics.serving import SERVING_METRICS
 from byzerllm.utils.client.entrypoints.openai.protocol import (
     ChatCompletionRequest,
     ChatCompletionResponse,
@@ -21,12 +23,51 @@ from byzerllm.utils.client.entrypoints.openai.protocol import (
 
 from byzerllm.utils import random_uuid
 from byzerllm.utils.client import ByzerLLM, LLMResponse
-from byzerllm.utils.langutil import asyncfy_with_semaphore
 from byzerllm.utils.client.entrypoints.openai.serving_engine import OpenAIServing
 
 logger = init_logger(__name__)
 
 
+class DeltaChunkTemplate:
+    """
+    The per token chunk of a chat completion stream, serialized by splicing the
+    delta content and usage into a json template precomputed once per request.
+
+    The output is byte-identical to
+    `ChatCompletionStreamResponse(...).model_dump_json(exclude_unset=True, exclude_none=True)`
+    of a chunk with a content delta and usage (json.dumps with ensure_ascii=False
+    escapes strings the same way pydantic does), without building four pydantic
+    models per token.
+    """
+
+    def __init__(self, request_id: str, object_type: str, created: int, model: str, index: int = 0):
+        self.prefix = (
+            f'{{"id":{json.dumps(request_id, ensure_ascii=False)},'
+            f'"object":{json.dumps(object_type, ensure_ascii=False)},'
+            f'"created":{created},'
+            f'"model":{json.dumps(model, ensure_ascii=False)},'
+            f'"choices":[{{"index":{index},"delta":'
+        )
+
+    def render(self, content: Optional[str], prompt_tokens: int, completion_tokens: int) -> str:
+        delta = "{}" if content is None else f'{{"content":{json.dumps(content, ensure_ascii=False)}}}'
+        return (
+            f'{self.prefix}{delta}}}],'
+            f'"usage":{{"prompt_tokens":{prompt_tokens},'
+            f'"total_tokens":{prompt_tokens + completion_tokens},'
+            f'"completion_tokens":{completion_tokens}}}}}'
+        )
+
+    @staticmethod
+    def can_render(content, prompt_tokens, completion_tokens) -> bool:
+        # anything else goes through pydantic, which validates and coerces it
+        return (
+            (content is None or isinstance(content, str))
+            and type(prompt_tokens) is int
+            and type(completion_tokens) is int
+        )
+
+
 class OpenAIServingChat(OpenAIServing):
 
     def __init__(
@@ -140,34 +181,58 @@ class OpenAIServingChat(OpenAIServing):
 
         # Send response for each token for each request.n (index)
         finish_reason_sent = [False] * body.n
-        async for (s, meta) in result_generator:
-            meta: SingleOutputMeta
-            for _ in [(s, meta)]:
-                i = 0
-                prompt_tokens = meta.input_tokens_count
-                final_usage = UsageInfo(
-                    prompt_tokens=prompt_tokens,
-                    completion_tokens=meta.generated_tokens_count,
-                    total_tokens=prompt_tokens + meta.generated_tokens_count,
-                )
-                choice_data = ChatCompletionResponseStreamChoice(
-                    index=i, delta=DeltaMessage(content=s), finish_reason=None
-                )
-                chunk = ChatCompletionStreamResponse(
-                    id=request_id,
-                    object=chunk_object_type,
-                    created=created_time,
-                    choices=[choice_data],
-                    model=model_name
-                )
-                if final_usage is not None:
-                    chunk.usage = final_usage
-                data = chunk.model_dump_json(
-                    exclude_unset=True,
-                    exclude_none=True,
-                )
-                yield f"data: {data}\n\n"
-                finish_reason_sent[i] = True
+        chunk_template = DeltaChunkTemplate(
+            request_id, chunk_object_type, created_time, model_name
+        )
+        timer = SERVING_METRICS.request(model_name)
+        meta = None
+        # closing the stream on a client disconnect (GeneratorExit or a
+        # cancellation here) cancels the generation behind it
+        try:
+            async for (s, meta) in result_generator:
+                meta: SingleOutputMeta
+                timer.first_token()
+                for _ in [(s, meta)]:
+                    i = 0
+                    prompt_tokens = meta.input_tokens_count
+                    if DeltaChunkTemplate.can_render(
+                        s, prompt_tokens, meta.generated_tokens_count
+                    ):
+                        data = chunk_template.render(
+                            s, prompt_tokens, meta.generated_tokens_count
+                        )
+                        yield f"data: {data}\n\n"
+                        finish_reason_sent[i] = True
+                        continue
+                    final_usage = UsageInfo(
+                        prompt_tokens=prompt_tokens,
+                        completion_tokens=meta.generated_tokens_count,
+                        total_tokens=prompt_tokens + meta.generated_tokens_count,
+                    )
+                    choice_data = ChatCompletionResponseStreamChoice(
+                        index=i, delta=DeltaMessage(content=s), finish_reason=None
+                    )
+                    chunk = ChatCompletionStreamResponse(
+                        id=request_id,
+                        object=chunk_object_type,
+                        created=created_time,
+                        choices=[choice_data],
+                        model=model_name
+                    )
+                    if final_usage is not None:
+                        chunk.usage = final_usage
+                    data = chunk.model_dump_json(
+                        exclude_unset=True,
+                        exclude_none=True,
+                    )
+                    yield f"data: {data}\n\n"
+                    finish_reason_sent[i] = True
+        finally:
+            if meta is not None:
+                timer.finish(meta.input_tokens_count, meta.generated_tokens_count)
+            else:
+                timer.finish()
+            await result_generator.aclose()
         # Send the final done message after all response.n are finished
         yield "data: [DONE]\n\n"
 
@@ -181,14 +246,14 @@ class OpenAIServingChat(OpenAIServing):
         model_name = self.server_model_name or body.model        
 
         async def wrapper_chat_generator():
-            r = await asyncfy_with_semaphore(lambda: self.llm_client.chat_oai(
+            r = await self.llm_client.achat_oai(
                 model=model_name,
                 conversations=body.messages,
                 llm_config={
                     "gen.request_id": request_id,
                     **body.to_llm_config()
                 }
-            ))()
+            )
             for _ in r:
                 yield _
 
@@ -196,12 +261,16 @@ class OpenAIServingChat(OpenAIServing):
         created_time = int(time.time())
         final_res = None
 
-        async for res in result_generator:
-            if await request.is_disconnected():
-                # Abort the request if the client disconnects.
-                await asyncfy_with_semaphore(lambda: self.llm_client.abort(request_id, model=model_name))()
-                return self.create_error_response("Client disconnected")
-            final_res = res
+        timer = SERVING_METRICS.request(model_name)
+        try:
+            async for res in result_generator:
+                if await request.is_disconnected():
+                    # Abort the request if the client disconnects.
+                    await self.llm_client.aabort(request_id, model=model_name)
+                    return self.create_error_response("Client disconnected")
+                final_res = res
+        finally:
+            timer.finish(*self.usage_for_metrics(final_res))
         assert final_res is not None
 
         choices = []
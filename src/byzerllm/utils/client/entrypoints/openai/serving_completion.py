@@ -8,6 +8,7 @@ from typing import AsyncGenerator, Optional
 from fastapi import Request
 
 from byzerllm.utils.types import SingleOutputMeta
+from byzerllm.utils.metrics.serving import SERVING_METRICS
 from byzerllm.utils import random_uuid
 from byzerllm.utils.client import ByzerLLM, LLMResponse
 from byzerllm.utils.client.entrypoints.openai.protocol import (
@@ -68,7 +69,7 @@ class OpenAIServingCompletion(OpenAIServing):
 
         # Non-streaming response
         async def wrapper_chat_generator():
-            r = self.llm_client.chat_oai(
+            r = await self.llm_client.achat_oai(
                 model=model_name,
                 conversations=[
                     {
@@ -84,14 +85,18 @@ class OpenAIServingCompletion(OpenAIServing):
             for _ in r:
                 yield _
 
-        result_generator = await asyncio.to_thread(wrapper_chat_generator)
+        result_generator = wrapper_chat_generator()
         final_res = None
-        async for res in result_generator:
-            if await request.is_disconnected():
-                # Abort the request if the client disconnects.
-                await self.llm_client.abort(request_id, model=model_name)
-                return self.create_error_response("Client disconnected")
-            final_res = res
+        timer = SERVING_METRICS.request(model_name)
+        try:
+            async for res in result_generator:
+                if await request.is_disconnected():
+                    # Abort the request if the client disconnects.
+                    await self.llm_client.aabort(request_id, model=model_name)
+                    return self.create_error_response("Client disconnected")
+                final_res = res
+        finally:
+            timer.finish(*self.usage_for_metrics(final_res))
         assert final_res is not None
         choices = []
 
@@ -183,43 +188,55 @@ class OpenAIServingCompletion(OpenAIServing):
             }
         )
 
-        async for res in result_generator:
-            (s, meta) = res
-            meta: SingleOutputMeta
-            for _ in [(s, meta)]:
-                i = 0
-                delta_text = s[len(previous_texts[i]):]
-                top_logprobs = None
-                logprobs = None
-
-                previous_texts[i] = s
-                finish_reason = None
-                response_json = self.create_stream_response_json(
-                    body=body,
-                    index=i,
-                    text=delta_text,
-                    logprobs=logprobs,
-                    request_id=request_id,
-                    created_time=created_time,
-                    finish_reason=finish_reason,
-                )
-                yield f"data: {response_json}\n\n"
-                completion_tokens = meta.generated_tokens_count
-                prompt_tokens = meta.input_tokens_count
-                final_usage = UsageInfo(
-                    prompt_tokens=prompt_tokens,
-                    completion_tokens=completion_tokens,
-                    total_tokens=prompt_tokens + completion_tokens,
-                )
-                response_json = self.create_stream_response_json(
-                    body=body,
-                    index=i,
-                    text="",
-                    request_id=request_id,
-                    created_time=created_time,
-                    logprobs=logprobs,
-                    finish_reason=None,
-                    usage=final_usage,
-                )
-                yield f"data: {response_json}\n\n"
+        timer = SERVING_METRICS.request(model_name)
+        meta = None
+        # closing the stream on a client disconnect (GeneratorExit or a
+        # cancellation here) cancels the generation behind it
+        try:
+            async for res in result_generator:
+                (s, meta) = res
+                meta: SingleOutputMeta
+                timer.first_token()
+                for _ in [(s, meta)]:
+                    i = 0
+                    delta_text = s[len(previous_texts[i]):]
+                    top_logprobs = None
+                    logprobs = None
+
+                    previous_texts[i] = s
+                    finish_reason = None
+                    response_json = self.create_stream_response_json(
+                        body=body,
+                        index=i,
+                        text=delta_text,
+                        logprobs=logprobs,
+                        request_id=request_id,
+                        created_time=created_time,
+                        finish_reason=finish_reason,
+                    )
+                    yield f"data: {response_json}\n\n"
+                    completion_tokens = meta.generated_tokens_count
+                    prompt_tokens = meta.input_tokens_count
+                    final_usage = UsageInfo(
+                        prompt_tokens=prompt_tokens,
+                        completion_tokens=completion_tokens,
+                        total_tokens=prompt_tokens + completion_tokens,
+                    )
+                    response_json = self.create_stream_response_json(
+                        body=body,
+                        index=i,
+                        text="",
+                        request_id=request_id,
+                        created_time=created_time,
+                        logprobs=logprobs,
+                        finish_reason=None,
+                        usage=final_usage,
+                    )
+                    yield f"data: {response_json}\n\n"
+        finally:
+            if meta is not None:
+                timer.finish(meta.input_tokens_count, meta.generated_tokens_count)
+            else:
+                timer.finish()
+            await result_generator.aclose()
         yield "data: [DONE]\n\n"
@@ -47,6 +47,26 @@ class OpenAIServing:
                 server_model_name, self._detect_prompt_template(prompt_template)
             )
 
+    @staticmethod
+    def usage_for_metrics(res) -> tuple:
+        """
+        (input tokens, output tokens, time to first token in seconds) of a
+        finished LLMResponse, for RequestTimer.finish. Backends that do not
+        measure the first token report 0 or -1, the time to first token is None
+        for them.
+        """
+        if res is None:
+            return (0, 0, None)
+        metadata = res.metadata or {}
+        first_token_ms = metadata.get("first_token_time", None)
+        return (
+            metadata.get("input_tokens_count", 0),
+            metadata.get("generated_tokens_count", 0),
+            first_token_ms / 1000
+            if isinstance(first_token_ms, (int, float)) and first_token_ms > 0
+            else None,
+        )
+
     async def show_available_models(self) -> ModelList:
         """Show available models. Right now we only have one model."""
         model_cards = [
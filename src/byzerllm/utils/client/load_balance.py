@@ -0,0 +1,258 @@
+import time
+import random
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Union
+
+
+def _item_chars(item: Union[str, Dict[str, Any]]) -> int:
+    if isinstance(item, str):
+        return len(item)
+    # a request dict sent in the binary wire format
+    return len(str(item.get("instruction", ""))) + sum(
+        len(str(h.get("content", ""))) for h in item.get("history", [])
+    )
+
+
+def estimate_tokens(encoded_items: List[Union[str, Dict[str, Any]]]) -> int:
+    """Rough token count of encoded requests, about 4 characters per token."""
+    return sum(_item_chars(item) for item in encoded_items) // 4
+
+
+class LoadBalancer(ABC):
+    """
+    Client side worker selection for one model.
+
+    The UDF master only knows "lru" and "round_robin" and has no idea how
+    expensive the requests it hands out are. A LoadBalancer keeps the worker
+    handles of the model (from `master.workers`) and, per worker, the number of
+    requests in flight, the estimated tokens in flight and an EWMA of the
+    seconds spent per token, fed back from every finished request.
+    Subclasses decide which worker gets the next request.
+
+    Requests sent this way bypass the master, so the balancer enforces the
+    `workerMaxConcurrency` of the model itself: a worker with max_concurrency
+    requests in flight is not picked until one of them is released. The cap
+    is counted per client, clients sharing a model do not see each other's
+    requests. Streamed requests keep their slot until the stream is consumed
+    (see hold and release_stream).
+    """
+
+    # a held stream slot is released anyway after this long, like the
+    # requests of a stream server that nobody reads any more expire
+    stream_hold_timeout_s = 600.0
+    poll_interval_s = 0.005
+
+    def __init__(
+        self,
+        master,
+        workers: List[Any],
+        max_concurrency: Optional[int] = None,
+        alpha: float = 0.3,
+    ):
+        self.master_id = getattr(master, "_actor_id", None)
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.alpha = alpha
+        self.in_flight = [0] * len(workers)
+        self.in_flight_tokens = [0] * len(workers)
+        self.ewma_sec_per_token = [None] * len(workers)
+        # request_id -> the slot of the streamed request, shared by the
+        # request ids of one chunk: {"index","tokens","pending","since"}
+        self.streams: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.released = threading.Condition(self.lock)
+
+    def is_for(self, master) -> bool:
+        return getattr(master, "_actor_id", None) == self.master_id
+
+    @abstractmethod
+    def _choose(self, tokens: int, candidates: List[int]) -> int:
+        """
+        The index of the worker for the next request out of the candidates,
+        the workers below max_concurrency. Called under the lock.
+        """
+
+    def _try_acquire(self, tokens: int) -> Optional[int]:
+        # called under the lock
+        self._expire_streams()
+        candidates = [
+            index
+            for index, n in enumerate(self.in_flight)
+            if self.max_concurrency is None or n < self.max_concurrency
+        ]
+        if not candidates:
+            return None
+        index = self._choose(tokens, candidates)
+        self.in_flight[index] += 1
+        self.in_flight_tokens[index] += tokens
+        return index
+
+    def acquire(self, tokens: int, timeout_s: float = 10.0) -> int:
+        """
+        Pick the worker for a request of about `tokens` tokens and count it as
+        in flight until release is called. Waits up to timeout_s for a worker
+        below max_concurrency and raises like the master does when there is none.
+        """
+        deadline = time.monotonic() + timeout_s
+        with self.released:
+            while True:
+                index = self._try_acquire(tokens)
+                if index is not None:
+                    return index
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Exception("No idle UDFWorker")
+                self.released.wait(remaining)
+
+    async def aacquire(self, tokens: int, timeout_s: float = 10.0) -> int:
+        """acquire for the event loop, polls instead of blocking the loop."""
+        deadline = time.monotonic() + timeout_s
+        while True:
+            with self.lock:
+                index = self._try_acquire(tokens)
+            if index is not None:
+                return index
+            if time.monotonic() >= deadline:
+                raise Exception("No idle UDFWorker")
+            await asyncio.sleep(self.poll_interval_s)
+
+    def release(
+        self,
+        index: int,
+        tokens: int,
+        elapsed_s: Optional[float] = None,
+        metadata: Optional[List[Dict[str, Any]]] = None,
+    ):
+        """
+        elapsed_s is the wall time of the request and metadata the metadata of
+        its results; the token counts reported there replace the estimate when
+        available. Pass elapsed_s=None for failed or streamed requests whose
+        wall time says nothing about the worker's speed.
+        """
+        with self.released:
+            self.in_flight[index] -= 1
+            self.in_flight_tokens[index] -= tokens
+            self.released.notify()
+            if elapsed_s is None:
+                return
+            reported = sum(
+                m.get("input_tokens_count", 0) + m.get("generated_tokens_count", 0)
+                for m in metadata or []
+            )
+            sample = elapsed_s / max(1, reported if reported > 0 else tokens)
+            prev = self.ewma_sec_per_token[index]
+            self.ewma_sec_per_token[index] = (
+                sample if prev is None else self.alpha * sample + (1 - self.alpha) * prev
+            )
+
+    def hold(self, index: int, tokens: int, request_ids: List[str]):
+        """
+        Keep the slot of a streamed request in flight after the predict call
+        returned, until release_stream was called for all its request_ids.
+        """
+        slot = {
+            "index": index,
+            "tokens": tokens,
+            "pending": set(request_ids),
+            "since": time.monotonic(),
+        }
+        with self.lock:
+            for request_id in request_ids:
+                self.streams[request_id] = slot
+
+    def release_stream(self, request_id: str):
+        """The stream of request_id is consumed or abandoned."""
+        with self.lock:
+            slot = self.streams.pop(request_id, None)
+            if slot is None:
+                return
+            slot["pending"].discard(request_id)
+            if slot["pending"]:
+                return
+        self.release(slot["index"], slot["tokens"])
+
+    def _expire_streams(self):
+        # called under the lock
+        now = time.monotonic()
+        expired = [
+            request_id
+            for request_id, slot in self.streams.items()
+            if now - slot["since"] > self.stream_hold_timeout_s
+        ]
+        for request_id in expired:
+            slot = self.streams.pop(request_id)
+            slot["pending"].discard(request_id)
+            if not slot["pending"]:
+                self.in_flight[slot["index"]] -= 1
+                self.in_flight_tokens[slot["index"]] -= slot["tokens"]
+
+    def _expected_cost(self, index: int, tokens: int) -> float:
+        # workers without samples yet look free so they get probed first
+        sec_per_token = self.ewma_sec_per_token[index] or 0.0
+        return sec_per_token * (self.in_flight_tokens[index] + tokens)
+
+    def stat(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "strategy": self.name,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": list(self.in_flight),
+                "in_flight_tokens": list(self.in_flight_tokens),
+                "ewma_sec_per_token": list(self.ewma_sec_per_token),
+                "streams": len(self.streams),
+            }
+
+
+class LeastOutstandingLoadBalancer(LoadBalancer):
+    """The worker with the fewest requests in flight, ties broken at random."""
+
+    name = "least_outstanding"
+
+    def _choose(self, tokens: int, candidates: List[int]) -> int:
+        least = min(self.in_flight[index] for index in candidates)
+        return random.choice(
+            [index for index in candidates if self.in_flight[index] == least]
+        )
+
+
+class EwmaLatencyLoadBalancer(LoadBalancer):
+    """
+    The worker expected to finish the request first: its EWMA seconds per
+    token times the tokens it already has in flight plus this request.
+    """
+
+    name = "ewma_latency"
+
+    def _choose(self, tokens: int, candidates: List[int]) -> int:
+        costs = {index: self._expected_cost(index, tokens) for index in candidates}
+        least = min(costs.values())
+        return random.choice([index for index, c in costs.items() if c == least])
+
+
+class PowerOfTwoLoadBalancer(LoadBalancer):
+    """
+    Two workers sampled at random, the one with fewer requests in flight wins
+    (then the lower expected cost). Avoids herding on a single "best" worker
+    when many clients balance on stale information.
+    """
+
+    name = "power_of_two"
+
+    def _choose(self, tokens: int, candidates: List[int]) -> int:
+        if len(candidates) == 1:
+            return candidates[0]
+        a, b = random.sample(candidates, 2)
+        key = lambda index: (self.in_flight[index], self._expected_cost(index, tokens))
+        return a if key(a) <= key(b) else b
+
+
+LOAD_BALANCERS = {
+    cls.name: cls
+    for cls in [
+        LeastOutstandingLoadBalancer,
+        EwmaLatencyLoadBalancer,
+        PowerOfTwoLoadBalancer,
+    ]
+}
@@ -0,0 +1,206 @@
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+STREAM_KEYS = ["stream", "gen.stream", "generation.stream"]
+# requests that control a running generation instead of asking the model
+CONTROL_KEYS = ["abort", "gen.abort", "generation.abort"]
+TEMPERATURE_KEYS = ["temperature", "gen.temperature", "generation.temperature"]
+
+
+def is_cacheable(request: Dict[str, Any], only_deterministic: bool = True) -> bool:
+    """
+    Stream and control requests are never cached, stream results are just a
+    stream handle and a control request has to reach the worker. With
+    only_deterministic, requests sampling with a temperature other than 0
+    (0.9 if not set, the default of the backends) are not cached either.
+    """
+    if any(request.get(k, False) for k in STREAM_KEYS + CONTROL_KEYS):
+        return False
+    if only_deterministic:
+        temperature = next(
+            (request[k] for k in TEMPERATURE_KEYS if k in request), 0.9
+        )
+        try:
+            return float(temperature) == 0
+        except (TypeError, ValueError):
+            return False
+    return True
+
+
+class ResponseCache:
+    """
+    Exact-match cache of model responses, keyed on the model and the request
+    sent to it (rendered instruction, history and generation params).
+
+    Entries live in memory in LRU order, bounded both by max_entries and by the
+    size of the serialized responses (max_bytes). With disk_path the entries are
+    also written to a sqlite database, so they survive restarts: a miss in
+    memory falls back to the database and promotes the entry. The database
+    keeps at most max_disk_entries entries, the least recently used are
+    deleted first.
+
+    By default only deterministic requests (temperature 0) are cached; stream
+    and abort requests are never cached, see is_cacheable.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 256 * 1024 * 1024,
+        disk_path: Optional[str] = None,
+        max_disk_entries: int = 100000,
+        only_deterministic: bool = True,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_entries = max_disk_entries
+        self.only_deterministic = only_deterministic
+        self.entries: "OrderedDict[str, str]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        self.db = None
+        self.disk_entries = 0
+        if disk_path:
+            self.db = sqlite3.connect(disk_path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT, accessed_at REAL)"
+            )
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+            )
+            self.db.commit()
+            self.disk_entries = self.db.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()[0]
+
+    def key(self, model: str, request: Dict[str, Any]) -> Optional[str]:
+        """
+        The cache key of the request, or None if it should not be cached.
+        """
+        if not is_cacheable(request, self.only_deterministic):
+            return None
+        # request ids are unique per call and must not split the cache
+        params = {k: v for k, v in request.items() if "request_id" not in k}
+        s = json.dumps(
+            {"model": model, "request": params},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self.lock:
+            value = self.entries.get(key, None)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(value)
+
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT value FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self.db.execute(
+                        "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+                    self.db.commit()
+                    self._put_memory(key, row[0])
+                    self.disk_hits += 1
+                    return json.loads(row[0])
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: List[Dict[str, Any]]):
+        try:
+            value = json.dumps(response, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return
+        with self.lock:
+            self._put_memory(key, value)
+            if self.db is not None:
+                exists = self.db.execute(
+                    "SELECT 1 FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                self.db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, accessed_at) VALUES (?, ?, ?)",
+                    (key, value, time.time()),
+                )
+                if exists is None:
+                    self.disk_entries += 1
+                if self.disk_entries > self.max_disk_entries:
+                    # trim in batches so the delete does not run on every put
+                    num = self.disk_entries - int(self.max_disk_entries * 0.9)
+                    self.db.execute(
+                        "DELETE FROM responses WHERE key IN "
+                        "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                        (num,),
+                    )
+                    self.disk_entries -= num
+                self.db.commit()
+
+    async def aget(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        get for the event loop, the sqlite lookup of a memory miss runs in a
+        thread.
+        """
+        if self.db is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, response: List[Dict[str, Any]]):
+        if self.db is None:
+            self.put(key, response)
+            return
+        await asyncio.to_thread(self.put, key, response)
+
+    def _put_memory(self, key: str, value: str):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= len(old)
+        self.entries[key] = value
+        self.total_bytes += len(value)
+        while self.entries and (
+            len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+            if self.db is not None:
+                self.db.execute("DELETE FROM responses")
+                self.db.commit()
+                self.disk_entries = 0
+
+    def stat(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "disk_entries": self.disk_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,195 @@
+import json
+import time
+import bisect
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from byzerllm.utils.client.response_cache import is_cacheable
+
+
+class _SemanticCacheNamespace:
+    """
+    The entries of one model in insertion order, so expired or overflowing
+    entries are always a prefix. Vectors live in a growable buffer whose live
+    rows are [start, end); dropping a prefix just moves start.
+    """
+
+    def __init__(self):
+        self.buffer: Optional[np.ndarray] = None
+        self.start = 0
+        self.end = 0
+        self.created_at: List[float] = []
+        self.context_keys: List[str] = []
+        self.responses: List[str] = []
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self.buffer[self.start : self.end]
+
+    def drop_prefix(self, num: int):
+        if num <= 0:
+            return
+        self.start += num
+        del self.created_at[:num]
+        del self.context_keys[:num]
+        del self.responses[:num]
+
+    def append(self, vector: np.ndarray, context_key: str, response: str):
+        if self.buffer is None or self.buffer.shape[1] != vector.shape[0]:
+            # first entry, or the embedding model changed its dimension
+            self.__init__()
+            self.buffer = np.zeros((16, vector.shape[0]), dtype=np.float32)
+        elif self.end == self.buffer.shape[0]:
+            size = len(self)
+            if self.start >= self.buffer.shape[0] // 2:
+                self.buffer[:size] = self.buffer[self.start : self.end]
+            else:
+                buffer = np.zeros(
+                    (self.buffer.shape[0] * 2, self.buffer.shape[1]), dtype=np.float32
+                )
+                buffer[:size] = self.buffer[self.start : self.end]
+                self.buffer = buffer
+            self.start, self.end = 0, size
+        self.buffer[self.end] = vector
+        self.end += 1
+        self.created_at.append(time.time())
+        self.context_keys.append(context_key)
+        self.responses.append(response)
+
+
+class SemanticCache:
+    """
+    Response cache that also matches paraphrases: the last user turn is
+    embedded and compared (cosine similarity) with the turns of cached
+    responses of the same model; the best match at or above threshold is a hit.
+
+    A hit also requires the same context: with match_history the earlier turns
+    of the conversation and the generation params must be identical, so a
+    paraphrase asked in a different conversation does not get the answer of
+    another one. Entries expire after ttl_s and each model keeps at most
+    max_entries of them, the oldest are dropped first.
+
+    Only deterministic requests (temperature 0) are cached, a sampled answer
+    replayed for every paraphrase would not be one the model could give.
+    Stream and control requests (abort) are never cached.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl_s: float = 3600.0,
+        max_entries: int = 10000,
+        match_history: bool = True,
+    ):
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.match_history = match_history
+        self.namespaces: Dict[str, _SemanticCacheNamespace] = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def context_key(
+        self, conversations: List[Dict[str, Any]], request: Dict[str, Any]
+    ) -> Optional[str]:
+        """
+        The key of everything but the last user turn, or None if the request
+        should not be cached.
+        """
+        if not is_cacheable(request, only_deterministic=True):
+            return None
+        params = {
+            k: v
+            for k, v in request.items()
+            if k not in ["instruction", "history"] and "request_id" not in k
+        }
+        history = (
+            [
+                {k: v for k, v in item.items() if k != "metadata"}
+                for item in conversations
+            ]
+            if self.match_history
+            else []
+        )
+        s = json.dumps(
+            {"history": history, "params": params},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+    def _expire(self, namespace: _SemanticCacheNamespace):
+        cutoff = time.time() - self.ttl_s
+        namespace.drop_prefix(bisect.bisect_left(namespace.created_at, cutoff))
+
+    def get(
+        self, model: str, context_key: str, vector: List[float]
+    ) -> Optional[List[Dict[str, Any]]]:
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self.lock:
+            namespace = self.namespaces.get(model, None)
+            if namespace is not None:
+                self._expire(namespace)
+            if (
+                namespace is None
+                or len(namespace) == 0
+                or namespace.buffer.shape[1] != query.shape[0]
+            ):
+                self.misses += 1
+                return None
+            sims = namespace.vectors @ query
+            same_context = np.array(
+                [k == context_key for k in namespace.context_keys], dtype=bool
+            )
+            sims = np.where(same_context, sims, -np.inf)
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(namespace.responses[best])
+
+    def put(
+        self,
+        model: str,
+        context_key: str,
+        vector: List[float],
+        response: List[Dict[str, Any]],
+    ):
+        try:
+            value = json.dumps(response, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return
+        v = np.asarray(vector, dtype=np.float32)
+        v = v / (np.linalg.norm(v) or 1.0)
+        with self.lock:
+            namespace = self.namespaces.setdefault(model, _SemanticCacheNamespace())
+            self._expire(namespace)
+            namespace.append(v, context_key, value)
+            namespace.drop_prefix(len(namespace) - self.max_entries)
+
+    def clear(self, model: Optional[str] = None):
+        with self.lock:
+            if model is None:
+                self.namespaces = {}
+            else:
+                self.namespaces.pop(model, None)
+
+    def stat(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": {k: len(v) for k, v in self.namespaces.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
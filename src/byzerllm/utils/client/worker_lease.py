@@ -0,0 +1,169 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Any, List
+
+import ray
+
+
+class WorkerLeasePool:
+    """
+    Client side cache of the worker slots leased from the UDF master of one model.
+
+    A slot is the `[index, worker]` pair returned by `master.get`. Normally the
+    client asks the master for a slot before every request and gives it back
+    afterwards, which are two synchronous hops through the master actor. The
+    pool instead keeps released slots and hands them out again, so in the
+    steady state a request goes straight to the worker handle. The master is
+    only contacted when no cached slot is free (all missing slots are fetched
+    in one round trip), and slots are returned with fire-and-forget
+    `give_back` calls once they have been idle for `idle_timeout_s` or the
+    pool holds more than `lease_size` of them. Idle slots are expired by a
+    background thread too, so a client that stops sending requests does not
+    keep them checked out.
+    """
+
+    def __init__(self, master, lease_size: int = 8, idle_timeout_s: float = 30.0):
+        self.master = master
+        self.master_id = getattr(master, "_actor_id", None)
+        self.lease_size = lease_size
+        self.idle_timeout_s = idle_timeout_s
+        # [index, worker, last released time], the newest slots on the right
+        self.free = deque()
+        self.in_use = 0
+        # master.get refs of failed or cancelled acquires, their slots are
+        # given back once they resolve
+        self.orphaned = []
+        self.closed = False
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        # idle slots also expire when the client stops sending requests
+        self.sweep_thread = threading.Thread(
+            target=self._sweep_loop, name="byzerllm-worker-lease", daemon=True
+        )
+        self.sweep_thread.start()
+
+    def is_for(self, master) -> bool:
+        """
+        False if the model has been redeployed and the cached slots belong to
+        a master that no longer exists.
+        """
+        return getattr(master, "_actor_id", None) == self.master_id
+
+    def _take(self, num: int) -> List[List[Any]]:
+        with self.lock:
+            slots = []
+            while self.free and len(slots) < num:
+                # reuse the most recently released slots so the others can expire
+                index, worker, _ = self.free.pop()
+                slots.append([index, worker])
+            self.in_use += num
+            return slots
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = []
+        with self.lock:
+            while self.free and now - self.free[0][2] > self.idle_timeout_s:
+                expired.append(self.free.popleft()[0])
+        for index in expired:
+            self.master.give_back.remote(index)
+
+    def _abandon(self, slots: List[List[Any]], refs: List[Any]):
+        """
+        Undo an acquire that failed or was cancelled while waiting for the
+        master: the slots taken from the pool go back to it and the slots the
+        master hands out for refs are given back to the master.
+        """
+        with self.lock:
+            self.in_use -= len(refs)
+            self.orphaned.extend(refs)
+        self.release(slots)
+        self.wakeup.set()
+
+    def _give_back_orphaned(self):
+        with self.lock:
+            refs, self.orphaned = self.orphaned, []
+        for ref in refs:
+            try:
+                index, _ = ray.get(ref)
+            except Exception:
+                continue
+            self.master.give_back.remote(index)
+
+    def _sweep_loop(self):
+        while True:
+            self.wakeup.wait(self.idle_timeout_s / 2)
+            self.wakeup.clear()
+            try:
+                self._give_back_orphaned()
+                if self.closed:
+                    return
+                self._expire()
+            except Exception:
+                # e.g. the master is gone, the next round tries again
+                pass
+
+    def acquire(self, num: int = 1) -> List[List[Any]]:
+        self._expire()
+        slots = self._take(num)
+        if len(slots) < num:
+            refs = [self.master.get.remote() for _ in range(num - len(slots))]
+            try:
+                slots += ray.get(refs)
+            except BaseException:
+                self._abandon(slots, refs)
+                raise
+        return slots
+
+    async def aacquire(self, num: int = 1) -> List[List[Any]]:
+        self._expire()
+        slots = self._take(num)
+        if len(slots) < num:
+            refs = [self.master.get.remote() for _ in range(num - len(slots))]
+            try:
+                slots += await asyncio.gather(*refs)
+            except BaseException:
+                # also asyncio.CancelledError, the refs resolve all the same
+                self._abandon(slots, refs)
+                raise
+        return slots
+
+    def release(self, slots: List[List[Any]], broken: bool = False):
+        """
+        Return slots to the pool. Slots whose worker failed (broken) or that
+        exceed lease_size are given back to the master instead.
+        """
+        now = time.monotonic()
+        give_back = []
+        with self.lock:
+            for index, worker in slots:
+                self.in_use -= 1
+                if broken or len(self.free) + self.in_use >= self.lease_size:
+                    give_back.append(index)
+                else:
+                    self.free.append([index, worker, now])
+        for index in give_back:
+            self.master.give_back.remote(index)
+        self._expire()
+
+    def close(self):
+        """
+        Give all cached slots back to the master and stop the sweep thread.
+        """
+        with self.lock:
+            self.closed = True
+            indices = [index for index, _, _ in self.free]
+            self.free.clear()
+        for index in indices:
+            self.master.give_back.remote(index)
+        self.wakeup.set()
+
+    def stat(self):
+        with self.lock:
+            return {
+                "free": len(self.free),
+                "in_use": self.in_use,
+                "lease_size": self.lease_size,
+            }
@@ -1,7 +1,56 @@
 from langchain.embeddings.base import Embeddings
-from typing import List, Union
+from typing import Callable, List, Optional, Tuple, Union
+
+# padded tokens (rows * longest row) per forward pass of embed_batch
+DEFAULT_MAX_BATCH_TOKENS = 16384
+
+
+def length_sorted_batches(lengths: List[int], max_batch_tokens: int) -> List[List[int]]:
+    """
+    Group the indices of texts with the given token lengths into batches of
+    similar lengths, so padding a batch to its longest text wastes little.
+    A batch is closed when padding it would exceed max_batch_tokens; a text
+    longer than max_batch_tokens gets a batch of its own.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    batch = []
+    for i in order:
+        # sorted ascending, so text i is the longest of the batch if it joins
+        if batch and (len(batch) + 1) * lengths[i] > max_batch_tokens:
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def encode_length_sorted(
+    texts: List[str],
+    lengths: List[int],
+    max_batch_tokens: int,
+    encode: Callable[[List[str]], "np.ndarray"],
+) -> "np.ndarray":
+    """
+    Run encode on length sorted mini-batches of texts and put the rows back in
+    the order of texts, as one float32 matrix.
+    """
+    import numpy as np
+
+    result = None
+    for batch in length_sorted_batches(lengths, max_batch_tokens):
+        embeddings = np.asarray(encode([texts[i] for i in batch]), dtype=np.float32)
+        if result is None:
+            result = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+        result[batch] = embeddings
+    if result is None:
+        return np.zeros((0, 0), dtype=np.float32)
+    return result
+
 
 try:
+    import numpy as np
     import torch
     import torch.nn.functional as F
     from transformers import pipeline
@@ -37,6 +86,45 @@ try:
             embedding = self._encode([text], extract_params)
             return embedding[0]
 
+        def embed_batch(
+            self,
+            texts: List[str],
+            extract_params={},
+            max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+        ) -> np.ndarray:
+            """
+            All texts as a float32 matrix, encoded in length sorted mini-batches
+            of at most max_batch_tokens padded tokens.
+            """
+            return self.embed_batch_with_token_counts(
+                texts, extract_params, max_batch_tokens
+            )[0]
+
+        def embed_batch_with_token_counts(
+            self,
+            texts: List[str],
+            extract_params={},
+            max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+        ) -> Tuple[np.ndarray, Optional[List[int]]]:
+            """
+            embed_batch and the token count of every text, taken from the
+            tokenization done for the length sorting.
+            """
+            params = {k: v for k, v in extract_params.items() if k != "batch_size"}
+            lengths = [
+                len(ids)
+                for ids in self.model.tokenizer(texts, truncation=True)["input_ids"]
+            ]
+            embeddings = encode_length_sorted(
+                texts,
+                lengths,
+                max_batch_tokens,
+                lambda batch: self.model.encode(
+                    batch, batch_size=len(batch), convert_to_numpy=True, **params
+                ),
+            )
+            return embeddings, lengths
+
     class ByzerLLMEmbeddings(Embeddings):
         def __init__(
             self, model, tokenizer, device="auto", use_feature_extraction=False
@@ -61,11 +149,7 @@ try:
             if self.pipeline:
                 return [self.pipeline(text)[0][-1] for text in texts]
             else:
-                _, embeddings = self.get_embedding_with_token_count(texts)
-                embeddings = embeddings.detach().cpu()
-                embeddings = embeddings.numpy()
-                embeddings = [emb.tolist() for emb in embeddings]
-                return embeddings
+                return [emb.tolist() for emb in self.embed_batch(texts, extract_params)]
 
         def embed_documents(
             self, texts: List[str], extract_params={}
@@ -77,6 +161,49 @@ try:
             embedding = self._encode([text], extract_params)
             return embedding[0]
 
+        def embed_batch(
+            self,
+            texts: List[str],
+            extract_params={},
+            max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+        ) -> np.ndarray:
+            """
+            All texts as a float32 matrix. The texts are sorted by token length
+            and run in padded mini-batches of at most max_batch_tokens tokens
+            (padding included), so a short text is not padded to the longest
+            text of the whole request.
+            """
+            return self.embed_batch_with_token_counts(
+                texts, extract_params, max_batch_tokens
+            )[0]
+
+        def embed_batch_with_token_counts(
+            self,
+            texts: List[str],
+            extract_params={},
+            max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+        ) -> Tuple[np.ndarray, Optional[List[int]]]:
+            """
+            embed_batch and the token count of every text, taken from the
+            tokenization done for the length sorting. The counts are None with
+            the feature extraction pipeline, which tokenizes by itself.
+            """
+            if self.pipeline:
+                return (
+                    np.asarray(self._encode(texts, extract_params), dtype=np.float32),
+                    None,
+                )
+
+            def encode(batch: List[str]) -> np.ndarray:
+                with torch.no_grad():
+                    _, embeddings = self.get_embedding_with_token_count(batch)
+                return embeddings.detach().float().cpu().numpy()
+
+            lengths = [
+                len(ids) for ids in self.tokenizer(texts, truncation=True)["input_ids"]
+            ]
+            return encode_length_sorted(texts, lengths, max_batch_tokens, encode), lengths
+
         # copied from https://huggingface.co/sentence-transformers/all-MiniLM-L6-v2#usage-huggingface-transformers
         def get_embedding_with_token_count(
             self,
@@ -126,6 +253,12 @@ except ImportError:
         def embed_query(self, *args, **kwargs):
             raise ImportError("transformers is not installed")
 
+        def embed_batch(self, *args, **kwargs):
+            raise ImportError("transformers is not installed")
+
+        def embed_batch_with_token_counts(self, *args, **kwargs):
+            raise ImportError("transformers is not installed")
+
     class ByzerSentenceTransformerEmbeddings:
         def __init__(self, *args, **kwargs):
             pass
@@ -135,3 +268,9 @@ except ImportError:
 
         def embed_query(self, *args, **kwargs):
             raise ImportError("transformers is not installed")
+
+        def embed_batch(self, *args, **kwargs):
+            raise ImportError("transformers is not installed")
+
+        def embed_batch_with_token_counts(self, *args, **kwargs):
+            raise ImportError("transformers is not installed")
@@ -1,34 +1,112 @@
 from prometheus_client import CollectorRegistry, Gauge,Counter, pushadd_to_gateway
-from byzerllm.utils.config import get_mlsql_config_pushgateway_address,get_mlsql_config
+from byzerllm.utils.config import get_mlsql_config
+from byzerllm.log import init_logger
 from typing import Union,Dict
+import threading
+import atexit
 import ray
 
+logger = init_logger(__name__)
+
 class Metric:
+    '''
+    Counters pushed to the pushgateway configured in Byzer.
+
+    inc only adds to an in process aggregate, a background thread pushes the
+    counters every flush_interval_s, so the request path never waits on the
+    config actor or the pushgateway. At most max_counters counter names are
+    kept, increments of further names are dropped. Counters are not labeled,
+    tags are accepted for compatibility and ignored. What is still pending
+    when the process exits is pushed by an atexit hook.
+    '''
 
-    def __init__(self):
+    def __init__(self, flush_interval_s: float = 15.0, max_counters: int = 1024):
         self.registry = CollectorRegistry()
-        config = get_mlsql_config()
-        self.metric_enabled = False
+        self.flush_interval_s = flush_interval_s
+        self.max_counters = max_counters
+        # None until the flush thread looked up the config actor
+        self.metric_enabled = None
         self.pushgateway_address = None
-        if config is not None:
-            self.pushgateway_address = ray.get(config.getitem.remote("spark.mlsql.pushgateway.address",None))
-            self.metric_enabled = True
 
         self.gauges = {}
-        self.counters = {}        
+        self.counters = {}
+        self.pending: Dict[str, float] = {}
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        # the config is resolved by the flush thread or by flush, whichever runs first
+        self.config_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.flush_thread = None
 
     def inc(self, name:str,value: Union[int, float] = 1.0, tags: Dict[str, str] = None):
-        if not self.metric_enabled:
+        if self.metric_enabled is False:
             return
-        if name not in self.counters:
-            self.counters[name] = Counter(name, '', registry=self.registry)                    
-        self.counters[name].inc(value)   
+        with self.lock:
+            if (name not in self.pending and name not in self.counters
+                    and len(self.pending) + len(self.counters) >= self.max_counters):
+                self.dropped += 1
+                return
+            self.pending[name] = self.pending.get(name, 0) + value
+            if self.flush_thread is None:
+                self.flush_thread = threading.Thread(target=self._flush_loop, name="byzerllm-metric-flush", daemon=True)
+                self.flush_thread.start()
+                atexit.register(self._flush_at_exit)
 
     def push(self):
-        if not self.metric_enabled:
-            return
-        if self.pushgateway_address is not None:
-            pushadd_to_gateway(self.pushgateway_address, job='pushgateway', registry=self.registry)      
-        
-    
+        '''
+        Asks the background thread to push now, without waiting for it.
+        '''
+        self.wakeup.set()
+
+    def flush(self):
+        '''
+        Pushes the pending increments and waits for the pushgateway, for the
+        end of a job rather than the request path.
+        '''
+        if self._resolve_config():
+            self._flush()
 
+    def _resolve_config(self) -> bool:
+        with self.config_lock:
+            if self.metric_enabled is None:
+                try:
+                    config = get_mlsql_config()
+                    if config is not None:
+                        self.pushgateway_address = ray.get(config.getitem.remote("spark.mlsql.pushgateway.address",None))
+                    self.metric_enabled = config is not None
+                except Exception as e:
+                    logger.warning(f"failed to read the pushgateway config: {e}")
+                    self.metric_enabled = False
+                if not self.metric_enabled:
+                    with self.lock:
+                        self.pending.clear()
+            return self.metric_enabled
+
+    def _flush(self):
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            for name, value in pending.items():
+                if name not in self.counters:
+                    self.counters[name] = Counter(name, '', registry=self.registry)
+                self.counters[name].inc(value)
+            if pending and self.pushgateway_address is not None:
+                pushadd_to_gateway(self.pushgateway_address, job='pushgateway', registry=self.registry)
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning(f"failed to push metrics to {self.pushgateway_address}: {e}")
+
+    def _flush_loop(self):
+        if not self._resolve_config():
+            return
+        while True:
+            self.wakeup.wait(self.flush_interval_s)
+            self.wakeup.clear()
+            try:
+                self._flush()
+            except Exception as e:
+                logger.warning(f"failed to push metrics to {self.pushgateway_address}: {e}")
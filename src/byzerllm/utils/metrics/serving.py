@@ -0,0 +1,156 @@
+import time
+from typing import Optional
+
+from prometheus_client import (
+    CollectorRegistry,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    CONTENT_TYPE_LATEST,
+    generate_latest,
+    start_http_server,
+)
+
+LATENCY_BUCKETS = (
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0, 20.0, 40.0, 80.0, 160.0,
+)
+TOKEN_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.015, 0.02, 0.025, 0.03, 0.04, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0, 2.5,
+)
+TOKEN_BUCKETS = (1, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+class ServingMetrics:
+    """
+    Prometheus histograms of the requests served by a process, labeled by
+    model, and gauges of the admission queues of the OpenAI compatible server,
+    labeled by model and priority class. Scraped from the /metrics endpoint of
+    the OpenAI compatible server, or from the exporter a worker starts with
+    start_exporter.
+    """
+
+    def __init__(self, registry: CollectorRegistry = REGISTRY):
+        self.registry = registry
+        self.time_to_first_token = Histogram(
+            "byzerllm_time_to_first_token_seconds",
+            "Time from the arrival of a request to its first output token.",
+            ["model"], buckets=LATENCY_BUCKETS, registry=registry,
+        )
+        self.time_per_output_token = Histogram(
+            "byzerllm_time_per_output_token_seconds",
+            "Mean time between the output tokens of a request, after the first one.",
+            ["model"], buckets=TOKEN_LATENCY_BUCKETS, registry=registry,
+        )
+        self.e2e_request_latency = Histogram(
+            "byzerllm_e2e_request_latency_seconds",
+            "Time from the arrival of a request to its last output token.",
+            ["model"], buckets=LATENCY_BUCKETS, registry=registry,
+        )
+        self.queue_wait = Histogram(
+            "byzerllm_queue_wait_seconds",
+            "Time a request waited before it was admitted or scheduled.",
+            ["model"], buckets=LATENCY_BUCKETS, registry=registry,
+        )
+        self.input_tokens = Histogram(
+            "byzerllm_request_input_tokens",
+            "Number of prompt tokens of a request.",
+            ["model"], buckets=TOKEN_BUCKETS, registry=registry,
+        )
+        self.output_tokens = Histogram(
+            "byzerllm_request_output_tokens",
+            "Number of generated tokens of a request.",
+            ["model"], buckets=TOKEN_BUCKETS, registry=registry,
+        )
+        self.requests_in_flight = Gauge(
+            "byzerllm_requests_in_flight",
+            "Number of requests being generated.",
+            ["model"], registry=registry,
+        )
+        self.admission_queue_depth = Gauge(
+            "byzerllm_admission_queue_depth",
+            "Number of requests waiting to be admitted.",
+            ["model", "priority"], registry=registry,
+        )
+        self.admission_in_flight = Gauge(
+            "byzerllm_admission_in_flight",
+            "Number of admitted requests whose response has not been sent yet.",
+            ["model", "priority"], registry=registry,
+        )
+
+    def request(self, model: str) -> "RequestTimer":
+        return RequestTimer(self, model)
+
+    def observe_queue_wait(self, model: str, wait_s: float):
+        self.queue_wait.labels(model).observe(wait_s)
+
+    def set_admission_state(self, model: str, priority: str, queue_depth: int, in_flight: int):
+        self.admission_queue_depth.labels(model, priority).set(queue_depth)
+        self.admission_in_flight.labels(model, priority).set(in_flight)
+
+    def exposition(self) -> bytes:
+        return generate_latest(self.registry)
+
+    def start_exporter(self, port: int, addr: str = "0.0.0.0") -> int:
+        """
+        Serve the metrics on port, or on a free port if it is taken, e.g. by
+        another worker on the same node. Returns the port bound.
+        """
+        try:
+            server = start_http_server(port, addr=addr, registry=self.registry)
+        except OSError:
+            server = start_http_server(0, addr=addr, registry=self.registry)
+        # prometheus_client < 0.17 returns nothing
+        if server is None:
+            return port
+        return server[0].server_port
+
+
+class RequestTimer:
+    """
+    Times one request: counts it in flight from creation until finish, which
+    observes the latency and token histograms. finish is idempotent so it can
+    be called from a finally block.
+    """
+
+    def __init__(self, metrics: ServingMetrics, model: str):
+        self.metrics = metrics
+        self.model = model
+        self.start = time.monotonic()
+        self.first_token_time: Optional[float] = None
+        self.finished = False
+        metrics.requests_in_flight.labels(model).inc()
+
+    def first_token(self):
+        if self.first_token_time is None:
+            self.first_token_time = time.monotonic()
+
+    def finish(self, input_tokens: int = 0, output_tokens: int = 0, ttft_s: Optional[float] = None):
+        """
+        ttft_s overrides the time to first token measured here, e.g. with the
+        one reported by the backend for a non streamed request.
+        """
+        if self.finished:
+            return
+        self.finished = True
+        m = self.metrics
+        m.requests_in_flight.labels(self.model).dec()
+
+        end = time.monotonic()
+        m.e2e_request_latency.labels(self.model).observe(end - self.start)
+        if ttft_s is None and self.first_token_time is not None:
+            ttft_s = self.first_token_time - self.start
+        if ttft_s is not None:
+            m.time_to_first_token.labels(self.model).observe(ttft_s)
+            if output_tokens > 1:
+                m.time_per_output_token.labels(self.model).observe(
+                    max(0.0, end - self.start - ttft_s) / (output_tokens - 1)
+                )
+        if input_tokens > 0:
+            m.input_tokens.labels(self.model).observe(input_tokens)
+        if output_tokens > 0:
+            m.output_tokens.labels(self.model).observe(output_tokens)
+
+
+# one set of metrics per process, prometheus_client refuses to register a
+# metric name twice in a registry
+SERVING_METRICS = ServingMetrics()
@@ -1,7 +1,22 @@
-from typing import List, Dict, Any, Union, Optional
+from typing import List, Dict, Any, Union, Optional, Set
 import pydantic
 import base64
 import os
+import re
+
+# start tags of the non-text parts Image/Audio look for in a prompt
+NONTEXT_MARKER_PATTERN = re.compile(r"<_(image|audio)_>")
+
+
+def find_nontext_kinds(text: str) -> Set[str]:
+    """
+    The kinds ("image", "audio") of non-text tags in the text, found in one
+    regex pass. An empty set means the text is plain and there is no need to
+    run the tag extractors on it.
+    """
+    if not isinstance(text, str) or "<_" not in text:
+        return set()
+    return set(NONTEXT_MARKER_PATTERN.findall(text))
 
 
 class Tag(pydantic.BaseModel):
@@ -212,7 +212,7 @@ def train(lora_config:str, args:List[str],extra_params={})->str:
     print(f"[{sft_name}] total tokens: {trainer.train_dataset.dataset_tokens_count}",flush=True)
     token_metrics = Metric()
     token_metrics.inc(f"sft_{sft_name}_tokens_num",trainer.train_dataset.dataset_tokens_count)
-    token_metrics.push()
+    token_metrics.flush()
 
     # 保存最好的checkpoint
     final_save_path = join(training_args.output_dir, 'final')
@@ -1,7 +1,8 @@
 from typing import List,Tuple,Any,Dict
 import json
+import asyncio
 from byzerllm.utils.tokenizer import get_real_tokenizer
-from .emb import ByzerLLMEmbeddings,ByzerSentenceTransformerEmbeddings
+from .emb import ByzerLLMEmbeddings,ByzerSentenceTransformerEmbeddings,DEFAULT_MAX_BATCH_TOKENS
 from byzerllm.utils.langutil import asyncfy_with_semaphore
 
 class ByzerLLMGenerator:
@@ -25,6 +26,92 @@ class ByzerLLMGenerator:
         history = input.get("history",[])
         return history
     
+    def count_tokens(self,texts) -> int:
+        """Tokens of the text(s) of an embedding request, 0 if the model has no usable tokenizer."""
+        if isinstance(texts,str):
+            texts = [texts]
+        # SentenceTransformer keeps the real tokenizer in its tokenizer attribute
+        tokenizer = getattr(self.tokenizer,"tokenizer",self.tokenizer)
+        if not callable(tokenizer):
+            return 0
+        try:
+            return sum(len(ids) for ids in tokenizer(texts,truncation=True)["input_ids"])
+        except Exception:
+            return 0
+
+    def _max_batch_tokens(self,query:Dict[str,Any]) -> int:
+        # set per model with llm.setup_extra_generation_params(model,{"embedding.max_batch_tokens":...})
+        return int(query.get("embedding.max_batch_tokens",DEFAULT_MAX_BATCH_TOKENS))
+
+    def can_embed_together(self,data:List[Dict[str,Any]]) -> bool:
+        """
+        Whether the items are plain embedding requests of single texts that one
+        embed_batch call can serve, instead of a forward pass per item.
+        """
+        return len(data) > 1 and hasattr(self.embedding,"embed_batch") and all(
+            item.get("embedding",False)
+            and not item.get("embed_rerank",False)
+            and not item.get("embedding_batch",False)
+            and isinstance(item["instruction"],str)
+            for item in data)
+
+    async def async_embed_together(self,data:List[Dict[str,Any]]):
+        # the items come from the same emb call and share their params
+        new_params = {}
+        for k,v in data[0].items():
+            if k.startswith("gen."):
+                new_params[k[len("gen."):]] = v
+            if k.startswith("generation."):
+                new_params[k[len("generation."):]] = v
+        query = {**data[0],"instruction":[item["instruction"] for item in data]}
+        embeddings,token_counts = await self._async_embed_batch_with_token_counts(query,new_params)
+        if token_counts is None:
+            return list(embeddings)
+        # the texts were tokenized for the length sorting, no need to count them again
+        return [(embedding,{"metadata":{"input_tokens_count":n}}) for embedding,n in zip(embeddings,token_counts)]
+
+    def _to_embedding_matrix(self,values,dtype:str):
+        import numpy as np
+        # some backends return (embedding,{"metadata":...})
+        values = [v[0] if isinstance(v,tuple) else v for v in values]
+        return np.asarray(values,dtype=dtype)
+
+    def embed_batch(self,query:Dict[str,Any],new_params:Dict[str,Any]):
+        """
+        The embeddings of all texts in query["instruction"] as one matrix,
+        computed with a single encode call when the embedding backend has embed_batch.
+        """
+        texts = query["instruction"]
+        dtype = query.get("embedding_dtype","float32")
+        if hasattr(self.embedding,"embed_batch"):
+            return self.embedding.embed_batch(texts,extract_params=new_params,
+                max_batch_tokens=self._max_batch_tokens(query)).astype(dtype,copy=False)
+        item = {k:v for k,v in query.items() if k != "embedding_batch"}
+        return self._to_embedding_matrix([self.predict({**item,"instruction":text}) for text in texts],dtype)
+
+    async def async_embed_batch(self,query:Dict[str,Any],new_params:Dict[str,Any]):
+        return (await self._async_embed_batch_with_token_counts(query,new_params))[0]
+
+    async def _async_embed_batch_with_token_counts(self,query:Dict[str,Any],new_params:Dict[str,Any]):
+        """
+        The embedding matrix and the token count of every text when the backend
+        tokenized them anyway (embed_batch_with_token_counts), None otherwise.
+        """
+        texts = query["instruction"]
+        dtype = query.get("embedding_dtype","float32")
+        if hasattr(self.embedding,"embed_batch_with_token_counts"):
+            embeddings,token_counts = await asyncfy_with_semaphore(lambda:self.embedding.embed_batch_with_token_counts(texts,extract_params=new_params,
+                max_batch_tokens=self._max_batch_tokens(query)))()
+            return embeddings.astype(dtype,copy=False),token_counts
+        if hasattr(self.embedding,"embed_batch"):
+            embeddings = await asyncfy_with_semaphore(lambda:self.embedding.embed_batch(texts,extract_params=new_params,
+                max_batch_tokens=self._max_batch_tokens(query)))()
+            return embeddings.astype(dtype,copy=False),None
+        # the backend only embeds one text at a time
+        item = {k:v for k,v in query.items() if k != "embedding_batch"}
+        values = [await self.async_predict({**item,"instruction":text}) for text in texts]
+        return self._to_embedding_matrix(values,dtype),None
+
     def predict(self,query:Dict[str,Any]):
         ins = query["instruction"]
         
@@ -48,6 +135,9 @@ class ByzerLLMGenerator:
                     new_params[k[len("gen."):]] = v
                 if k.startswith("generation."):
                     new_params[k[len("generation."):]] = v 
+
+            if query.get("embedding_batch",False):
+                return self.embed_batch(query,new_params)
             
             if hasattr(self.embedding.model,"embed_query"):
                 return self.embedding.model.embed_query(ins,extract_params=new_params)
@@ -116,6 +206,12 @@ class ByzerLLMGenerator:
 
                 if query.get("embed_rerank", False):
                     return self.embedding.embed_rerank(ins,extract_params=new_params)
+
+                if query.get("embedding_batch",False):
+                    embeddings,token_counts = await self._async_embed_batch_with_token_counts(query,new_params)
+                    if token_counts is None:
+                        return embeddings
+                    return (embeddings,{"metadata":{"input_tokens_count":sum(token_counts)}})
                 
                 if hasattr(self.embedding.model,"async_embed_query"):
                     return await self.embedding.model.async_embed_query(ins,extract_params=new_params)
@@ -173,14 +269,61 @@ class ByzerLLMGenerator:
             return response[-1]
 
 
+def decode_predict_items(v) -> Tuple[List[Dict[str,Any]],bool]:
+    """
+    The items of a predict call and whether they came in the binary wire format:
+    clients that saw `support_binary_wire` in the model meta send the request
+    dicts as they are (pickled by Ray) instead of json strings.
+    Byzer-SQL and older clients keep sending json strings.
+    """
+    binary = len(v) > 0 and isinstance(v[0],dict)
+    return [item if isinstance(item,dict) else json.loads(item) for item in v],binary
+
+def encode_predict_results(results:List[Dict[str,Any]],binary:bool) -> Dict[str,Any]:
+    """
+    Binary results are returned as they are, with embeddings as float32 numpy
+    arrays, so neither side has to format or parse floats as text.
+    """
+    if not binary:
+        return {"value":[json.dumps(results,ensure_ascii=False,default=_to_json_list)]}
+    import numpy as np
+    for item in results:
+        query = item["input"]
+        if query.get("embedding",False) and not query.get("embed_rerank",False) and isinstance(item["predict"],list):
+            try:
+                item["predict"] = np.asarray(item["predict"],dtype=np.float32)
+            except (TypeError,ValueError):
+                pass
+    return {"value":[results]}
+
+def _to_json_list(o):
+    # numpy embeddings: embedding_batch matrices and rows of embeddings computed together
+    if hasattr(o,"tolist"):
+        return o.tolist()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def _with_binary_wire_meta(v):
+    if isinstance(v,list) and len(v) > 0 and isinstance(v[0],dict):
+        return [{**v[0],"support_binary_wire":True,"support_embedding_batch":True}] + v[1:]
+    return v
+
+
 async def simple_predict_func(model,v):
     (model,tokenizer) = model
     llm = ByzerLLMGenerator(model,tokenizer)
-    data = [json.loads(item) for item in v]
+    data,binary = decode_predict_items(v)
+
+    # models with native async support (e.g. vLLM, SaaS) schedule requests themselves,
+    # so a batch of items can be submitted concurrently instead of one by one
+    if llm.can_embed_together(data):
+        values = await llm.async_embed_together(data)
+    elif hasattr(model,"async_stream_chat") and len(data) > 1:
+        values = await asyncio.gather(*[llm.async_predict(item) for item in data])
+    else:
+        values = [await llm.async_predict(item) for item in data]
     
     results=[]
-    for item in data:        
-        v = await llm.async_predict(item)
+    for item,v in zip(data,values):
         if item.get("embedding",False):
             metadata = {}
             value = v
@@ -188,9 +331,16 @@ async def simple_predict_func(model,v):
                 if isinstance(v[1],dict) and "metadata" in v[1]:
                     metadata = v[1]["metadata"]
                 value = v[0]                            
+            if "input_tokens_count" not in metadata and not item.get("embed_rerank",False):
+                metadata = {**metadata,"input_tokens_count":llm.count_tokens(item["instruction"])}
             results.append({"predict":value,"metadata":metadata,"input":item})
 
-        elif item.get("tokenizer",False) or item.get("meta",False) or item.get("apply_chat_template",False):
+        elif item.get("meta",False):
+            results.append({
+            "predict":_with_binary_wire_meta(v),
+            "metadata":{},
+            "input":item})
+        elif item.get("tokenizer",False) or item.get("apply_chat_template",False):
             results.append({
             "predict":v,
             "metadata":{},
@@ -205,13 +355,13 @@ async def simple_predict_func(model,v):
                 "metadata":metadata,
                 "input":item})
 
-    return {"value":[json.dumps(results,ensure_ascii=False)]}
+    return encode_predict_results(results,binary)
 
 
 def chatglm_predict_func(model,v):
     (trainer,tokenizer) = model
     llm = ByzerLLMGenerator(trainer,tokenizer,use_feature_extraction=True)
-    data = [json.loads(item) for item in v]
+    data,binary = decode_predict_items(v)
     
     results=[]
     for item in data:
@@ -219,7 +369,12 @@ def chatglm_predict_func(model,v):
             item["instruction"] = f'{item["system"]}\n{item["instruction"]}'
         v = llm.predict(item)
 
-        if item.get("tokenizer",False) or item.get("embedding",False) or item.get("meta",False) or item.get("apply_chat_template",False):
+        if item.get("meta",False):
+            results.append({
+            "predict":_with_binary_wire_meta(v),
+            "metadata":{},
+            "input":item})
+        elif item.get("tokenizer",False) or item.get("embedding",False) or item.get("apply_chat_template",False):
             results.append({
             "predict":v,
             "metadata":{},
@@ -234,7 +389,7 @@ def chatglm_predict_func(model,v):
                 "metadata":metadata,
                 "input":item})
         
-    return {"value":[json.dumps(results,ensure_ascii=False)]}
+    return encode_predict_results(results,binary)
 
 def qa_predict_func(model,v):        
     data = [json.loads(item) for item in v]
@@ -1,33 +1,110 @@
+import os
 import time
+import zlib
+import asyncio
 import threading
 from typing import TYPE_CHECKING,TypeVar,Dict, List, Optional, Union,Any,Tuple,get_type_hints,Annotated,get_args,Callable
-from queue import Queue
+from queue import Queue, Empty
+from collections import OrderedDict
+
+class StopSequenceMatcher:
+    '''
+    Aho-Corasick automaton over the token ids of stop sequences.
+
+    Every generated sequence keeps an int state, step feeds it one token and
+    tells whether the sequence now ends with one of the stop sequences, in
+    O(1) per token whatever the number and length of the stop sequences,
+    and without decoding tokens to text.
+    '''
+    def __init__(self, stops:List[List[int]]):
+        # goto[state][token] -> state, state 0 is the root
+        self.goto: List[Dict[int,int]] = [{}]
+        self.fail: List[int] = [0]
+        # whether a stop sequence ends at the state, directly or via fail links
+        self.matched: List[bool] = [False]
+        for stop in stops:
+            state = 0
+            for token in stop:
+                token = int(token)
+                if token not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.matched.append(False)
+                    self.goto[state][token] = len(self.goto) - 1
+                state = self.goto[state][token]
+            if len(stop) > 0:
+                self.matched[state] = True
+
+        # breadth first, so the fail state of a state is computed before it is used
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for token, next_state in self.goto[state].items():
+                fail = self.fail[state]
+                while fail and token not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(token, 0)
+                self.matched[next_state] = self.matched[next_state] or self.matched[self.fail[next_state]]
+                queue.append(next_state)
+
+    def step(self, state:int, token:int) -> Tuple[int,bool]:
+        while state and token not in self.goto[state]:
+            state = self.fail[state]
+        state = self.goto[state].get(token, 0)
+        return state, self.matched[state]
+
+    def feed(self, state:int, tokens:List[int]) -> Tuple[int,bool]:
+        matched = False
+        for token in tokens:
+            state, m = self.step(state, token)
+            matched = matched or m
+        return state, matched
 
 try:
     from transformers import StoppingCriteria
+    import transformers
     import torch
 
+    # since 4.39 a stopping criteria returns one bool per row instead of one for the batch
+    _PER_ROW_STOPPING = tuple(int(v) for v in transformers.__version__.split(".")[:2]) >= (4, 39)
+
     class StopSequencesCriteria(StoppingCriteria):
         """
-        skip_check_min_length is used to skip the the stop sequence check if the input_ids is short
-        than the min_length. 
+        Stops the rows of a batch that end with one of the stop sequences,
+        matched on token ids by a StopSequenceMatcher with one state per row.
+        Each call only feeds the tokens generated since the previous call.
+
+        skip_check_min_length is used to skip the stop sequence check while
+        fewer than skip_check_min_length tokens were generated.
         """
         def __init__(self, tokenizer,stops = [],input_start=0, skip_check_min_length=0):
             super().__init__()      
-            self.stops = stops
+            self.stops = [[int(t) for t in (stop.tolist() if hasattr(stop,"tolist") else stop)] for stop in stops]
             self.input_start = input_start
             self.skip_check_min_length = skip_check_min_length
-            self.stop_words= [tokenizer.decode(item,skip_special_tokens=True) for item in stops]
-            self.tokenizer = tokenizer   
-
-        def to_str(self,s):
-            return self.tokenizer.decode(s,skip_special_tokens=True)     
+            self.tokenizer = tokenizer
+            self.matcher = StopSequenceMatcher(self.stops)
+            self.states: List[int] = []
+            self.stopped: List[bool] = []
+            self.seen = input_start
 
-        def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor):                   
-            for index,stop in enumerate(self.stops):                        
-                if  self.to_str(input_ids[0][-(len(stop)+10):]).endswith(self.stop_words[index]):
-                    return True
-            return False
+        def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs):
+            batch_size, length = input_ids.shape
+            if len(self.states) != batch_size:
+                self.states = [0] * batch_size
+                self.stopped = [False] * batch_size
+                self.seen = self.input_start
+            new_tokens = input_ids[:, self.seen:].tolist()
+            self.seen = length
+            generated = length - self.input_start
+            for row, tokens in enumerate(new_tokens):
+                state, matched = self.matcher.feed(self.states[row], tokens)
+                self.states[row] = state
+                if matched and generated >= self.skip_check_min_length:
+                    self.stopped[row] = True
+            if _PER_ROW_STOPPING:
+                return torch.tensor(self.stopped, dtype=torch.bool, device=input_ids.device)
+            # older releases stop the whole batch at once
+            return all(self.stopped)
 except ImportError:
     # If transformers is not installed, we define a dummy StopSequencesCriteria class
     class StopSequencesCriteria:
@@ -40,108 +117,504 @@ class SingleOutputMeta:
         self.generated_tokens_count = generated_tokens_count    
 
 class SingleOutput:
-    def __init__(self, text:str,metadata:SingleOutputMeta=SingleOutputMeta()):
+    """
+    When is_delta is True, text only holds the text generated since the previous
+    item of the same output and seq numbers the items of the output, so consumers
+    rebuild the full text by concatenating the deltas in order. Otherwise text is
+    the full text generated so far.
+    """
+    def __init__(self, text:str,metadata:SingleOutputMeta=SingleOutputMeta(),is_delta:bool=False,seq:int=0):
         self.text = text
         self.metadata = metadata
+        self.is_delta = is_delta
+        self.seq = seq
         
 class StreamOutputs: 
     def __init__(self, outputs:List[SingleOutput]):
         self.outputs = outputs   
 
+    def is_delta(self)->bool:
+        return len(self.outputs) > 0 and getattr(self.outputs[0],"is_delta",False)
+
+def _merge_stream_item(pending, item):
+    '''
+    Merge a new item into the unread one the stream server holds for a request.
+    Deltas not read yet are concatenated so nothing is lost, and a status
+    string (e.g. "RUNNING") never overwrites pending output.
+    '''
+    if isinstance(item, str):
+        return item if pending is None or isinstance(pending, str) else pending
+    if not isinstance(pending, StreamOutputs) or not item.is_delta() or not pending.is_delta():
+        return item
+    outputs = []
+    for index, new_output in enumerate(item.outputs):
+        if index < len(pending.outputs):
+            old_output = pending.outputs[index]
+            new_output = SingleOutput(text=old_output.text + new_output.text,
+                                      metadata=new_output.metadata,
+                                      is_delta=True,
+                                      seq=new_output.seq)
+        outputs.append(new_output)
+    return StreamOutputs(outputs=outputs)
+
+class StreamFlushPolicy:
+    '''
+    Decides when a streaming producer pushes the text generated so far to the
+    stream server, so a request costs one actor call per few tokens instead of
+    one per token. The first output and the last one are always pushed, in
+    between a push happens once flush_interval_ms passed or flush_tokens were
+    generated since the previous push, whichever comes first.
+
+    flush_interval_ms=0 or flush_tokens=1 pushes every output.
+    '''
+    def __init__(self, flush_interval_ms:float=30, flush_tokens:int=16):
+        self.flush_interval_s = flush_interval_ms / 1000
+        self.flush_tokens = flush_tokens
+        self.last_flush_time = None
+        self.last_flush_tokens = 0
+
+    def should_flush(self, generated_tokens:int, finished:bool=False) -> bool:
+        if finished or self.last_flush_time is None:
+            return True
+        return (generated_tokens - self.last_flush_tokens >= self.flush_tokens
+                or time.monotonic() - self.last_flush_time >= self.flush_interval_s)
+
+    def flushed(self, generated_tokens:int):
+        self.last_flush_time = time.monotonic()
+        self.last_flush_tokens = generated_tokens
+
+def _stream_item_size(item) -> int:
+    if not isinstance(item, StreamOutputs):
+        return 0
+    return sum(len(output.text) for output in item.outputs if output.text is not None)
+
+class _StreamStateIndex:
+    '''
+    Tracks the requests a stream server holds, ordered by last activity, so
+    expired requests are found from the oldest end without scanning the rest.
+    Running requests expire after ttl_s without activity, done requests whose
+    final output was never read after done_ttl_s. When the (approximate) size of
+    the buffered outputs exceeds max_bytes the oldest requests are evicted,
+    done ones first. The servers collect on every add_item, mark_done,
+    get_item and wait_item, so abandoned requests are also dropped while no
+    producer is writing.
+    '''
+    def __init__(self, ttl_s:float=600, done_ttl_s:float=60, max_bytes:int=512*1024*1024):
+        self.ttl_s = ttl_s
+        self.done_ttl_s = done_ttl_s
+        self.max_bytes = max_bytes
+        self.running = OrderedDict()
+        self.done = OrderedDict()
+        # requests cancelled by their consumer, kept for ttl_s so the producer
+        # learns about it from add_item
+        self.cancelled = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+        self.expired_count = 0
+        self.done_expired_count = 0
+        self.evicted_by_size_count = 0
+        self.cancelled_count = 0
+
+    def touch(self, request_id, nbytes:Optional[int]=None):
+        now = time.monotonic()
+        if request_id in self.done:
+            self.done[request_id] = now
+            self.done.move_to_end(request_id)
+        else:
+            self.running[request_id] = now
+            self.running.move_to_end(request_id)
+        if nbytes is not None:
+            self.total_bytes += nbytes - self.sizes.get(request_id, 0)
+            self.sizes[request_id] = nbytes
+
+    def size(self, request_id) -> int:
+        return self.sizes.get(request_id, 0)
+
+    def set_done(self, request_id):
+        self.running.pop(request_id, None)
+        self.done[request_id] = time.monotonic()
+        self.done.move_to_end(request_id)
+
+    def is_done(self, request_id) -> bool:
+        return request_id in self.done
+
+    def discard(self, request_id):
+        self.running.pop(request_id, None)
+        self.done.pop(request_id, None)
+        self.total_bytes -= self.sizes.pop(request_id, 0)
+
+    def cancel(self, request_id):
+        self.discard(request_id)
+        self.cancelled[request_id] = time.monotonic()
+        self.cancelled.move_to_end(request_id)
+        self.cancelled_count += 1
+
+    def is_cancelled(self, request_id) -> bool:
+        return request_id in self.cancelled
+
+    def collect(self) -> List[str]:
+        '''
+        Remove and return the requests that expired or have to be evicted to
+        stay within max_bytes.
+        '''
+        now = time.monotonic()
+        while self.cancelled and now - next(iter(self.cancelled.values())) > self.ttl_s:
+            self.cancelled.popitem(last=False)
+        evicted = []
+        for entries, ttl_s in ((self.done, self.done_ttl_s), (self.running, self.ttl_s)):
+            while entries:
+                request_id, last_active = next(iter(entries.items()))
+                if now - last_active <= ttl_s:
+                    break
+                if entries is self.done:
+                    self.done_expired_count += 1
+                else:
+                    self.expired_count += 1
+                self.discard(request_id)
+                evicted.append(request_id)
+        while self.total_bytes > self.max_bytes and (self.done or self.running):
+            request_id = next(iter(self.done if self.done else self.running))
+            self.evicted_by_size_count += 1
+            self.discard(request_id)
+            evicted.append(request_id)
+        return evicted
+
+    def stat(self) -> Dict[str, Any]:
+        return {
+            "running": len(self.running),
+            "done": len(self.done),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "expired": self.expired_count,
+            "done_expired": self.done_expired_count,
+            "evicted_by_size": self.evicted_by_size_count,
+            "cancelled": self.cancelled_count,
+        }
+
+_STREAM_DONE = object()
+
 class BlockBinaryStreamServer:
-    def __init__(self):
+    def __init__(self, ttl_s:float=600, done_ttl_s:float=60, max_bytes:int=512*1024*1024):
         self.cache = {}
-        self.cache_status = {} 
+        self.index = _StreamStateIndex(ttl_s=ttl_s, done_ttl_s=done_ttl_s, max_bytes=max_bytes)
         self.lock = threading.Lock()
 
-    def add_item(self, request_id, item):
+    def _evict(self):
+        for k in self.index.collect():
+            q = self.cache.pop(k, None)
+            if q is not None:
+                q.put(_STREAM_DONE)
+
+    def add_item(self, request_id, item) -> bool:
+        '''
+        Returns False once the consumer has cancelled the request, the producer
+        should stop generating then.
+        '''
         with self.lock:            
+            if self.index.is_cancelled(request_id):
+                return False
+            if isinstance(item, str) and self.index.is_done(request_id):
+                # the status marker arrived after the request was done
+                return True
             if request_id not in self.cache:
                 self.cache[request_id] = Queue()
             self.cache[request_id].put(item)
-            self.cache_status[request_id]=int(time.time()*1000)
+            self.index.touch(request_id, self.index.size(request_id) + _stream_item_size(item))
+            self._evict()
+            return True
     
     def mark_done(self, request_id):
-        if len(self.cache_status) > 30:
-            now = int(time.time()*1000)
-            with self.lock:
-                for k in list(self.cache_status.keys()):
-                    if now - self.cache_status[k] > 10*60*60*1000:
-                        del self.cache_status[k]
-                        del self.cache[k] 
         with self.lock:            
-            self.cache_status[request_id] = 0
+            if self.index.is_cancelled(request_id):
+                return
+            self.index.set_done(request_id)
+            if request_id in self.cache:
+                # wake up the consumer blocked in wait_item
+                self.cache[request_id].put(_STREAM_DONE)
+            self._evict()
+
+    def cancel(self, request_id):
+        '''
+        Called by the consumer when it stops reading, e.g. the http client went
+        away. The buffered output is dropped and add_item tells the producer.
+        '''
+        with self.lock:
+            self.index.cancel(request_id)
+            q = self.cache.pop(request_id, None)
+            if q is not None:
+                q.put(_STREAM_DONE)
 
     def get_item(self, request_id):                
+        return self.wait_item(request_id, timeout=0.1)
+
+    def wait_item(self, request_id, timeout:float=1.0):
+        '''
+        Block until the next item of the request is available and return it.
+        Returns "RUNNING" if nothing arrived within timeout and None once the
+        request is done and drained.
+        '''
         with self.lock:
-            if request_id not in self.cache:
-                return None                                                        
-            try:
-                return self.cache[request_id].get(timeout=0.1)                
-            except:
-                if request_id in self.cache_status and self.cache_status[request_id] == 0:
+            # with no producer writing, the consumers drive the eviction
+            self._evict()
+            q = self.cache.get(request_id, None)
+        if q is None:
+            return None
+        try:
+            v = q.get(timeout=timeout)
+        except Empty:
+            return "RUNNING"
+        with self.lock:
+            if v is _STREAM_DONE:
+                if self.cache.get(request_id, None) is q:
                     del self.cache[request_id]
-                    del self.cache_status[request_id]
-                    return None
-                return "RUNNING"
+                    self.index.discard(request_id)
+                return None
+            if self.cache.get(request_id, None) is q:
+                self.index.touch(request_id, self.index.size(request_id) - _stream_item_size(v))
+        return v
+
+    def stat(self):
+        with self.lock:
+            return self.index.stat()
 
 
 class BlockVLLMStreamServer:
-    def __init__(self):
+    def __init__(self, ttl_s:float=600, done_ttl_s:float=60, max_bytes:int=512*1024*1024):
         self.cache = {}
-        self.cache_status = {} 
+        self.index = _StreamStateIndex(ttl_s=ttl_s, done_ttl_s=done_ttl_s, max_bytes=max_bytes)
+        self.events = {}
         self.lock = threading.Lock()
 
-    def add_item(self, request_id, item):
+    def _get_event(self, request_id):
+        if request_id not in self.events:
+            self.events[request_id] = threading.Event()
+        return self.events[request_id]    
+
+    def _evict(self):
+        for k in self.index.collect():
+            self.cache.pop(k, None)
+            event = self.events.pop(k, None)
+            if event is not None:
+                # the waiting consumer reads None and stops
+                event.set()
+
+    def add_item(self, request_id, item) -> bool:
+        '''
+        Returns False once the consumer has cancelled the request, the producer
+        should stop generating then.
+        '''
         with self.lock:            
-            self.cache[request_id]=item
-            self.cache_status[request_id]=int(time.time()*1000)
+            if self.index.is_cancelled(request_id):
+                return False
+            if isinstance(item, str) and self.index.is_done(request_id):
+                # the status marker arrived after the request was done
+                return True
+            v = _merge_stream_item(self.cache.get(request_id, None), item)
+            self.cache[request_id] = v
+            self.index.touch(request_id, _stream_item_size(v))
+            self._get_event(request_id).set()
+            self._evict()
+            return True
     
     def mark_done(self, request_id):
-        if len(self.cache_status) > 30:
-            now = int(time.time()*1000)
-            with self.lock:
-                for k in list(self.cache_status.keys()):
-                    if now - self.cache_status[k] > 10*60*60*1000:
-                        del self.cache_status[k]
-                        del self.cache[k] 
         with self.lock:            
-            self.cache_status[request_id] = 0
+            if self.index.is_cancelled(request_id):
+                return
+            self.index.set_done(request_id)
+            self._get_event(request_id).set()
+            self._evict()
+
+    def cancel(self, request_id):
+        '''
+        Called by the consumer when it stops reading, e.g. the http client went
+        away. The buffered output is dropped and add_item tells the producer.
+        '''
+        with self.lock:
+            self.index.cancel(request_id)
+            self.cache.pop(request_id, None)
+            event = self.events.pop(request_id, None)
+            if event is not None:
+                event.set()
 
     def get_item(self, request_id):                
         with self.lock:
+            # with no producer writing, the consumers drive the eviction
+            self._evict()
             v = self.cache.get(request_id, None)     
-            if request_id in self.cache_status and self.cache_status[request_id] == 0:
-                del self.cache[request_id]
-                del self.cache_status[request_id]
+            if self.index.is_done(request_id):
+                self.cache.pop(request_id, None)
+                self.events.pop(request_id, None)
+                self.index.discard(request_id)
+                if isinstance(v, str):
+                    v = None
+            elif isinstance(v, StreamOutputs) and v.is_delta():
+                # deltas are consumed once read
+                self.cache[request_id] = "RUNNING"
+                self.index.touch(request_id, 0)
+            elif v is not None:
+                self.index.touch(request_id)
             return v     
 
+    def wait_item(self, request_id, timeout:float=1.0):
+        '''
+        Like get_item, but block until the request has changed since the last
+        call (new item or done) instead of returning immediately.
+        Returns "RUNNING" if nothing changed within timeout.
+        '''
+        with self.lock:
+            self._evict()
+            if request_id not in self.cache:
+                return None
+            event = self._get_event(request_id)
+        if not event.wait(timeout):
+            return "RUNNING"
+        event.clear()
+        return self.get_item(request_id)
+
+    def stat(self):
+        with self.lock:
+            return self.index.stat()
+
 class VLLMStreamServer:
-    def __init__(self):
+    def __init__(self, ttl_s:float=600, done_ttl_s:float=60, max_bytes:int=512*1024*1024):
         self.cache = {}
-        self.cache_status = {} 
+        self.index = _StreamStateIndex(ttl_s=ttl_s, done_ttl_s=done_ttl_s, max_bytes=max_bytes)
+        self.events = {}
         self.lock = threading.Lock()
 
-    async def add_item(self, request_id, item):
+    def _get_event(self, request_id):
+        if request_id not in self.events:
+            self.events[request_id] = asyncio.Event()
+        return self.events[request_id]    
+
+    def _evict(self):
+        for k in self.index.collect():
+            self.cache.pop(k, None)
+            event = self.events.pop(k, None)
+            if event is not None:
+                # the waiting consumer reads None and stops
+                event.set()
+
+    async def add_item(self, request_id, item) -> bool:
+        '''
+        Returns False once the consumer has cancelled the request, the producer
+        should stop generating then.
+        '''
         with self.lock:            
-            self.cache[request_id]=item
-            self.cache_status[request_id]=int(time.time()*1000)
+            if self.index.is_cancelled(request_id):
+                return False
+            if isinstance(item, str) and self.index.is_done(request_id):
+                # the status marker arrived after the request was done
+                return True
+            v = _merge_stream_item(self.cache.get(request_id, None), item)
+            self.cache[request_id] = v
+            self.index.touch(request_id, _stream_item_size(v))
+            self._get_event(request_id).set()
+            self._evict()
+            return True
     
     async def mark_done(self, request_id):
-        if len(self.cache_status) > 30:
-            now = int(time.time()*1000)
-            with self.lock:
-                for k in list(self.cache_status.keys()):
-                    if now - self.cache_status[k] > 10*60*60*1000:
-                        del self.cache_status[k]
-                        del self.cache[k] 
         with self.lock:            
-            self.cache_status[request_id] = 0
+            if self.index.is_cancelled(request_id):
+                return
+            self.index.set_done(request_id)
+            self._get_event(request_id).set()
+            self._evict()
+
+    async def cancel(self, request_id):
+        '''
+        Called by the consumer when it stops reading, e.g. the http client went
+        away. The buffered output is dropped and add_item tells the producer.
+        '''
+        with self.lock:
+            self.index.cancel(request_id)
+            self.cache.pop(request_id, None)
+            event = self.events.pop(request_id, None)
+            if event is not None:
+                event.set()
 
     async def get_item(self, request_id):                
         with self.lock:
+            # with no producer writing, the consumers drive the eviction
+            self._evict()
             v = self.cache.get(request_id, None)     
-            if request_id in self.cache_status and self.cache_status[request_id] == 0:
-                del self.cache[request_id]
-                del self.cache_status[request_id]
-            return v    
\ No newline at end of file
+            if self.index.is_done(request_id):
+                self.cache.pop(request_id, None)
+                self.events.pop(request_id, None)
+                self.index.discard(request_id)
+                if isinstance(v, str):
+                    v = None
+            elif isinstance(v, StreamOutputs) and v.is_delta():
+                # deltas are consumed once read
+                self.cache[request_id] = "RUNNING"
+                self.index.touch(request_id, 0)
+            elif v is not None:
+                self.index.touch(request_id)
+            return v    
+
+    async def wait_item(self, request_id, timeout:float=1.0):
+        '''
+        Like get_item, but block until the request has changed since the last
+        call (new item or done) instead of returning immediately.
+        Returns "RUNNING" if nothing changed within timeout.
+        '''
+        with self.lock:
+            self._evict()
+            if request_id not in self.cache:
+                return None
+            event = self._get_event(request_id)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return "RUNNING"
+        event.clear()
+        return await self.get_item(request_id)
+
+    async def stat(self):
+        with self.lock:
+            return self.index.stat()
+
+
+STREAM_SERVER_CLASSES = {
+    "VLLM_STREAM_SERVER": VLLMStreamServer,
+    "BLOCK_VLLM_STREAM_SERVER": BlockVLLMStreamServer,
+    "BlockBinaryStreamServer": BlockBinaryStreamServer,
+}
+
+def get_stream_server_shards() -> int:
+    '''
+    Number of stream server actors per server type, configured with the
+    BYZERLLM_STREAM_SERVER_SHARDS environment variable of the model workers.
+    '''
+    return max(1, int(os.environ.get("BYZERLLM_STREAM_SERVER_SHARDS", "1")))
+
+def get_stream_server_name(base_name:str, request_id:str, num_shards:Optional[int]=None) -> str:
+    '''
+    The name of the stream server shard serving request_id. Shard 0 keeps the
+    base name so a single shard behaves exactly like the unsharded server.
+    '''
+    if num_shards is None:
+        num_shards = get_stream_server_shards()
+    shard = zlib.crc32(str(request_id).encode("utf-8")) % num_shards
+    return base_name if shard == 0 else f"{base_name}_{shard}"
+
+def get_stream_server(base_name:str, request_id:str):
+    '''
+    Get the stream server shard actor serving request_id, creating it if it
+    does not exist yet. Producers should return the shard name
+    (get_stream_server_name) as `stream_server` in the response metadata so the
+    client reads from the same shard.
+    '''
+    import ray
+    name = get_stream_server_name(base_name, request_id)
+    try:
+        return ray.get_actor(name)
+    except ValueError:
+        pass
+    try:
+        return ray.remote(STREAM_SERVER_CLASSES[base_name]).options(
+            name=name, lifetime="detached", max_concurrency=1000
+        ).remote()
+    except ValueError:
+        # another producer created the same shard concurrently
+        return ray.get_actor(name)
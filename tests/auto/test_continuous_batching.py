@@ -0,0 +1,210 @@
+import asyncio
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from byzerllm.auto.continuous_batching import BatchScheduler
+
+EOS = 99
+
+
+class FakeTokenizer:
+    eos_token_id = EOS
+    pad_token_id = None
+
+
+def tiny_gpt2():
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(
+        vocab_size=100, n_positions=128, n_embd=32, n_layer=2, n_head=2,
+        eos_token_id=EOS, bos_token_id=EOS,
+    )
+    return transformers.GPT2LMHeadModel(config).eval()
+
+
+def greedy_reference(model, prompt, max_new_tokens):
+    output = model.generate(
+        torch.tensor([prompt]), max_new_tokens=max_new_tokens, do_sample=False,
+        eos_token_id=EOS, pad_token_id=EOS,
+    )[0][len(prompt):].tolist()
+    return output[:-1] if output and output[-1] == EOS else output
+
+
+def test_batched_greedy_matches_generate():
+    model = tiny_gpt2()
+    scheduler = BatchScheduler(model, FakeTokenizer(), max_batch_size=4, max_wait_ms=50)
+    prompts = [[1, 2, 3], [4, 5, 6, 7, 8, 9], [10], [11, 12, 13, 14]]
+    # rows of different lengths finish at different steps
+    max_new_tokens = [5, 12, 8, 3]
+
+    async def run():
+        return await asyncio.gather(*[
+            scheduler.submit(prompt, n, temperature=0.0)
+            for prompt, n in zip(prompts, max_new_tokens)
+        ])
+
+    results = asyncio.run(run())
+    for prompt, n, result in zip(prompts, max_new_tokens, results):
+        assert result.output_ids == greedy_reference(model, prompt, n)
+        assert result.input_tokens_count == len(prompt)
+    assert scheduler.stat()["batches"] == 1
+
+
+def test_stop_sequences():
+    model = tiny_gpt2()
+    scheduler = BatchScheduler(model, FakeTokenizer(), max_wait_ms=1)
+    reference = greedy_reference(model, [4, 5, 6, 7, 8, 9], 12)
+    stop = reference[5:7]
+
+    result = asyncio.run(
+        scheduler.submit([4, 5, 6, 7, 8, 9], 12, temperature=0.0, stop_sequences=[stop])
+    )
+    # generation ends with the first occurrence of the stop sequence
+    assert result.output_ids[-len(stop):] == stop
+    assert len(result.output_ids) <= 7
+
+
+def test_repetition_penalty_matches_generate():
+    model = tiny_gpt2()
+    scheduler = BatchScheduler(model, FakeTokenizer(), max_batch_size=2, max_wait_ms=50)
+    prompts = [[1, 2, 3], [4, 5, 6, 7]]
+
+    async def run():
+        return await asyncio.gather(
+            scheduler.submit(prompts[0], 10, temperature=0.0, repetition_penalty=1.5),
+            # rows without a penalty are left alone
+            scheduler.submit(prompts[1], 10, temperature=0.0),
+        )
+
+    penalized, plain = asyncio.run(run())
+    expected = model.generate(
+        torch.tensor([prompts[0]]), max_new_tokens=10, do_sample=False,
+        repetition_penalty=1.5, eos_token_id=EOS, pad_token_id=EOS,
+    )[0][len(prompts[0]):].tolist()
+    if expected and expected[-1] == EOS:
+        expected = expected[:-1]
+    assert penalized.output_ids == expected
+    assert plain.output_ids == greedy_reference(model, prompts[1], 10)
+
+
+def test_stop_sequences_are_skipped_below_min_length():
+    model = tiny_gpt2()
+    scheduler = BatchScheduler(model, FakeTokenizer(), max_wait_ms=1)
+    reference = greedy_reference(model, [4, 5, 6, 7, 8, 9], 12)
+    # a stop sequence that is generated first at the start of the output
+    stop = reference[:1]
+
+    result = asyncio.run(
+        scheduler.submit([4, 5, 6, 7, 8, 9], 12, temperature=0.0, stop_sequences=[stop])
+    )
+    assert result.output_ids == stop
+
+    result = asyncio.run(
+        scheduler.submit(
+            [4, 5, 6, 7, 8, 9], 12, temperature=0.0,
+            stop_sequences=[stop], skip_check_min_length=len(reference),
+        )
+    )
+    assert result.output_ids == reference
+
+
+def test_timeout_stops_generation():
+    model = tiny_gpt2()
+    scheduler = BatchScheduler(model, FakeTokenizer(), max_wait_ms=1)
+    result = asyncio.run(
+        scheduler.submit([1, 2, 3], 100, temperature=0.0, timeout_s=0.0)
+    )
+    # the first token is always generated
+    assert len(result.output_ids) <= 1
+
+
+class CharTokenizer:
+    """One token per character, enough for async_batched_chat."""
+
+    eos_token_id = EOS
+    pad_token_id = None
+
+    def __call__(self, text, return_token_type_ids=False, return_tensors=None):
+        return {"input_ids": torch.tensor([[ord(c) % 90 + 1 for c in text]])}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(i + 31) for i in ids)
+
+
+def test_items_of_a_predict_call_share_a_batch():
+    pytest.importorskip("ray")
+    pytest.importorskip("pyjava")
+    pytest.importorskip("sentence_transformers")
+    import types
+
+    from byzerllm.auto import async_batched_chat
+    from byzerllm.utils.text_generator import simple_predict_func
+
+    model = tiny_gpt2()
+    tokenizer = CharTokenizer()
+    model.batch_scheduler = BatchScheduler(model, tokenizer, max_batch_size=4, max_wait_ms=50)
+    model.async_stream_chat = types.MethodType(async_batched_chat, model)
+
+    items = [
+        {"instruction": text, "temperature": 0.0, "max_length": 64, "gen.max_new_tokens": 5}
+        for text in ["hello", "a longer prompt", "hi"]
+    ]
+    # dict items, the results come back as they are
+    results = asyncio.run(simple_predict_func((model, tokenizer), items))["value"][0]
+    assert [r["input"]["instruction"] for r in results] == ["hello", "a longer prompt", "hi"]
+    assert all(r["metadata"]["generated_tokens_count"] <= 5 for r in results)
+    assert model.batch_scheduler.stat()["batches"] == 1
+    assert model.batch_scheduler.stat()["batched_sequences"] == 3
+
+
+def test_separate_predict_calls_share_a_batch():
+    pytest.importorskip("ray")
+    pytest.importorskip("pyjava")
+    pytest.importorskip("sentence_transformers")
+    import threading
+    import types
+
+    from byzerllm.auto import async_batched_chat
+    from byzerllm.utils.text_generator import simple_predict_func
+
+    model = tiny_gpt2()
+    tokenizer = CharTokenizer()
+    model.batch_scheduler = BatchScheduler(model, tokenizer, max_batch_size=4, max_wait_ms=200)
+    model.async_stream_chat = types.MethodType(async_batched_chat, model)
+    results = {}
+
+    def predict(text):
+        item = {"instruction": text, "temperature": 0.0, "max_length": 64, "gen.max_new_tokens": 5}
+        # one predict call per request, on an event loop of its own
+        results[text] = asyncio.run(simple_predict_func((model, tokenizer), [item]))
+
+    threads = [threading.Thread(target=predict, args=(text,)) for text in ["hello", "hi", "hey"]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results) == ["hello", "hey", "hi"]
+    assert model.batch_scheduler.stat()["batches"] == 1
+    assert model.batch_scheduler.stat()["batched_sequences"] == 3
+
+
+def test_deploy_lets_a_batch_of_requests_run_on_a_worker(monkeypatch):
+    pytest.importorskip("ray")
+    pytest.importorskip("pyjava")
+    from byzerllm.utils.client import ByzerLLM, byzerllm_client
+
+    llm = ByzerLLM()
+    built = []
+    monkeypatch.setattr(
+        byzerllm_client.UDFBuilder, "build",
+        lambda ray_context, init_func, apply_func: built.append(dict(ray_context.conf())),
+    )
+    monkeypatch.setattr(llm, "get_meta", lambda model: {})
+
+    llm.deploy("/models/tiny", "custom/auto", "chat", {"backend.continuous_batching": "true", "backend.max_batch_size": 16})
+    llm.deploy("/models/tiny", "custom/auto", "chat", {})
+    assert [conf["workerMaxConcurrency"] for conf in built] == [16, 1]
+    # the client's own setting is left alone
+    assert llm.sys_conf["workerMaxConcurrency"] == 1
@@ -0,0 +1,59 @@
+import pytest
+
+from byzerllm.auto.lora_registry import LoRAAdapterRegistry, parse_adapters
+
+
+def test_ids_are_assigned_on_registration():
+    registry = LoRAAdapterRegistry()
+    a = registry.register("tenant_a", "/models/a", size_bytes=10)
+    b = registry.register("tenant_b", "/models/b", size_bytes=10)
+    assert (a.lora_int_id, b.lora_int_id) == (1, 2)
+    # registering again returns the same adapter
+    assert registry.register("tenant_a", "/models/a").lora_int_id == 1
+    with pytest.raises(Exception):
+        registry.register("tenant_a", "/models/other")
+
+
+def test_lru_eviction_within_budget():
+    registry = LoRAAdapterRegistry(max_loaded=2)
+    for name in ["a", "b", "c"]:
+        registry.register(name, f"/models/{name}", size_bytes=10)
+
+    for name in ["a", "b"]:
+        _, evicted = registry.acquire(name)
+        registry.release(name)
+        assert evicted == []
+    # a is used again, so b is the least recently used one
+    registry.acquire("a")
+    registry.release("a")
+    _, evicted = registry.acquire("c")
+    registry.release("c")
+
+    assert [adapter.name for adapter in evicted] == ["b"]
+    stat = registry.stat()
+    assert stat["resident"] == ["a", "c"]
+    assert (stat["hits"], stat["loads"], stat["evictions"]) == (1, 3, 1)
+
+
+def test_adapters_in_use_are_not_evicted():
+    registry = LoRAAdapterRegistry(max_memory_bytes=15)
+    registry.register("a", "/models/a", size_bytes=10)
+    registry.register("b", "/models/b", size_bytes=10)
+
+    registry.acquire("a")
+    _, evicted = registry.acquire("b")
+    # a is still used by a running request, the budget is exceeded for now
+    assert evicted == []
+
+    registry.release("a")
+    registry.release("b")
+    registry.register("c", "/models/c", size_bytes=1)
+    _, evicted = registry.acquire("c")
+    assert [adapter.name for adapter in evicted] == ["a"]
+
+
+def test_parse_adapters():
+    assert parse_adapters("a=/models/a, b=/models/b,") == {
+        "a": "/models/a",
+        "b": "/models/b",
+    }
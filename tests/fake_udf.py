@@ -0,0 +1,150 @@
+"""
+In-process stand-ins for the UDF master and workers of a deployed model, so the
+ByzerLLM client can be tested without a Ray cluster. The workers run the real
+simple_predict_func and the requests and results are pickled on the way, like
+Ray does.
+"""
+import time
+import pickle
+import asyncio
+import threading
+
+import numpy as np
+
+import ray
+
+from byzerllm.utils.text_generator import simple_predict_func
+
+
+class FakeRef:
+    def __init__(self, value=None, error: Exception = None, delay_s: float = 0.0):
+        self.value = value
+        self.error = error
+        self.delay_s = delay_s
+
+    def result(self):
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    def __await__(self):
+        if self.delay_s:
+            yield from asyncio.sleep(self.delay_s).__await__()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class FakeMethod:
+    def __init__(self, f):
+        self.f = f
+
+    def remote(self, *args, **kwargs):
+        return self.f(*args, **kwargs)
+
+
+class EchoModel:
+    """Echoes the instruction back and embeds a text as [len, sum of code points, 1]."""
+
+    def __init__(self):
+        # the embedding backends keep the model they wrap in model
+        self.model = self
+
+    async def async_stream_chat(self, tokenizer, ins, his=[], **kwargs):
+        return [(f"echo:{ins}", {"metadata": {"request_id": "", "generated_tokens_count": 1}})]
+
+    def embed_query(self, ins, extract_params={}):
+        return [float(len(ins)), float(sum(ord(c) for c in ins)), 1.0]
+
+    def embed_batch(self, texts, extract_params={}, max_batch_tokens=None):
+        return np.asarray([self.embed_query(text) for text in texts], dtype=np.float32)
+
+    def embed_rerank(self, sentence_pairs, extract_params={}):
+        return [float(len(q) + len(d)) for q, d in sentence_pairs]
+
+    def get_meta(self):
+        return [{"model_deploy_type": "saas", "support_stream": False}]
+
+
+class FakeWorker:
+    def __init__(self, index: int, model=None, delay_s: float = 0.0, log=None):
+        self.index = index
+        self.model = model or EchoModel()
+        self.delay_s = delay_s
+        self.error = None
+        self.calls = []
+        # the calls of all the workers of a master, in order
+        self.log = log if log is not None else []
+        self.async_apply = FakeMethod(self._async_apply)
+
+    def _async_apply(self, chunk):
+        chunk = pickle.loads(pickle.dumps(chunk))
+        self.calls.append(chunk)
+        self.log.append(chunk)
+        if self.error is not None:
+            return FakeRef(error=self.error, delay_s=self.delay_s)
+        result = {}
+
+        def run():
+            result["value"] = asyncio.run(simple_predict_func((self.model, None), chunk))
+
+        # the worker has its own event loop, like the worker actor
+        t = threading.Thread(target=run)
+        t.start()
+        t.join()
+        return FakeRef(pickle.loads(pickle.dumps(result["value"])), delay_s=self.delay_s)
+
+
+class FakeMaster:
+    """Hands out workers [index, worker] and takes them back like the UDF master."""
+
+    def __init__(self, num_workers: int = 2, max_concurrency: int = 1, get_delay_s: float = 0.0):
+        self.calls = []
+        self.actors = [FakeWorker(i, log=self.calls) for i in range(num_workers)]
+        self.max_concurrency = max_concurrency
+        self.idle = [max_concurrency for _ in range(num_workers)]
+        self.get_delay_s = get_delay_s
+        # the gets fail once this many workers were handed out
+        self.fail_gets_after = None
+        self.handed_out = []
+        self.given_back = []
+        self.get = FakeMethod(self._get)
+        self.give_back = FakeMethod(self._give_back)
+        self.workers = FakeMethod(lambda: FakeRef(list(self.actors)))
+        self.get_worker_max_concurrency = FakeMethod(lambda: FakeRef(self.max_concurrency))
+
+    def _get(self, index: int = -1):
+        if self.fail_gets_after is not None and len(self.handed_out) >= self.fail_gets_after:
+            return FakeRef(error=Exception("No idle UDFWorker"), delay_s=self.get_delay_s)
+        if index == -1:
+            index = int(np.argmax(self.idle))
+            if self.idle[index] <= 0:
+                return FakeRef(error=Exception("No idle UDFWorker"), delay_s=self.get_delay_s)
+            self.idle[index] -= 1
+        self.handed_out.append(index)
+        return FakeRef([index, self.actors[index]], delay_s=self.get_delay_s)
+
+    def _give_back(self, index):
+        self.given_back.append(index)
+        self.idle[index] = min(self.idle[index] + 1, self.max_concurrency)
+        return FakeRef(None)
+
+
+def fake_get(refs, timeout=None):
+    if isinstance(refs, list):
+        return [r.result() for r in refs]
+    return refs.result()
+
+
+def install(monkeypatch, masters):
+    """Serves ray.get_actor(model) from masters, a dict of model name to FakeMaster."""
+
+    def get_actor(name, namespace=None):
+        if name not in masters:
+            raise ValueError(f"Failed to look up actor with name '{name}'")
+        return masters[name]
+
+    monkeypatch.setattr(ray, "get_actor", get_actor)
+    monkeypatch.setattr(ray, "get", fake_get)
@@ -0,0 +1,208 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from byzerllm.utils.client.entrypoints.openai.admission import (
+    PRIORITY_CLASSES,
+    AdmissionController,
+    AdmissionRejected,
+    install_admission_control,
+)
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    controller = AdmissionController(max_in_flight=1, max_queue=8)
+    served = []
+
+    async def request(name, priority):
+        await controller.acquire("llama", PRIORITY_CLASSES[priority])
+        served.append(name)
+
+    async def main():
+        await controller.acquire("llama")
+        tasks = [
+            asyncio.ensure_future(request(name, priority))
+            for name, priority in [
+                ("low", "low"),
+                ("normal-1", "normal"),
+                ("high", "high"),
+                ("normal-2", "normal"),
+            ]
+        ]
+        await asyncio.sleep(0.01)
+        assert controller.stat()["llama"]["queue_depth"] == 4
+        for _ in tasks:
+            controller.release("llama")
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+        controller.release("llama")
+
+    asyncio.run(main())
+    assert served == ["high", "normal-1", "normal-2", "low"]
+    assert controller.stat()["llama"]["in_flight"] == 0
+
+
+def test_full_queue_is_rejected_with_429():
+    controller = AdmissionController(max_in_flight=1, max_queue=1)
+
+    async def main():
+        await controller.acquire("llama")
+        waiter = asyncio.ensure_future(controller.acquire("llama"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as e:
+            await controller.acquire("llama")
+        controller.release("llama")
+        await waiter
+        return e.value.code
+
+    assert asyncio.run(main()) == 429
+    assert controller.stat()["llama"]["rejected_queue_full"] == 1
+
+
+def test_cancelled_waiter_does_not_leak_its_slot():
+    controller = AdmissionController(max_in_flight=1, max_queue=4)
+
+    async def main():
+        await controller.acquire("llama")
+        waiter = asyncio.ensure_future(controller.acquire("llama"))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.01)
+        controller.release("llama")
+
+    asyncio.run(main())
+    assert controller.stat()["llama"]["in_flight"] == 0
+    assert controller.stat()["llama"]["queue_depth"] == 0
+
+
+def build_app(controller):
+    app = FastAPI()
+    install_admission_control(app, controller)
+
+    @app.post("/v1/chat/completions")
+    async def chat():
+        return JSONResponse(content={"ok": True})
+
+    @app.post("/v1/completions")
+    async def stream():
+        async def body():
+            yield b"data: 1\n\n"
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def slow():
+        await asyncio.sleep(0.3)
+        return JSONResponse(content={"ok": True})
+
+    return app
+
+
+def test_slot_is_released_after_a_streamed_response():
+    controller = AdmissionController(max_in_flight=1, max_queue=1)
+    app = build_app(controller)
+    with TestClient(app) as client:
+        for _ in range(3):
+            response = client.post("/v1/completions", json={"model": "llama"})
+            assert response.status_code == 200
+            assert response.text.endswith("data: [DONE]\n\n")
+        assert controller.stat()["llama"]["in_flight"] == 0
+        assert controller.stat()["llama"]["admitted"] == 3
+
+
+def test_queue_timeout_is_rejected_with_503_and_retry_after():
+    controller = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout_s=0.05)
+    app = build_app(controller)
+
+    async def main():
+        import httpx
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                client.post("/v1/embeddings", json={"model": "llama"}),
+                client.post("/v1/chat/completions", json={"model": "llama"}),
+            )
+
+    slow, busy = asyncio.run(main())
+    assert slow.status_code == 200
+    assert busy.status_code == 503
+    assert busy.headers["Retry-After"] == "1"
+    assert controller.stat()["llama"]["in_flight"] == 0
+
+
+def test_requests_are_keyed_by_the_served_model():
+    controller = AdmissionController(server_model_name="llama")
+    app = build_app(controller)
+    with TestClient(app) as client:
+        for model in ["llama", "gpt-4", None]:
+            body = {} if model is None else {"model": model}
+            assert client.post("/v1/chat/completions", json=body).status_code == 200
+    assert list(controller.stat()) == ["llama"]
+    assert controller.stat()["llama"]["admitted"] == 3
+
+
+def test_unknown_models_do_not_create_queues():
+    controller = AdmissionController(model_exists=lambda model: model == "llama")
+    app = build_app(controller)
+    with TestClient(app) as client:
+        for model in ["llama", "made-up-1", "made-up-2"]:
+            client.post("/v1/chat/completions", json={"model": model})
+    assert list(controller.stat()) == ["llama"]
+
+
+def test_queue_depth_and_in_flight_gauges():
+    prometheus_client = pytest.importorskip("prometheus_client")
+    from byzerllm.utils.metrics.serving import ServingMetrics
+
+    metrics = ServingMetrics(registry=prometheus_client.CollectorRegistry())
+    controller = AdmissionController(max_in_flight=1, max_queue=8, metrics=metrics)
+
+    def gauge(name, priority):
+        return metrics.registry.get_sample_value(
+            name, {"model": "llama", "priority": priority}
+        )
+
+    async def main():
+        await controller.acquire("llama", PRIORITY_CLASSES["high"])
+        waiters = [
+            asyncio.ensure_future(controller.acquire("llama", PRIORITY_CLASSES[p]))
+            for p in ["low", "normal", "normal"]
+        ]
+        await asyncio.sleep(0.01)
+        assert gauge("byzerllm_admission_in_flight", "high") == 1
+        assert gauge("byzerllm_admission_queue_depth", "normal") == 2
+        assert gauge("byzerllm_admission_queue_depth", "low") == 1
+
+        controller.release("llama", PRIORITY_CLASSES["high"])
+        await asyncio.sleep(0.01)
+        assert gauge("byzerllm_admission_in_flight", "high") == 0
+        assert gauge("byzerllm_admission_in_flight", "normal") == 1
+        assert gauge("byzerllm_admission_queue_depth", "normal") == 1
+
+        # a waiter that goes away leaves the queue
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        assert gauge("byzerllm_admission_queue_depth", "low") == 0
+
+        for _ in range(2):
+            controller.release("llama", PRIORITY_CLASSES["normal"])
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*waiters[1:])
+
+    asyncio.run(main())
+    for priority in PRIORITY_CLASSES:
+        assert gauge("byzerllm_admission_in_flight", priority) == 0
+        assert gauge("byzerllm_admission_queue_depth", priority) == 0
+    # on the same scrape as the queue wait histogram
+    exposition = metrics.exposition().decode()
+    assert "byzerllm_admission_queue_depth{" in exposition
+    assert "byzerllm_queue_wait_seconds_count" in exposition
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("ray")
+pytest.importorskip("pyjava")
+
+import ray
+
+from byzerllm.utils.client import ByzerLLM, LLMRequest
+
+from tests import fake_udf
+
+
+@pytest.fixture
+def master(monkeypatch):
+    master = fake_udf.FakeMaster(num_workers=2, max_concurrency=2)
+    fake_udf.install(monkeypatch, {"echo": master})
+    return master
+
+
+@pytest.fixture
+def llm():
+    llm = ByzerLLM()
+    llm.setup_default_model_name("echo")
+    llm.setup_default_emb_model_name("echo")
+    llm.setup_default_re_rank_model_name("echo")
+    return llm
+
+
+@pytest.fixture
+def no_blocking_get(monkeypatch):
+    def get(*args, **kwargs):
+        raise AssertionError("ray.get blocks the event loop")
+
+    monkeypatch.setattr(ray, "get", get)
+
+
+def test_async_apis_give_back_their_workers(master, llm, no_blocking_get):
+    async def main():
+        chat = await llm.achat_oai([{"role": "user", "content": "hello"}])
+        emb = await llm.aemb(None, LLMRequest(instruction=["a", "bb"]))
+        rerank = await llm.aemb_rerank(sentence_pairs=[("q", "doc")])
+        await asyncio.gather(*llm.background_tasks)
+        return chat, emb, rerank
+
+    chat, emb, rerank = asyncio.run(main())
+    assert chat[0].output == "echo:hello"
+    assert [e.output[0] for e in emb] == [1.0, 2.0]
+    assert rerank[0].output == [4.0]
+    assert sorted(master.given_back) == sorted(master.handed_out)
+    assert master.idle == [2, 2]
+
+
+def test_client_side_load_balancer_does_not_block(master, llm, no_blocking_get):
+    llm.setup_load_balance_way("least_outstanding")
+    responses = asyncio.run(
+        llm.achat_oai([{"role": "user", "content": "hello"}])
+    )
+    assert responses[0].output == "echo:hello"
+    assert llm.load_balancers["echo"].stat()["in_flight"] == [0, 0]
+
+
+def test_workers_are_given_back_when_the_request_fails(master, llm):
+    master.actors[0].error = RuntimeError("worker failed")
+    master.actors[1].error = RuntimeError("worker failed")
+    llm.meta_cache["echo"] = {"model_deploy_type": "saas"}
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await llm._aquery("echo", [{"instruction": "hello"}])
+        await asyncio.gather(*llm.background_tasks)
+
+    asyncio.run(main())
+    assert master.handed_out
+    assert sorted(master.given_back) == sorted(master.handed_out)
+
+
+@pytest.mark.parametrize("slow", ["get", "apply"])
+def test_workers_are_given_back_when_the_request_is_cancelled(master, llm, slow):
+    llm.meta_cache["echo"] = {"model_deploy_type": "saas"}
+    if slow == "get":
+        # cancelled while the master is still handing out the workers
+        master.get_delay_s = 0.2
+    else:
+        for worker in master.actors:
+            worker.delay_s = 0.2
+
+    async def main():
+        task = asyncio.ensure_future(
+            llm._aquery(
+                "echo", [{"instruction": "a"}, {"instruction": "b"}], num_workers=2
+            )
+        )
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.gather(*llm.background_tasks)
+
+    asyncio.run(main())
+    assert len(master.handed_out) == 2
+    assert sorted(master.given_back) == sorted(master.handed_out)
+    assert master.idle == [2, 2]
+
+
+class StreamModel(fake_udf.EchoModel):
+    async def async_stream_chat(self, tokenizer, ins, his=[], **kwargs):
+        return [("", {"metadata": {"request_id": ins, "stream_server": "STREAM_SERVER"}})]
+
+
+def test_balanced_stream_keeps_its_worker_until_consumed(master, llm):
+    llm.setup_load_balance_way("least_outstanding")
+    llm.meta_cache["echo"] = {"model_deploy_type": "saas"}
+    for worker in master.actors:
+        worker.model = StreamModel()
+
+    responses = asyncio.run(
+        llm.achat_oai(
+            [{"role": "user", "content": "request-1"}],
+            llm_config={"generation.stream": True},
+        )
+    )
+    balancer = llm.load_balancers["echo"]
+    assert responses[0].metadata["request_id"] == "request-1"
+    assert sum(balancer.stat()["in_flight"]) == 1
+
+    llm._release_balanced_stream("echo", "request-1")
+    assert balancer.stat()["in_flight"] == [0, 0]
+    # the workers were never leased from the master
+    assert master.handed_out == []
@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("ray")
+pytest.importorskip("pyjava")
+
+from byzerllm.utils.client import ByzerLLM
+
+from tests import fake_udf
+
+
+@pytest.fixture
+def master(monkeypatch):
+    master = fake_udf.FakeMaster(num_workers=2, max_concurrency=2)
+    fake_udf.install(monkeypatch, {"echo": master})
+    return master
+
+
+@pytest.fixture
+def llm():
+    llm = ByzerLLM()
+    llm.setup_default_model_name("echo")
+    return llm
+
+
+def conversations(n):
+    return [[{"role": "user", "content": f"question {i}"}] for i in range(n)]
+
+
+def test_results_come_back_in_input_order(master, llm):
+    responses = llm.chat_oai_batch(conversations(5), num_workers=2)
+    assert [r.output for r in responses] == [f"echo:question {i}" for i in range(5)]
+    # the batch was split into contiguous chunks, one per worker
+    assert [len(worker.calls[-1]) for worker in master.actors] == [3, 2]
+    assert sorted(master.given_back) == sorted(master.handed_out)
+
+
+def test_leases_are_given_back_when_a_chunk_fails(master, llm):
+    llm.get_meta(model="echo")
+    master.actors[1].error = RuntimeError("worker failed")
+    with pytest.raises(RuntimeError):
+        llm.chat_oai_batch(conversations(4), num_workers=2)
+    assert sorted(master.given_back) == sorted(master.handed_out)
+    assert master.idle == [2, 2]
+
+
+def test_granted_leases_are_given_back_when_a_get_fails(master, llm):
+    llm.get_meta(model="echo")
+    master.fail_gets_after = len(master.handed_out) + 1
+    with pytest.raises(Exception, match="No idle UDFWorker"):
+        llm.chat_oai_batch(conversations(4), num_workers=2)
+    assert sorted(master.given_back) == sorted(master.handed_out)
+    assert master.idle == [2, 2]
@@ -0,0 +1,79 @@
+import copy
+
+import pydantic
+import pytest
+
+pytest.importorskip("ray")
+pytest.importorskip("pyjava")
+
+from byzerllm.utils.client import ByzerLLM
+
+from tests import fake_udf
+
+
+class Answer(pydantic.BaseModel):
+    text: str
+
+
+def get_weather(city: str) -> str:
+    """The weather of a city."""
+    return "sunny"
+
+
+def conversation():
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": "hello", "metadata": {"agent": "a"}},
+        {"role": "assistant", "content": "hi"},
+        {"role": "user", "content": "what is the weather in Paris?"},
+    ]
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake_udf.install(monkeypatch, {"echo": fake_udf.FakeMaster()})
+    llm = ByzerLLM()
+    llm.setup_default_model_name("echo")
+    return llm
+
+
+@pytest.mark.parametrize("deploy_type", ["saas", "proprietary"])
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"tools": [get_weather]},
+        {"response_class": Answer},
+        {"impl_func": get_weather, "response_class": Answer},
+    ],
+)
+def test_building_a_request_leaves_the_conversation_alone(llm, deploy_type, options):
+    llm.meta_cache["echo"] = {"model_deploy_type": deploy_type}
+    conversations = conversation()
+    messages = list(conversations)
+    before = copy.deepcopy(conversations)
+
+    temp_conversations, request = llm._build_chat_oai_request(
+        model="echo",
+        conversations=conversations,
+        role_mapping=llm.default_role_mapping,
+        **options,
+    )
+
+    assert conversations == before
+    # the same list holding the same message objects
+    assert all(a is b for a, b in zip(conversations, messages))
+    assert len(conversations) == len(messages)
+    assert temp_conversations is not conversations
+    if deploy_type == "saas":
+        assert all("metadata" not in item for item in request["history"])
+    if options:
+        assert request["instruction"] != before[-1]["content"]
+
+
+def test_chat_oai_leaves_the_conversation_alone(llm):
+    conversations = [{"role": "user", "content": "hello"}]
+    before = copy.deepcopy(conversations)
+    assert llm.chat_oai(conversations)[0].output == "echo:hello"
+    assert llm.chat_oai_batch([conversations, conversations])[1].output == "echo:hello"
+    assert conversations == before
@@ -0,0 +1,71 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("ray")
+pytest.importorskip("pyjava")
+
+from byzerllm.utils.client import ByzerLLM, LLMRequest
+
+from tests import fake_udf
+
+TEXTS = ["a", "bb", "你好", "a longer text", "e"]
+
+
+@pytest.fixture
+def master(monkeypatch):
+    master = fake_udf.FakeMaster(num_workers=2, max_concurrency=2)
+    fake_udf.install(monkeypatch, {"emb": master})
+    return master
+
+
+@pytest.fixture
+def llm():
+    llm = ByzerLLM()
+    llm.setup_default_emb_model_name("emb")
+    return llm
+
+
+def emb_rows(llm, texts):
+    return np.asarray(
+        [r.output for r in llm.emb(None, LLMRequest(instruction=texts))], dtype=np.float32
+    )
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_emb_array_rows_match_emb(master, llm, dtype):
+    matrix = llm.emb_array(TEXTS, dtype=dtype, batch_size=2, num_workers=2)
+    # one request per batch of texts, the requests spread over both workers
+    assert [
+        [len(item["instruction"]) for item in chunk] for chunk in master.calls[-2:]
+    ] == [[2, 2], [1]]
+    assert isinstance(matrix, np.ndarray)
+    assert matrix.shape == (len(TEXTS), 3)
+    assert matrix.dtype == np.dtype(dtype)
+    np.testing.assert_array_equal(matrix, emb_rows(llm, TEXTS).astype(dtype))
+
+
+def test_aemb_array_rows_match_emb(master, llm):
+    matrix = asyncio.run(llm.aemb_array(TEXTS, batch_size=2, num_workers=2))
+    assert matrix.shape == (len(TEXTS), 3)
+    assert matrix.dtype == np.float32
+    np.testing.assert_array_equal(matrix, emb_rows(llm, TEXTS))
+
+
+def test_models_without_embedding_batch_fall_back_to_emb(master, llm):
+    # the meta of a worker started by an older version
+    llm.meta_cache["emb"] = {"model_deploy_type": "saas"}
+    matrix = llm.emb_array(TEXTS, dtype="float16")
+    assert matrix.shape == (len(TEXTS), 3)
+    assert matrix.dtype == np.float16
+    assert all("embedding_batch" not in item for item in master.calls[-1])
+    np.testing.assert_array_equal(matrix, emb_rows(llm, TEXTS).astype("float16"))
+
+    matrix = asyncio.run(llm.aemb_array(TEXTS))
+    assert matrix.shape == (len(TEXTS), 3)
+
+
+def test_no_texts(master, llm):
+    assert llm.emb_array([]).shape == (0, 0)
+    assert asyncio.run(llm.aemb_array([], dtype="float16")).dtype == np.float16
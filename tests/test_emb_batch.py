@@ -0,0 +1,60 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("langchain")
+
+import numpy as np
+from byzerllm.utils.emb import ByzerLLMEmbeddings, length_sorted_batches
+
+WORDS = ["hello", "world", "panda", "bear", "china", "giant", "species", "the", "is", "a"]
+
+
+@pytest.fixture(scope="module")
+def embeddings(tmp_path_factory):
+    vocab_file = tmp_path_factory.mktemp("tiny_bert") / "vocab.txt"
+    vocab_file.write_text(
+        "\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS)
+    )
+    tokenizer = transformers.BertTokenizer(str(vocab_file))
+    torch.manual_seed(0)
+    model = transformers.BertModel(
+        transformers.BertConfig(
+            vocab_size=tokenizer.vocab_size,
+            hidden_size=16,
+            num_hidden_layers=1,
+            num_attention_heads=2,
+            intermediate_size=32,
+        )
+    ).eval()
+    return ByzerLLMEmbeddings(model, tokenizer, device="cpu")
+
+
+def test_length_sorted_batches():
+    lengths = [10, 2, 7, 3, 50]
+    batches = length_sorted_batches(lengths, max_batch_tokens=20)
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    for batch in batches:
+        longest = max(lengths[i] for i in batch)
+        assert len(batch) == 1 or len(batch) * longest <= 20
+    # the text longer than max_batch_tokens is alone
+    assert [4] in batches
+
+
+def test_embed_batch_matches_single_texts(embeddings):
+    texts = [" ".join(WORDS[: (i % len(WORDS)) + 1]) for i in range(23)]
+    matrix = embeddings.embed_batch(texts, max_batch_tokens=32)
+
+    assert matrix.dtype == np.float32
+    assert matrix.shape == (len(texts), 16)
+    for text, row in zip(texts, matrix):
+        assert np.allclose(row, embeddings.embed_query(text), atol=1e-5)
+
+
+def test_embed_batch_reports_the_sorting_token_counts(embeddings):
+    texts = ["hello", "hello world panda", "the giant panda is a bear"]
+    matrix, token_counts = embeddings.embed_batch_with_token_counts(texts)
+
+    assert np.array_equal(matrix, embeddings.embed_batch(texts))
+    # [CLS] and [SEP] included
+    assert token_counts == [3, 5, 8]
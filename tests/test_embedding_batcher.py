@@ -0,0 +1,35 @@
+import asyncio
+
+from byzerllm.utils.client import LLMResponse
+from byzerllm.utils.client.entrypoints.openai.embedding_batcher import EmbeddingBatcher
+
+
+class FakeEmbClient:
+    def __init__(self):
+        self.calls = []
+
+    async def aemb(self, model, request):
+        self.calls.append(list(request.instruction))
+        await asyncio.sleep(0.01)
+        return [
+            LLMResponse(output=[float(len(text))], metadata={"input_tokens_count": 1}, input=text)
+            for text in request.instruction
+        ]
+
+
+def test_concurrent_requests_are_coalesced():
+    client = FakeEmbClient()
+
+    async def run():
+        batcher = EmbeddingBatcher(client, max_wait_ms=5, max_batch_size=4)
+        return await asyncio.gather(
+            *[batcher.embed("emb", ["x" * i]) for i in range(1, 7)],
+            batcher.embed("emb", ["ab", "abc"]),
+        )
+
+    results = asyncio.run(run())
+
+    assert [len(texts) for texts in client.calls] == [4, 4]
+    assert [[r.output for r in res] for res in results] == [
+        [[1.0]], [[2.0]], [[3.0]], [[4.0]], [[5.0]], [[6.0]], [[2.0], [3.0]]
+    ]
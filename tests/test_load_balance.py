@@ -0,0 +1,127 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from byzerllm.utils.client.load_balance import (
+    EwmaLatencyLoadBalancer,
+    LeastOutstandingLoadBalancer,
+    LoadBalancer,
+    PowerOfTwoLoadBalancer,
+    estimate_tokens,
+)
+
+WORKERS = ["worker-0", "worker-1", "worker-2"]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens(["a" * 40, "b" * 8]) == 12
+    # requests sent in the binary wire format
+    request = {
+        "instruction": "a" * 20,
+        "history": [{"role": "user", "content": "b" * 20}],
+    }
+    assert estimate_tokens([request]) == 10
+
+
+def test_load_balancer_is_abstract():
+    with pytest.raises(TypeError):
+        LoadBalancer(None, WORKERS)
+
+
+def test_least_outstanding_spreads_requests():
+    balancer = LeastOutstandingLoadBalancer(None, WORKERS)
+    indices = [balancer.acquire(10) for _ in range(3)]
+    assert sorted(indices) == [0, 1, 2]
+
+    balancer.release(indices[0], 10, elapsed_s=1.0)
+    # the only worker without a request in flight
+    assert balancer.acquire(10) == indices[0]
+    assert balancer.stat()["in_flight"] == [1, 1, 1]
+
+
+def test_ewma_latency_prefers_the_faster_worker():
+    balancer = EwmaLatencyLoadBalancer(None, WORKERS[:2])
+    balancer.ewma_sec_per_token = [0.1, 0.01]
+    assert balancer.acquire(100) == 1
+    # worker 1 now has 100 tokens in flight: 0.01 * 200 < 0.1 * 100
+    assert balancer.acquire(100) == 1
+    # 0.01 * 300 > 0.1 * 10
+    assert balancer.acquire(10) == 0
+
+
+def test_ewma_is_updated_from_reported_tokens():
+    balancer = EwmaLatencyLoadBalancer(None, WORKERS[:1], alpha=0.5)
+    index = balancer.acquire(100)
+    balancer.release(
+        index,
+        100,
+        elapsed_s=2.0,
+        metadata=[{"input_tokens_count": 150, "generated_tokens_count": 50}],
+    )
+    assert balancer.ewma_sec_per_token == [0.01]
+    balancer.release(balancer.acquire(100), 100, elapsed_s=3.0)
+    assert balancer.ewma_sec_per_token == [pytest.approx(0.02)]
+    # failed or streamed requests do not feed the average
+    balancer.release(balancer.acquire(100), 100, elapsed_s=None)
+    assert balancer.ewma_sec_per_token == [pytest.approx(0.02)]
+    assert balancer.stat()["in_flight_tokens"] == [0]
+
+
+def test_power_of_two_picks_the_less_loaded_of_two():
+    balancer = PowerOfTwoLoadBalancer(None, WORKERS[:2])
+    balancer.in_flight = [5, 0]
+    for _ in range(10):
+        index = balancer.acquire(1)
+        assert index == 1
+        balancer.release(index, 1)
+
+    single = PowerOfTwoLoadBalancer(None, WORKERS[:1])
+    assert single.acquire(1) == 0
+
+
+def test_workers_are_capped_at_max_concurrency():
+    balancer = LeastOutstandingLoadBalancer(None, WORKERS[:2], max_concurrency=2)
+    indices = [balancer.acquire(1) for _ in range(4)]
+    assert sorted(indices) == [0, 0, 1, 1]
+    with pytest.raises(Exception, match="No idle UDFWorker"):
+        balancer.acquire(1, timeout_s=0.05)
+
+    # a waiting request gets the slot once one is released
+    threading.Timer(0.05, balancer.release, args=(indices[0], 1)).start()
+    assert balancer.acquire(1, timeout_s=5) == indices[0]
+
+    async def main():
+        with pytest.raises(Exception, match="No idle UDFWorker"):
+            await balancer.aacquire(1, timeout_s=0.05)
+        asyncio.get_running_loop().call_later(0.05, balancer.release, indices[1], 1)
+        return await balancer.aacquire(1, timeout_s=5)
+
+    assert asyncio.run(main()) == indices[1]
+    assert balancer.stat()["in_flight"] == [2, 2]
+
+
+def test_streamed_requests_hold_their_slot_until_consumed():
+    balancer = PowerOfTwoLoadBalancer(None, WORKERS[:1], max_concurrency=1)
+    index = balancer.acquire(10)
+    balancer.hold(index, 10, ["request-1", "request-2"])
+    with pytest.raises(Exception, match="No idle UDFWorker"):
+        balancer.acquire(10, timeout_s=0.01)
+
+    balancer.release_stream("request-1")
+    assert balancer.stat()["in_flight"] == [1]
+    balancer.release_stream("request-2")
+    # releasing twice does nothing
+    balancer.release_stream("request-2")
+    assert balancer.stat()["in_flight"] == [0]
+    assert balancer.stat()["in_flight_tokens"] == [0]
+
+
+def test_abandoned_streams_expire():
+    balancer = LeastOutstandingLoadBalancer(None, WORKERS[:1], max_concurrency=1)
+    balancer.stream_hold_timeout_s = 0.01
+    balancer.hold(balancer.acquire(10), 10, ["request-1"])
+    time.sleep(0.02)
+    assert balancer.acquire(10, timeout_s=0.01) == 0
+    assert balancer.stat()["streams"] == 0
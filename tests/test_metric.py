@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("ray")
+prometheus_client = pytest.importorskip("prometheus_client")
+
+from byzerllm.utils.metrics import Metric
+
+
+def enabled_metric(**kwargs):
+    metric = Metric(flush_interval_s=3600, **kwargs)
+    # no pushgateway, the counters are only kept in the registry
+    metric.metric_enabled = True
+    return metric
+
+
+def test_increments_are_aggregated_until_flush():
+    metric = enabled_metric()
+    metric.inc("tokens", 3)
+    metric.inc("tokens", 2)
+    assert metric.pending == {"tokens": 5}
+
+    metric.flush()
+    assert metric.pending == {}
+    assert metric.registry.get_sample_value("tokens_total") == 5
+
+
+def test_counter_names_are_bounded():
+    metric = enabled_metric(max_counters=2)
+    metric.inc("a")
+    metric.inc("b")
+    metric.inc("c")
+    # known names are still counted
+    metric.inc("a")
+    assert metric.dropped == 1
+    assert metric.pending == {"a": 2, "b": 1}
+
+    # names with a counter count towards the bound as well
+    metric.flush()
+    metric.inc("c")
+    metric.inc("b")
+    assert metric.dropped == 2
+    assert metric.pending == {"b": 1}
+
+
+def test_disabled_metric_drops_increments():
+    metric = Metric(flush_interval_s=3600)
+    metric.metric_enabled = False
+    metric.inc("a")
+    assert metric.pending == {}
+    assert metric.flush_thread is None
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from byzerllm.utils import nontext
+from byzerllm.utils.nontext import find_nontext_kinds
+
+IMAGE = "data:image/png;base64,AAAA"
+AUDIO = "data:audio/wav;base64,BBBB"
+
+
+def test_find_nontext_kinds():
+    assert find_nontext_kinds("plain text, no tags") == set()
+    assert find_nontext_kinds("a <_b and </_image_> only") == set()
+    assert find_nontext_kinds("<_ROOT_>not a nontext tag</_ROOT_>") == set()
+    assert find_nontext_kinds(f"<_image_>{IMAGE}</_image_>") == {"image"}
+    assert find_nontext_kinds(
+        f"look <_image_>{IMAGE}</_image_> and <_audio_>{AUDIO}</_audio_>"
+    ) == {"image", "audio"}
+    assert find_nontext_kinds(None) == set()
+
+
+@pytest.fixture
+def llm():
+    pytest.importorskip("ray")
+    pytest.importorskip("pyjava")
+    from byzerllm.utils.client import ByzerLLM
+
+    return ByzerLLM()
+
+
+def test_plain_text_skips_the_extractors(llm, monkeypatch):
+    def extract(self):
+        raise AssertionError("plain text was parsed")
+
+    monkeypatch.setattr(nontext.TagExtractor, "extract", extract)
+    v = [{"instruction": "hello"}, {"instruction": "a <_b of text"}]
+    llm._process_nontext_input("chat", v)
+    assert v == [{"instruction": "hello"}, {"instruction": "a <_b of text"}]
+
+
+def test_tags_in_the_middle_of_a_message_become_content(llm):
+    v = [
+        {"instruction": f"look at <_image_>{IMAGE}</_image_> please"},
+        {"instruction": f"say <_audio_>{AUDIO}</_audio_> it"},
+        {"instruction": "no tags"},
+    ]
+    llm._process_nontext_input("chat", v)
+    assert json.loads(v[0]["instruction"]) == [
+        {"image": IMAGE},
+        {"text": "look at  please"},
+    ]
+    assert json.loads(v[1]["instruction"]) == [{"audio": AUDIO}, {"text": "say  it"}]
+    assert v[2]["instruction"] == "no tags"
+
+
+def test_unclosed_tags_are_sent_as_text(llm):
+    v = [{"instruction": "<_image_>not closed"}]
+    llm._process_nontext_input("chat", v)
+    assert v == [{"instruction": "<_image_>not closed"}]
+
+
+def test_skip_nontext_check(llm):
+    instruction = f"look at <_image_>{IMAGE}</_image_>"
+    llm.setup_skip_nontext_check("text-only")
+    v = [{"instruction": instruction}]
+    llm._process_nontext_input("text-only", v)
+    assert v[0]["instruction"] == instruction
+
+    # other models are still checked
+    llm._process_nontext_input("chat", v)
+    assert json.loads(v[0]["instruction"])[0] == {"image": IMAGE}
+
+    llm.setup_skip_nontext_check("text-only", False)
+    v = [{"instruction": instruction}]
+    llm._process_nontext_input("text-only", v)
+    assert json.loads(v[0]["instruction"])[0] == {"image": IMAGE}
@@ -0,0 +1,91 @@
+import asyncio
+
+from byzerllm.utils.client.response_cache import ResponseCache
+
+REQUEST = {"instruction": "hello", "history": [], "temperature": 0}
+RESPONSE = [{"predict": "hi", "input": "hello", "metadata": {}}]
+
+
+def test_key_ignores_request_ids_and_param_order():
+    cache = ResponseCache()
+    key = cache.key("llama", REQUEST)
+    assert key == cache.key(
+        "llama", {"temperature": 0, "history": [], "instruction": "hello", "request_id": "1"}
+    )
+    assert key != cache.key("qwen", REQUEST)
+    assert key != cache.key("llama", {**REQUEST, "instruction": "bye"})
+
+
+def test_only_deterministic_requests_are_cached():
+    cache = ResponseCache()
+    assert cache.key("llama", {**REQUEST, "temperature": 0.7}) is None
+    assert cache.key("llama", {"instruction": "hello", "gen.temperature": 0.7}) is None
+    assert cache.key("llama", {"instruction": "hello", "gen.temperature": 0}) is not None
+    # not set means the default temperature of the backends
+    assert cache.key("llama", {"instruction": "hello"}) is None
+    assert cache.key("llama", {**REQUEST, "generation.stream": True}) is None
+    assert cache.key("llama", {**REQUEST, "gen.abort": True}) is None
+
+    cache = ResponseCache(only_deterministic=False)
+    assert cache.key("llama", {**REQUEST, "temperature": 0.7}) is not None
+    assert cache.key("llama", {**REQUEST, "gen.abort": True}) is None
+
+
+def test_lru_bounded_by_entries():
+    cache = ResponseCache(max_entries=2)
+    for name in ["a", "b"]:
+        cache.put(name, RESPONSE)
+    assert cache.get("a") == RESPONSE
+    # b is the least recently used entry
+    cache.put("c", RESPONSE)
+    assert cache.get("b") is None
+    assert cache.get("a") == RESPONSE
+    assert cache.stat()["evictions"] == 1
+
+
+def test_lru_bounded_by_bytes():
+    cache = ResponseCache(max_bytes=100)
+    cache.put("a", [{"predict": "x" * 40}])
+    cache.put("b", [{"predict": "y" * 40}])
+    assert cache.stat()["entries"] == 1
+    assert cache.get("a") is None
+    assert cache.stat()["bytes"] <= 100
+    # a response larger than the whole budget is not kept
+    cache.put("c", [{"predict": "z" * 200}])
+    assert cache.stat()["entries"] == 0
+
+
+def test_sqlite_backend_survives_restarts(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(disk_path=path)
+    cache.put("a", RESPONSE)
+
+    cache = ResponseCache(disk_path=path)
+    assert cache.stat()["disk_entries"] == 1
+    assert cache.get("a") == RESPONSE
+    # promoted to memory
+    assert cache.get("a") == RESPONSE
+    stat = cache.stat()
+    assert (stat["disk_hits"], stat["hits"]) == (1, 1)
+
+
+def test_sqlite_backend_is_trimmed(tmp_path):
+    cache = ResponseCache(max_entries=1, disk_path=str(tmp_path / "cache.db"), max_disk_entries=10)
+    for i in range(11):
+        cache.put(str(i), RESPONSE)
+    assert cache.stat()["disk_entries"] == 9
+    assert cache.get("0") is None
+    assert cache.get("10") == RESPONSE
+
+
+def test_async_access_with_sqlite_backend(tmp_path):
+    cache = ResponseCache(max_entries=1, disk_path=str(tmp_path / "cache.db"))
+
+    async def main():
+        await cache.aput("a", RESPONSE)
+        await cache.aput("b", RESPONSE)
+        # a is only on disk now
+        return await cache.aget("a")
+
+    assert asyncio.run(main()) == RESPONSE
+    assert cache.stat()["disk_hits"] == 1
@@ -0,0 +1,66 @@
+import time
+
+from byzerllm.utils.client.semantic_cache import SemanticCache
+
+CONVERSATIONS = [{"role": "user", "content": "hello"}]
+REQUEST = {"instruction": "what is byzer?", "history": [], "temperature": 0}
+RESPONSE = [{"output": "a data platform", "metadata": {}}]
+
+
+def test_hit_at_or_above_threshold():
+    cache = SemanticCache(threshold=0.9)
+    key = cache.context_key(CONVERSATIONS, REQUEST)
+    cache.put("llama", key, [1.0, 0.0], RESPONSE)
+
+    assert cache.get("llama", key, [1.0, 0.1]) == RESPONSE
+    assert cache.get("llama", key, [0.0, 1.0]) is None
+    assert (cache.stat()["hits"], cache.stat()["misses"]) == (1, 1)
+
+
+def test_entries_are_namespaced_by_model_and_context():
+    cache = SemanticCache()
+    key = cache.context_key(CONVERSATIONS, REQUEST)
+    cache.put("llama", key, [1.0, 0.0], RESPONSE)
+
+    assert cache.get("qwen", key, [1.0, 0.0]) is None
+    other = cache.context_key([{"role": "user", "content": "bye"}], REQUEST)
+    assert other != key
+    assert cache.get("llama", other, [1.0, 0.0]) is None
+    # request ids do not split the context
+    assert cache.context_key(CONVERSATIONS, {**REQUEST, "gen.request_id": "1"}) == key
+
+
+def test_expired_entries_are_dropped():
+    cache = SemanticCache(ttl_s=0.05)
+    key = cache.context_key(CONVERSATIONS, REQUEST)
+    cache.put("llama", key, [1.0, 0.0], RESPONSE)
+    assert cache.get("llama", key, [1.0, 0.0]) == RESPONSE
+
+    time.sleep(0.1)
+    assert cache.get("llama", key, [1.0, 0.0]) is None
+    assert cache.stat()["entries"] == {"llama": 0}
+
+
+def test_max_entries_drops_the_oldest():
+    cache = SemanticCache(max_entries=2)
+    key = cache.context_key(CONVERSATIONS, REQUEST)
+    for i, vector in enumerate([[1.0, 0.0], [0.0, 1.0], [-1.0, 0.0]]):
+        cache.put("llama", key, vector, [{"output": str(i)}])
+
+    assert cache.stat()["entries"] == {"llama": 2}
+    assert cache.get("llama", key, [1.0, 0.0]) is None
+    assert cache.get("llama", key, [-1.0, 0.0]) == [{"output": "2"}]
+
+
+def test_stream_abort_and_sampled_requests_are_not_cached():
+    cache = SemanticCache()
+    assert cache.context_key(CONVERSATIONS, {**REQUEST, "stream": True}) is None
+    assert (
+        cache.context_key(
+            CONVERSATIONS, {**REQUEST, "gen.request_id": "1", "gen.abort": True}
+        )
+        is None
+    )
+    assert cache.context_key(CONVERSATIONS, {**REQUEST, "temperature": 0.7}) is None
+    no_temperature = {k: v for k, v in REQUEST.items() if k != "temperature"}
+    assert cache.context_key(CONVERSATIONS, no_temperature) is None
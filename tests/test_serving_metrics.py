@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+prometheus_client = pytest.importorskip("prometheus_client")
+
+from byzerllm.utils.metrics.serving import ServingMetrics
+
+
+def sample(metrics, name, **labels):
+    return metrics.registry.get_sample_value(name, labels)
+
+
+def test_request_timer_observes_latencies_and_tokens():
+    metrics = ServingMetrics(registry=prometheus_client.CollectorRegistry())
+    timer = metrics.request("llama")
+    assert sample(metrics, "byzerllm_requests_in_flight", model="llama") == 1
+
+    time.sleep(0.01)
+    timer.first_token()
+    timer.finish(input_tokens=12, output_tokens=5)
+    # finish is idempotent
+    timer.finish(input_tokens=12, output_tokens=5)
+
+    assert sample(metrics, "byzerllm_requests_in_flight", model="llama") == 0
+    assert sample(metrics, "byzerllm_e2e_request_latency_seconds_count", model="llama") == 1
+    assert sample(metrics, "byzerllm_time_to_first_token_seconds_sum", model="llama") >= 0.01
+    assert sample(metrics, "byzerllm_time_per_output_token_seconds_count", model="llama") == 1
+    assert sample(metrics, "byzerllm_request_input_tokens_sum", model="llama") == 12
+    assert sample(metrics, "byzerllm_request_output_tokens_sum", model="llama") == 5
+
+
+def test_request_timer_without_tokens():
+    metrics = ServingMetrics(registry=prometheus_client.CollectorRegistry())
+    # e.g. the client went away before the first token
+    metrics.request("llama").finish()
+
+    assert sample(metrics, "byzerllm_e2e_request_latency_seconds_count", model="llama") == 1
+    assert sample(metrics, "byzerllm_time_to_first_token_seconds_count", model="llama") is None
+    assert sample(metrics, "byzerllm_request_output_tokens_count", model="llama") is None
+
+
+def test_exposition_is_labeled_by_model():
+    metrics = ServingMetrics(registry=prometheus_client.CollectorRegistry())
+    metrics.observe_queue_wait("llama", 0.2)
+    metrics.request("qwen").finish(ttft_s=0.1, input_tokens=3, output_tokens=3)
+
+    text = metrics.exposition().decode()
+    assert 'byzerllm_queue_wait_seconds_count{model="llama"} 1.0' in text
+    assert 'byzerllm_time_to_first_token_seconds_count{model="qwen"} 1.0' in text
+
+
+def test_exporter_falls_back_to_a_free_port():
+    import socket
+
+    taken = socket.socket()
+    taken.bind(("127.0.0.1", 0))
+    taken.listen()
+    port = taken.getsockname()[1]
+    try:
+        metrics = ServingMetrics(registry=prometheus_client.CollectorRegistry())
+        bound = metrics.start_exporter(port, addr="127.0.0.1")
+        assert bound != port and bound > 0
+    finally:
+        taken.close()
+
+
+def test_unmeasured_first_token_time_is_not_observed():
+    pytest.importorskip("ray")
+    from byzerllm.utils.client import LLMResponse
+    from byzerllm.utils.client.entrypoints.openai.serving_engine import OpenAIServing
+
+    def usage(first_token_time):
+        return OpenAIServing.usage_for_metrics(
+            LLMResponse(
+                output="hi",
+                input="hello",
+                metadata={
+                    "input_tokens_count": 3,
+                    "generated_tokens_count": 2,
+                    "first_token_time": first_token_time,
+                },
+            )
+        )
+
+    assert usage(250) == (3, 2, 0.25)
+    assert usage(0) == (3, 2, None)
+    assert usage(-1.0) == (3, 2, None)
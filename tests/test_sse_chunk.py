@@ -0,0 +1,52 @@
+import pytest
+
+from byzerllm.utils.client.entrypoints.openai.protocol import (
+    ChatCompletionResponseStreamChoice,
+    ChatCompletionStreamResponse,
+    DeltaMessage,
+    UsageInfo,
+)
+from byzerllm.utils.client.entrypoints.openai.serving_chat import DeltaChunkTemplate
+
+
+def pydantic_chunk(request_id, created, model, content, prompt_tokens, completion_tokens):
+    chunk = ChatCompletionStreamResponse(
+        id=request_id,
+        object="chat.completion.chunk",
+        created=created,
+        choices=[
+            ChatCompletionResponseStreamChoice(
+                index=0, delta=DeltaMessage(content=content), finish_reason=None
+            )
+        ],
+        model=model,
+    )
+    chunk.usage = UsageInfo(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+    )
+    return chunk.model_dump_json(exclude_unset=True, exclude_none=True)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "hello",
+        "",
+        None,
+        'quote " and backslash \\ and slash /',
+        "new\nline\ttab\rcr\b\f",
+        "control \x00\x01\x1f\x7f",
+        "你好，世界 😀 é",
+        "  ",
+    ],
+)
+def test_template_is_byte_identical_to_pydantic(content):
+    request_id, created, model = 'cmpl-"x"', 1718000000, "模型/qwen"
+    template = DeltaChunkTemplate(request_id, "chat.completion.chunk", created, model)
+
+    assert DeltaChunkTemplate.can_render(content, 12, 3)
+    assert template.render(content, 12, 3) == pydantic_chunk(
+        request_id, created, model, content, 12, 3
+    )
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from byzerllm.utils.types import StopSequenceMatcher
+
+
+def ends_with_stop(tokens, stops):
+    return any(len(tokens) >= len(s) and tokens[-len(s):] == s for s in stops)
+
+
+def test_matcher_agrees_with_brute_force():
+    random.seed(0)
+    for _ in range(200):
+        stops = [
+            [random.randrange(4) for _ in range(random.randint(1, 4))]
+            for _ in range(random.randint(1, 4))
+        ]
+        matcher = StopSequenceMatcher(stops)
+        tokens = []
+        state = 0
+        for _ in range(30):
+            tokens.append(random.randrange(4))
+            state, matched = matcher.step(state, tokens[-1])
+            assert matched == ends_with_stop(tokens, stops)
+
+
+def test_overlapping_stop_sequences():
+    # "abd" fails on d after "ab", the fail link must still find "bd"
+    matcher = StopSequenceMatcher([[1, 2, 3], [2, 4]])
+    state, matched = matcher.feed(0, [1, 2])
+    assert not matched
+    state, matched = matcher.step(state, 4)
+    assert matched
+
+
+def test_criteria_stops_rows_independently():
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from byzerllm.utils.types import StopSequencesCriteria, _PER_ROW_STOPPING
+
+    criteria = StopSequencesCriteria(
+        tokenizer=None, stops=[torch.tensor([7, 8])], input_start=2
+    )
+    input_ids = torch.tensor([[1, 1], [1, 1]])
+    steps = [[7, 5], [8, 7], [5, 8]]
+    results = []
+    for step in steps:
+        input_ids = torch.cat([input_ids, torch.tensor(step).unsqueeze(-1)], dim=-1)
+        results.append(criteria(input_ids, None))
+
+    if _PER_ROW_STOPPING:
+        assert [r.tolist() for r in results] == [
+            [False, False],
+            [True, False],
+            [True, True],
+        ]
+    else:
+        assert results == [False, False, True]
@@ -0,0 +1,40 @@
+import time
+
+from byzerllm.utils.types import StreamFlushPolicy
+
+
+def test_first_output_is_pushed_immediately():
+    policy = StreamFlushPolicy(flush_interval_ms=10_000, flush_tokens=100)
+    assert policy.should_flush(1)
+    policy.flushed(1)
+    assert not policy.should_flush(2)
+
+
+def test_push_after_flush_tokens():
+    policy = StreamFlushPolicy(flush_interval_ms=10_000, flush_tokens=4)
+    policy.flushed(1)
+    assert not policy.should_flush(4)
+    assert policy.should_flush(5)
+    policy.flushed(5)
+    assert not policy.should_flush(8)
+
+
+def test_push_after_flush_interval():
+    policy = StreamFlushPolicy(flush_interval_ms=20, flush_tokens=100)
+    policy.flushed(1)
+    assert not policy.should_flush(2)
+    time.sleep(0.03)
+    assert policy.should_flush(2)
+
+
+def test_finished_output_is_always_pushed():
+    policy = StreamFlushPolicy(flush_interval_ms=10_000, flush_tokens=100)
+    policy.flushed(1)
+    assert policy.should_flush(2, finished=True)
+
+
+def test_zero_interval_pushes_every_output():
+    policy = StreamFlushPolicy(flush_interval_ms=0, flush_tokens=100)
+    for tokens in range(1, 5):
+        assert policy.should_flush(tokens)
+        policy.flushed(tokens)
@@ -0,0 +1,156 @@
+import time
+import asyncio
+import threading
+
+from byzerllm.utils.types import (
+    BlockBinaryStreamServer,
+    BlockVLLMStreamServer,
+    SingleOutput,
+    StreamOutputs,
+    VLLMStreamServer,
+    _StreamStateIndex,
+)
+
+
+def outputs(text):
+    return StreamOutputs(outputs=[SingleOutput(text=text, metadata={})])
+
+
+def test_index_expires_running_and_done_requests():
+    index = _StreamStateIndex(ttl_s=0.2, done_ttl_s=0.05)
+    index.touch("running", 10)
+    index.touch("done", 10)
+    index.set_done("done")
+
+    time.sleep(0.1)
+    assert index.collect() == ["done"]
+    time.sleep(0.15)
+    assert index.collect() == ["running"]
+    stat = index.stat()
+    assert (stat["expired"], stat["done_expired"], stat["bytes"]) == (1, 1, 0)
+
+
+def test_index_evicts_by_size_done_first():
+    index = _StreamStateIndex(max_bytes=25)
+    index.touch("a", 10)
+    index.touch("b", 10)
+    index.set_done("b")
+    index.touch("c", 10)
+
+    assert index.collect() == ["b"]
+    assert index.stat()["bytes"] == 20
+    # a new size replaces the old one and a becomes the most recent request
+    index.touch("a", 30)
+    assert index.collect() == ["c", "a"]
+    assert index.stat()["evicted_by_size"] == 3
+
+
+def test_block_server_wakes_waiter_on_eviction():
+    server = BlockVLLMStreamServer(ttl_s=0.05)
+    server.add_item("r1", outputs("hello"))
+    assert server.wait_item("r1", timeout=0.1).outputs[0].text == "hello"
+
+    result = []
+    waiter = threading.Thread(
+        target=lambda: result.append(server.wait_item("r1", timeout=5))
+    )
+    waiter.start()
+    time.sleep(0.1)
+    # any later write collects the expired request and wakes its consumer
+    server.add_item("r2", outputs("x"))
+    waiter.join(timeout=2)
+    assert result == [None]
+
+
+def test_binary_server_wakes_waiter_on_eviction():
+    server = BlockBinaryStreamServer(max_bytes=10)
+    server.add_item("r1", outputs("a"))
+    server.wait_item("r1", timeout=0.1)
+
+    result = []
+    waiter = threading.Thread(
+        target=lambda: result.append(server.wait_item("r1", timeout=5))
+    )
+    waiter.start()
+    time.sleep(0.05)
+    # over max_bytes, the oldest request r1 goes first, then r2 itself
+    server.add_item("r2", outputs("x" * 100))
+    assert server.stat()["evicted_by_size"] == 2
+    waiter.join(timeout=2)
+    assert result == [None]
+
+
+def test_idle_server_evicts_from_reads():
+    server = BlockVLLMStreamServer(ttl_s=0.05)
+    server.add_item("abandoned", outputs("x" * 100))
+    time.sleep(0.1)
+    # no producer writes any more, a read of another request cleans up
+    assert server.get_item("other") is None
+    assert server.stat()["running"] == 0
+    assert server.stat()["bytes"] == 0
+
+    server = VLLMStreamServer(ttl_s=0.05)
+
+    async def main():
+        await server.add_item("abandoned", outputs("x" * 100))
+        await asyncio.sleep(0.1)
+        assert await server.wait_item("other", timeout=0.01) is None
+        return await server.stat()
+
+    assert asyncio.run(main())["running"] == 0
+
+
+def test_index_remembers_cancelled_requests_for_ttl():
+    index = _StreamStateIndex(ttl_s=0.05)
+    index.touch("r1", 10)
+    index.cancel("r1")
+    assert index.is_cancelled("r1")
+    assert (index.stat()["running"], index.stat()["bytes"]) == (0, 0)
+    # a cancelled request is not evicted, it is already gone
+    assert index.collect() == []
+    time.sleep(0.1)
+    index.collect()
+    assert not index.is_cancelled("r1")
+    assert index.stat()["cancelled"] == 1
+
+
+def test_block_servers_cancel_wakes_the_consumer_and_stops_the_producer():
+    for server in [BlockVLLMStreamServer(), BlockBinaryStreamServer()]:
+        assert server.add_item("r1", outputs("a"))
+        server.wait_item("r1", timeout=0.1)
+
+        result = []
+        waiter = threading.Thread(
+            target=lambda: result.append(server.wait_item("r1", timeout=5))
+        )
+        waiter.start()
+        time.sleep(0.05)
+        server.cancel("r1")
+        waiter.join(timeout=2)
+        assert result == [None]
+
+        assert server.add_item("r1", outputs("b")) is False
+        # mark_done of the producer after the cancel is a no-op
+        server.mark_done("r1")
+        assert server.get_item("r1") is None
+        assert server.stat()["cancelled"] == 1
+        # other requests are not affected
+        assert server.add_item("r2", outputs("c")) is True
+
+
+def test_async_server_cancel_wakes_the_consumer_and_stops_the_producer():
+    server = VLLMStreamServer()
+
+    async def main():
+        assert await server.add_item("r1", outputs("a"))
+        await server.wait_item("r1", timeout=0.1)
+        waiter = asyncio.ensure_future(server.wait_item("r1", timeout=5))
+        await asyncio.sleep(0.05)
+        await server.cancel("r1")
+        assert await asyncio.wait_for(waiter, 2) is None
+        assert await server.add_item("r1", outputs("b")) is False
+        await server.mark_done("r1")
+        assert await server.get_item("r1") is None
+        return await server.stat()
+
+    assert asyncio.run(main())["cancelled"] == 1
@@ -0,0 +1,119 @@
+import json
+import pickle
+
+import numpy as np
+import pytest
+
+pytest.importorskip("ray")
+pytest.importorskip("pyjava")
+
+from byzerllm.utils.client import ByzerLLM
+from byzerllm.utils.text_generator import decode_predict_items, encode_predict_results
+
+from tests import fake_udf
+
+ITEMS = [
+    {
+        "instruction": "你好, ça va? ✓",
+        "history": [{"role": "user", "content": "🙂 émoji"}],
+        "extra": {"nested": [1, {"deeper": "ü", "none": None}], "flag": True},
+    },
+    {"instruction": "second", "embedding": True},
+]
+
+
+def results_of(items):
+    return [
+        {
+            "predict": f"echo:{item['instruction']}",
+            "metadata": {"request_id": "r", "usage": {"tokens": [1, 2], "note": "中文"}},
+            "input": item,
+        }
+        for item in items
+    ]
+
+
+@pytest.fixture
+def llm():
+    return ByzerLLM()
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_client_worker_round_trip(llm, binary):
+    llm.meta_cache["echo"] = {"support_binary_wire": binary}
+    chunks = llm._encode_query_chunks("echo", ITEMS, num_workers=2)
+    assert len(chunks) == 2
+    assert all(isinstance(x, dict if binary else str) for chunk in chunks for x in chunk)
+
+    decoded = []
+    for chunk in chunks:
+        # Ray pickles the arguments and the results of the worker call
+        items, is_binary = decode_predict_items(pickle.loads(pickle.dumps(chunk)))
+        assert is_binary == binary
+        reply = pickle.loads(pickle.dumps(encode_predict_results(results_of(items), is_binary)))
+        decoded += llm._decode_query_result(reply)
+
+    assert [r["input"] for r in decoded] == ITEMS
+    assert [r["predict"] for r in decoded] == [f"echo:{item['instruction']}" for item in ITEMS]
+    assert decoded[0]["metadata"]["usage"] == {"tokens": [1, 2], "note": "中文"}
+
+
+def test_json_items_are_sent_without_escaping_non_ascii(llm):
+    llm.meta_cache["echo"] = {}
+    [chunk] = llm._encode_query_chunks("echo", ITEMS[:1])
+    assert "你好" in chunk[0]
+    assert json.loads(chunk[0]) == ITEMS[0]
+
+
+def test_embeddings_on_the_wire():
+    items = [{"instruction": "a", "embedding": True}]
+    results = [{"predict": [0.5, 1.5], "metadata": {}, "input": items[0]}]
+    binary = encode_predict_results(results, True)["value"][0]
+    assert binary[0]["predict"].dtype == np.float32
+
+    results = [{"predict": np.asarray([0.5, 1.5], dtype=np.float32), "metadata": {}, "input": items[0]}]
+    text = encode_predict_results(results, False)["value"][0]
+    assert json.loads(text)[0]["predict"] == [0.5, 1.5]
+
+
+@pytest.fixture
+def master(monkeypatch):
+    master = fake_udf.FakeMaster()
+    fake_udf.install(monkeypatch, {"echo": master})
+    return master
+
+
+def sent_binary(master):
+    return isinstance(master.calls[-1][0], dict)
+
+
+def test_binary_wire_is_negotiated_from_the_meta(master, llm):
+    meta = llm.get_meta(model="echo")
+    # the meta request itself always goes as json
+    assert not sent_binary(master)
+    assert meta["support_binary_wire"] is True
+
+    [response] = llm.chat_oai([{"role": "user", "content": "你好 ✓"}], model="echo")
+    assert sent_binary(master)
+    assert response.output == "echo:你好 ✓"
+
+
+def test_workers_without_binary_support_get_json(master, llm):
+    # the meta of a worker started by an older version
+    llm.meta_cache["echo"] = {"model_deploy_type": "saas"}
+    [response] = llm.chat_oai([{"role": "user", "content": "你好 ✓"}], model="echo")
+    assert not sent_binary(master)
+    assert response.output == "echo:你好 ✓"
+
+
+def test_wire_format_can_be_forced(master, llm):
+    llm.get_meta(model="echo")
+    llm.setup_wire_format("echo", "json")
+    llm.chat_oai([{"role": "user", "content": "hi"}], model="echo")
+    assert not sent_binary(master)
+
+    llm.meta_cache["echo"] = {"model_deploy_type": "saas"}
+    llm.setup_wire_format("echo", "binary")
+    [response] = llm.chat_oai([{"role": "user", "content": "hi"}], model="echo")
+    assert sent_binary(master)
+    assert response.output == "echo:hi"
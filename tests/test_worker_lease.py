@@ -0,0 +1,122 @@
+import time
+import asyncio
+
+import pytest
+
+from byzerllm.utils.client import worker_lease
+from byzerllm.utils.client.worker_lease import WorkerLeasePool
+
+
+class FakeRef:
+    def __init__(self, value, delay_s: float = 0.0):
+        self.value = value
+        self.delay_s = delay_s
+
+    def __await__(self):
+        if self.delay_s:
+            yield from asyncio.sleep(self.delay_s).__await__()
+        return self.value
+
+
+class FakeMethod:
+    def __init__(self, f):
+        self.f = f
+
+    def remote(self, *args):
+        return self.f(*args)
+
+
+class FakeMaster:
+    """Hands out worker slots [index, worker] like the UDF master."""
+
+    def __init__(self, num_workers: int = 4, delay_s: float = 0.0):
+        self.idle = list(range(num_workers))
+        self.given_back = []
+        self.delay_s = delay_s
+        self.get = FakeMethod(self._get)
+        self.give_back = FakeMethod(self._give_back)
+
+    def _get(self):
+        index = self.idle.pop(0)
+        return FakeRef([index, f"worker-{index}"], self.delay_s)
+
+    def _give_back(self, index):
+        self.given_back.append(index)
+        self.idle.append(index)
+
+
+@pytest.fixture(autouse=True)
+def fake_ray_get(monkeypatch):
+    def get(refs):
+        if isinstance(refs, list):
+            return [r.value for r in refs]
+        return refs.value
+
+    monkeypatch.setattr(worker_lease.ray, "get", get)
+
+
+def test_released_slots_are_reused():
+    master = FakeMaster()
+    pool = WorkerLeasePool(master, lease_size=2)
+    slots = pool.acquire(2)
+    pool.release(slots)
+    assert pool.stat() == {"free": 2, "in_use": 0, "lease_size": 2}
+
+    # no round trip to the master, the most recently released slot first
+    assert pool.acquire(1) == [slots[1]]
+    assert master.given_back == []
+    pool.close()
+
+
+def test_broken_and_over_size_slots_are_given_back():
+    master = FakeMaster()
+    pool = WorkerLeasePool(master, lease_size=2)
+    slots = pool.acquire(4)
+    pool.release(slots[:1], broken=True)
+    assert master.given_back == [slots[0][0]]
+
+    pool.release(slots[1:])
+    # the pool keeps at most lease_size slots
+    assert pool.stat() == {"free": 2, "in_use": 0, "lease_size": 2}
+    assert master.given_back == [slots[0][0], slots[1][0]]
+    pool.close()
+
+
+def test_idle_slots_expire_without_requests():
+    master = FakeMaster()
+    pool = WorkerLeasePool(master, lease_size=4, idle_timeout_s=0.1)
+    pool.release(pool.acquire(2))
+
+    # no further acquire/release, the sweep thread gives them back
+    time.sleep(0.3)
+    assert pool.stat()["free"] == 0
+    assert sorted(master.given_back) == [0, 1]
+    pool.close()
+
+
+def test_cancelled_acquire_gives_back_its_slots():
+    master = FakeMaster(delay_s=0.2)
+    pool = WorkerLeasePool(master, lease_size=4, idle_timeout_s=10)
+
+    async def main():
+        task = asyncio.ensure_future(pool.aacquire(2))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    time.sleep(0.1)
+    assert sorted(master.given_back) == [0, 1]
+    assert pool.stat()["in_use"] == 0
+    pool.close()
+
+
+def test_close_gives_back_free_slots():
+    master = FakeMaster()
+    pool = WorkerLeasePool(master, lease_size=4)
+    pool.release(pool.acquire(3))
+    pool.close()
+    assert sorted(master.given_back) == [0, 1, 2]
+    pool.sweep_thread.join(timeout=1)
+    assert not pool.sweep_thread.is_alive()